@@ -1,16 +1,37 @@
 """Standalone World Manager - CRUD API for managing worlds in data/premade_worlds/"""
 
+import io
 import os
+import re
 import sys
 import json
-from flask import Flask, jsonify, request, send_file
+import time
+import tarfile
+import zipfile
+import base64
+import bisect
+import hashlib
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from flask import Flask, Response, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 # Add parent directory to path so we can import core modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.world_serializer import world_to_dict, dict_to_world, load_world_from_json
-from world import World, Location, Item, Character
+from utils.world_analyzer import analyze_world
+from world import World, Location, Item, Character, ComponentKind
 
 app = Flask(__name__)
 CORS(app)
@@ -18,29 +39,292 @@ CORS(app)
 # Path to premade worlds directory (in parent directory)
 WORLDS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'premade_worlds')
 
+# Minimum time between two scans of the worlds directory, in seconds
+INDEX_REFRESH_INTERVAL = 2.0
+
+# Lock file held while a new world ID is chosen and its file written (shared by every worker process)
+ID_LOCK_FILENAME = '.world_id.lock'
+
+# Default and maximum number of worlds in a page of the list
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Sort orders of the list (each key ends with the ID and filename, so it is unique and can be used as cursor)
+SORT_KEYS = {
+    'id': lambda world: (world['id'], world['filename']),
+    'name': lambda world: (world['player_name'].lower(), world['id'], world['filename']),
+    'locations': lambda world: (world['location_count'], world['id'], world['filename']),
+    'characters': lambda world: (world['character_count'], world['id'], world['filename']),
+}
+
+# Fields of the summary projection of the list
+SUMMARY_FIELDS = ['id', 'filename', 'language', 'player_name']
+
+# Number of worlds of a bulk import that are validated (in parallel) and written together
+BULK_BATCH_SIZE = 64
+# Maximum size of an uploaded zip archive kept in memory before it is spooled to disk, in bytes
+BULK_SPOOL_SIZE = 32 * 1024 * 1024
+# Number of processes that validate the imported worlds, shared by every bulk import of a worker
+BULK_WORKERS = min(4, os.cpu_count() or 1)
+
+# Number of checked entries (locations, items, ...) whose diagnostics are kept, so the validation
+# requests of the editor only check again the entries that changed
+VALIDATION_CACHE_SIZE = 4096
+
+
+def _world_metadata(filename, data):
+    """Extract the metadata shown in the list of worlds from a world file.
+    
+    Returns:
+        Dictionary with the ID, filename, player name, number of locations and characters, and language
+    """
+    # Extract language from filename (e.g., "0_en.json" -> "en")
+    language = 'en'
+    if '_' in filename:
+        lang_part = filename.split('_')[1].split('.')[0].lower()
+        if lang_part in ['en', 'es']:
+            language = lang_part
+    
+    return {
+        'id': int(filename.split('_')[0]),
+        'filename': filename,
+        'player_name': data.get('player', {}).get('name', 'Unknown'),
+        'location_count': len(data.get('locations', [])),
+        'character_count': len(data.get('characters', [])),
+        'language': language
+    }
+
+
+class WorldIndex:
+    """In-memory metadata of the world files, so listing the worlds does not read every file.
+    
+    The index is built on the first use and kept up to date by the endpoints that write worlds.
+    Changes made outside the app are picked up by rescanning the directory (only the stat of each
+    file; changed files are read again), at most once every INDEX_REFRESH_INTERVAL seconds.
+    """
+    def __init__(self, directory, refresh_interval=INDEX_REFRESH_INTERVAL):
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.entries = {}
+        """metadata of each world file, by filename"""
+        self.stats = {}
+        """(modification time, size) of each world file when it was indexed, by filename"""
+        self.etag = None
+        """a hash of the indexed files and their stats, which changes whenever a world file changes"""
+        self.sorted_cache = {}
+        """the (worlds, keys) lists of each sort order, until the index changes"""
+        self.last_scan = None
+        self.lock = threading.Lock()
+    
+    def refresh(self, force=False):
+        """Rescan the directory if the last scan is older than the refresh interval (or if forced)."""
+        with self.lock:
+            if not force and self.last_scan is not None and time.monotonic() - self.last_scan < self.refresh_interval:
+                return
+            
+            stats = {}
+            if os.path.exists(self.directory):
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.json') and entry.name.split('_')[0].isdigit():
+                            stat = entry.stat()
+                            stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+            
+            for filename in set(self.entries) - set(stats):
+                del self.entries[filename]
+            for filename, stat in stats.items():
+                if self.stats.get(filename) != stat or filename not in self.entries:
+                    self._read(filename)
+            self.stats = {filename: stat for filename, stat in stats.items() if filename in self.entries}
+            self._update_etag()
+            self.last_scan = time.monotonic()
+    
+    def _read(self, filename):
+        """Index a world file, or drop it from the index if it cannot be read."""
+        try:
+            with open(os.path.join(self.directory, filename), 'r', encoding='utf-8') as f:
+                self.entries[filename] = _world_metadata(filename, json.load(f))
+        except Exception as e:
+            print(f"Error reading {filename}: {e}")
+            self.entries.pop(filename, None)
+    
+    def _update_etag(self):
+        digest = hashlib.sha1(repr(sorted(self.stats.items())).encode('utf-8')).hexdigest()
+        if digest[:16] != self.etag:
+            self.etag = digest[:16]
+            self.sorted_cache = {}
+    
+    def update(self, filename, world_dict):
+        """Index a world file that was just written."""
+        with self.lock:
+            stat = os.stat(os.path.join(self.directory, filename))
+            self.entries[filename] = _world_metadata(filename, world_dict)
+            self.stats[filename] = (stat.st_mtime_ns, stat.st_size)
+            self._update_etag()
+    
+    def sorted_worlds(self, sort='id'):
+        """Get the metadata of every world and their sort keys, in a sort order of SORT_KEYS."""
+        self.refresh()
+        with self.lock:
+            if sort not in self.sorted_cache:
+                worlds = sorted(self.entries.values(), key=SORT_KEYS[sort])
+                self.sorted_cache[sort] = (worlds, [SORT_KEYS[sort](world) for world in worlds])
+            return self.sorted_cache[sort]
+    
+    def worlds(self):
+        """Get the metadata of every world, sorted by ID."""
+        return list(self.sorted_worlds('id')[0])
+    
+    def query(self, language=None, name=None, sort='id', descending=False, cursor=None, limit=PAGE_SIZE):
+        """Get a page of the worlds that match some filters.
+        
+        Args:
+            language: Only include the worlds in this language (all of them if None)
+            name: Only include the worlds whose player name or filename contains this text (case insensitive)
+            sort: Sort order, a key of SORT_KEYS
+            descending: If True, the order is reversed
+            cursor: Sort key of the last world of the previous page (the first page if None)
+            limit: Maximum number of worlds in the page
+        
+        Returns:
+            A (worlds, next cursor, total) tuple, with the next cursor None on the last page and the
+            total number of worlds that match the filters
+        """
+        worlds, keys = self.sorted_worlds(sort)
+        name = name.lower() if name else None
+        
+        def matches(world):
+            return ((language is None or world['language'] == language)
+                    and (name is None or name in world['player_name'].lower() or name in world['filename'].lower()))
+        
+        if descending:
+            start = bisect.bisect_left(keys, cursor) - 1 if cursor is not None else len(worlds) - 1
+            indices = range(start, -1, -1)
+        else:
+            start = bisect.bisect_right(keys, cursor) if cursor is not None else 0
+            indices = range(start, len(worlds))
+        
+        page, next_cursor = [], None
+        for i in indices:
+            if matches(worlds[i]):
+                if len(page) == limit:
+                    next_cursor = SORT_KEYS[sort](page[-1])
+                    break
+                page.append(worlds[i])
+        
+        total = len(worlds) if language is None and name is None else sum(1 for world in worlds if matches(world))
+        return page, next_cursor, total
+    
+    def get_etag(self):
+        """Get the current ETag of the list of worlds."""
+        self.refresh()
+        return self.etag
+
+
+world_index = WorldIndex(WORLDS_DIR)
+
 
 def get_next_world_id():
-    """Scan data/premade_worlds/ and find the next available world ID (integer).
+    """Find the next available world ID (integer) in data/premade_worlds/.
     
     Returns:
         The next available ID as an integer
     """
-    if not os.path.exists(WORLDS_DIR):
+    existing_ids = [world['id'] for world in world_index.worlds()]
+    if not existing_ids:
         return 0
+    return max(existing_ids) + 1
+
+
+@contextmanager
+def world_id_lock():
+    """Hold the lock on the allocation of world IDs, across threads and worker processes.
     
-    existing_ids = []
-    for filename in os.listdir(WORLDS_DIR):
-        if filename.endswith('.json'):
-            # Extract ID from filename like "0_en.json" or "2_es.json"
+    The lock is an exclusive flock (or, on Windows, a msvcrt lock on the first byte) on a lock file
+    that is never removed, so only one request at a time can choose the next ID and create its file.
+    Each call opens the file, so threads of the same process also exclude each other, and the
+    operating system releases the lock if the worker dies, so a lock is never broken while its
+    holder is still working.
+    """
+    os.makedirs(WORLDS_DIR, exist_ok=True)
+    fd = os.open(os.path.join(WORLDS_DIR, ID_LOCK_FILENAME), os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        else:
+            while True:
+                try:
+                    # LK_LOCK gives up after about 10 seconds, so keep waiting
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
             try:
-                world_id = int(filename.split('_')[0])
-                existing_ids.append(world_id)
-            except (ValueError, IndexError):
-                pass
+                yield
+            finally:
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+
+def write_world_file(filepath, world_dict):
+    """Write a world file atomically.
     
-    if not existing_ids:
-        return 0
-    return max(existing_ids) + 1
+    The world is written to a temporary file in the same directory, which then replaces the
+    file, so readers (like premade_worlds.get_world) see either the previous or the new world.
+    """
+    directory, filename = os.path.split(filepath)
+    fd, temporary_path = tempfile.mkstemp(dir=directory, prefix=f'.{filename}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(world_dict, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, filepath)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def check_world_is_winnable(world_dict):
+    """Load the world and check that its objective can be completed.
+    
+    Returns:
+        An error message if the world is invalid or cannot be won, None otherwise
+    """
+    try:
+        world = dict_to_world(world_dict)
+    except Exception as e:
+        return f'Invalid world: {e.__class__.__name__}: {e}'
+    
+    analysis = analyze_world(world)
+    if not analysis['solvable']:
+        return f"The objective of this world cannot be completed: {analysis['reason']}"
+    return None
+
+
+def _encode_cursor(key):
+    """Encode the sort key of a world as an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor, sort):
+    """Decode a cursor into a sort key.
+    
+    Raises:
+        ValueError: If the cursor was not produced for this sort order
+    """
+    try:
+        key = tuple(json.loads(base64.urlsafe_b64decode(cursor.encode('ascii'))))
+    except Exception:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    expected = SORT_KEYS[sort]({'id': 0, 'filename': '', 'player_name': '', 'location_count': 0, 'character_count': 0})
+    if len(key) != len(expected) or any(type(value) is not type(default) for value, default in zip(key, expected)):
+        raise ValueError(f"Invalid cursor '{cursor}' for sort '{sort}'")
+    return key
 
 
 def get_world_files():
@@ -49,19 +333,7 @@ def get_world_files():
     Returns:
         List of (id, filename) tuples, sorted by ID
     """
-    if not os.path.exists(WORLDS_DIR):
-        return []
-    
-    world_files = []
-    for filename in os.listdir(WORLDS_DIR):
-        if filename.endswith('.json'):
-            try:
-                world_id = int(filename.split('_')[0])
-                world_files.append((world_id, filename))
-            except (ValueError, IndexError):
-                pass
-    
-    return sorted(world_files, key=lambda x: x[0])
+    return [(world['id'], world['filename']) for world in world_index.worlds()]
 
 
 @app.route('/')
@@ -73,40 +345,60 @@ def index():
 
 @app.route('/api/worlds', methods=['GET'])
 def list_worlds():
-    """List all worlds with basic metadata."""
+    """List the worlds with basic metadata, a page at a time.
+    
+    Query parameters (all optional):
+        language: Only list the worlds in this language ('en' or 'es')
+        name: Only list the worlds whose player name or filename contains this text
+        sort: 'id' (default), 'name', 'locations' or 'characters'
+        order: 'asc' (default) or 'desc'
+        limit: Number of worlds in the page (PAGE_SIZE by default, at most MAX_PAGE_SIZE)
+        cursor: The next_cursor of the previous page
+        view: 'full' (default) or 'summary' (only the ID, filename, language and player name)
+    
+    Returns:
+        {'worlds': [...], 'next_cursor': str or None, 'total': number of matching worlds}
+    
+    The list is served from the world index. Its ETag changes whenever a world file changes, so a
+    request with a matching If-None-Match header gets an empty 304 response.
+    """
     try:
-        # Note: language parameter is accepted for frontend compatibility but doesn't filter the list
-        request.args.get('language', 'en')
-        
-        worlds = []
-        for world_id, filename in get_world_files():
-            filepath = os.path.join(WORLDS_DIR, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    player_name = data.get('player', {}).get('name', 'Unknown')
-                    location_count = len(data.get('locations', []))
-                    character_count = len(data.get('characters', []))
-                    
-                    # Extract language from filename (e.g., "0_en.json" -> "en")
-                    language = 'en'
-                    if '_' in filename:
-                        lang_part = filename.split('_')[1].split('.')[0].lower()
-                        if lang_part in ['en', 'es']:
-                            language = lang_part
-                    
-                    worlds.append({
-                        'id': world_id,
-                        'filename': filename,
-                        'player_name': player_name,
-                        'location_count': location_count,
-                        'character_count': character_count,
-                        'language': language
-                    })
-            except Exception as e:
-                print(f"Error reading {filename}: {e}")
+        language = request.args.get('language', '').lower() or None
+        name = request.args.get('name', '').strip() or None
+        sort = request.args.get('sort', 'id')
+        order = request.args.get('order', 'asc')
+        view = request.args.get('view', 'full')
+        if language not in [None, 'en', 'es']:
+            return jsonify({'error': f"Unknown language '{language}'"}), 400
+        if sort not in SORT_KEYS:
+            return jsonify({'error': f"Unknown sort '{sort}' (expected one of: {', '.join(SORT_KEYS)})"}), 400
+        if order not in ['asc', 'desc'] or view not in ['full', 'summary']:
+            return jsonify({'error': "The order must be 'asc' or 'desc', and the view 'full' or 'summary'"}), 400
+        if not request.args.get('limit', str(PAGE_SIZE)).isdigit():
+            return jsonify({'error': 'The limit must be a positive integer'}), 400
+        limit = max(1, min(int(request.args.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE))
+        try:
+            cursor = _decode_cursor(request.args['cursor'], sort) if request.args.get('cursor') else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify(worlds), 200
+        # The ETag of the page depends on the worlds and on the query
+        etag = hashlib.sha1(f"{world_index.get_etag()}?{request.query_string.decode('utf-8')}".encode('utf-8')).hexdigest()[:16]
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            worlds, next_cursor, total = world_index.query(language, name, sort, order == 'desc', cursor, limit)
+            if view == 'summary':
+                worlds = [{field: world[field] for field in SUMMARY_FIELDS} for world in worlds]
+            response = jsonify({
+                'worlds': worlds,
+                'next_cursor': _encode_cursor(next_cursor) if next_cursor is not None else None,
+                'total': total
+            })
+        response.set_etag(etag)
+        # Browsers revalidate the list on every request instead of using a stale copy
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -131,17 +423,23 @@ def create_world():
         # Convert form data to world dict format
         world_dict = _form_to_world_dict(data)
         
-        # Get next ID and save
-        world_id = get_next_world_id()
-        filename = f"{world_id}_{language}.json"
-        filepath = os.path.join(WORLDS_DIR, filename)
+        # Report every broken reference at once, before loading the world
+        validation = validate_world_dict(world_dict)
+        if not validation['valid']:
+            return jsonify({'error': '; '.join(error['message'] for error in validation['errors']), 'errors': validation['errors']}), 400
         
-        # Ensure directory exists
-        os.makedirs(WORLDS_DIR, exist_ok=True)
+        # Reject worlds that cannot be won
+        error = check_world_is_winnable(world_dict)
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Write JSON file
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(world_dict, f, ensure_ascii=False, indent=2)
+        # Get next ID and save (the index is rescanned, as other workers may have created worlds)
+        with world_id_lock():
+            world_index.refresh(force=True)
+            world_id = get_next_world_id()
+            filename = f"{world_id}_{language}.json"
+            write_world_file(os.path.join(WORLDS_DIR, filename), world_dict)
+            world_index.update(filename, world_dict)
         
         return jsonify({
             'id': world_id,
@@ -208,11 +506,21 @@ def update_world(world_id):
         # Convert form data to world dict format
         world_dict = _form_to_world_dict(data)
         
+        # Report every broken reference at once, before loading the world
+        validation = validate_world_dict(world_dict)
+        if not validation['valid']:
+            return jsonify({'error': '; '.join(error['message'] for error in validation['errors']), 'errors': validation['errors']}), 400
+        
+        # Reject worlds that cannot be won
+        error = check_world_is_winnable(world_dict)
+        if error:
+            return jsonify({'error': error}), 400
+        
         filepath = os.path.join(WORLDS_DIR, found_filename)
         
         # Write updated JSON file
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(world_dict, f, ensure_ascii=False, indent=2)
+        write_world_file(filepath, world_dict)
+        world_index.update(found_filename, world_dict)
         
         return jsonify({
             'id': world_id,
@@ -224,6 +532,456 @@ def update_world(world_id):
         return jsonify({'error': str(e)}), 500
 
 
+def _parse_bulk_record(record, language, world_id=None):
+    """Read a world of a bulk import.
+    
+    A record is either a world dictionary or an exported entry ({'id', 'language', 'world'}).
+    
+    Returns:
+        A (language, source ID, world dictionary) tuple
+    
+    Raises:
+        ValueError: If the record is not a world or its language is unknown
+    """
+    if not isinstance(record, dict):
+        raise ValueError('A world must be a JSON object')
+    if 'world' in record:
+        language, world_id, record = record.get('language', language), record.get('id', world_id), record['world']
+    if language not in ['en', 'es']:
+        raise ValueError(f"Unknown language '{language}'")
+    if not isinstance(record, dict):
+        raise ValueError('A world must be a JSON object')
+    return language, world_id, record
+
+
+def _iter_bulk_records(stream, format, language):
+    """Read the worlds of a bulk import one at a time from the request body.
+    
+    Args:
+        stream: The request body
+        format: 'ndjson' (one world per line), 'zip' or 'tar' (one JSON file per world, possibly compressed)
+        language: The language of the worlds that do not specify it
+    
+    Yields:
+        (source, language, source ID, world dictionary, error) tuples, where the source is the line
+        or the name of the file in the archive, and error is None or the reason the world was not read
+    """
+    def parse(source, data, language, world_id=None):
+        try:
+            return (source, *_parse_bulk_record(json.loads(data), language, world_id), None)
+        except ValueError as e:
+            return source, language, world_id, None, str(e)
+    
+    def member_names(name):
+        # Files named like the world files ("3_es.json") keep their ID (and language)
+        match = re.fullmatch(r'(\d+)_(\w+)\.json', os.path.basename(name))
+        return (match.group(2), int(match.group(1))) if match else (language, None)
+    
+    if format == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                yield parse(f'line {line_number}', line, language)
+    elif format == 'zip':
+        # Zip archives are read from their end, so the body is spooled first
+        with tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_SIZE) as archive_file:
+            while chunk := stream.read(1024 * 1024):
+                archive_file.write(chunk)
+            archive_file.seek(0)
+            with zipfile.ZipFile(archive_file) as archive:
+                for name in archive.namelist():
+                    if name.endswith('.json'):
+                        yield parse(name, archive.read(name), *member_names(name))
+    elif format == 'tar':
+        with tarfile.open(fileobj=stream, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith('.json'):
+                    yield parse(member.name, archive.extractfile(member).read(), *member_names(member.name))
+    else:
+        raise ValueError(f"Unknown format '{format}' (expected ndjson, zip or tar)")
+
+
+_bulk_executor = None
+_bulk_executor_lock = threading.Lock()
+
+
+def get_bulk_executor():
+    """Return the process pool that validates the imported worlds, created on the first bulk import.
+    
+    The pool is shared by the requests, so concurrent imports queue their worlds instead of each
+    one starting its own processes.
+    """
+    global _bulk_executor
+    with _bulk_executor_lock:
+        if _bulk_executor is None:
+            _bulk_executor = ProcessPoolExecutor(max_workers=BULK_WORKERS)
+        return _bulk_executor
+
+
+def discard_bulk_executor(executor):
+    """Forget a process pool that can no longer be used (e.g. a process died), so the next import starts a new one."""
+    global _bulk_executor
+    with _bulk_executor_lock:
+        if _bulk_executor is executor:
+            _bulk_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _reference_error(world_dict):
+    """Return the errors of validate_world_dict as a single message, or None if the world is valid."""
+    validation = validate_world_dict(world_dict)
+    if validation['valid']:
+        return None
+    return '; '.join(error['message'] for error in validation['errors'])
+
+
+def _import_batch(batch, executor, id_map, results):
+    """Validate a batch of imported worlds in parallel and write the valid ones with new IDs.
+    
+    Worlds that shared an ID in the import (e.g. the translations of a world) share the new ID.
+    The whole batch is validated before the ID lock is taken, so the lock is only held to
+    choose the IDs and write the files. As in create_world, the references of each world are
+    checked (see validate_world_dict) before it is loaded to check that it can be won.
+    """
+    batch = [(source, language, world_id, world_dict, error if error is not None else _reference_error(world_dict))
+             for source, language, world_id, world_dict, error in batch]
+    futures = [executor.submit(check_world_is_winnable, world_dict) if error is None else None
+               for source, language, world_id, world_dict, error in batch]
+    errors = []
+    for (source, language, world_id, world_dict, error), future in zip(batch, futures):
+        if error is None:
+            try:
+                error = future.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                error = f'Invalid world: {e.__class__.__name__}: {e}'
+        errors.append(error)
+    
+    with world_id_lock():
+        world_index.refresh(force=True)
+        next_id = get_next_world_id()
+        for (source, language, world_id, world_dict, _), error in zip(batch, errors):
+            if error is None:
+                new_id = id_map.get(world_id, next_id)
+                filename = f"{new_id}_{language}.json"
+                if os.path.exists(os.path.join(WORLDS_DIR, filename)):
+                    error = f'Duplicate world {world_id} for language {language}'
+            if error is not None:
+                results['errors'].append({'source': source, 'error': error})
+                continue
+            
+            if new_id == next_id:
+                next_id += 1
+            if world_id is not None:
+                id_map[world_id] = new_id
+            write_world_file(os.path.join(WORLDS_DIR, filename), world_dict)
+            world_index.update(filename, world_dict)
+            results['created'].append({'source': source, 'id': new_id, 'filename': filename})
+
+
+@app.route('/api/worlds/bulk', methods=['POST'])
+def import_worlds():
+    """Create many worlds from one request.
+    
+    The body is streamed and can be NDJSON (one world dictionary, or exported entry, per line), or
+    a zip or tar archive of world files (the format is given by the 'format' parameter, or by the
+    Content-Type). Each world is validated like in create_world (checking its references, then
+    loading it and checking that it can be won, in parallel), and written atomically with a new ID.
+    
+    Returns:
+        {'created': [{'source', 'id', 'filename'}], 'errors': [{'source', 'error'}]}
+    """
+    try:
+        language = request.args.get('language', 'en').lower()
+        content_type = request.mimetype or ''
+        format = request.args.get('format') or ('zip' if 'zip' in content_type else 'tar' if 'tar' in content_type or 'gzip' in content_type else 'ndjson')
+        if format not in ['ndjson', 'zip', 'tar']:
+            return jsonify({'error': f"Unknown format '{format}' (expected ndjson, zip or tar)"}), 400
+        
+        os.makedirs(WORLDS_DIR, exist_ok=True)
+        results, id_map, batch = {'created': [], 'errors': []}, {}, []
+        executor = get_bulk_executor()
+        for record in _iter_bulk_records(request.stream, format, language):
+            batch.append(record)
+            if len(batch) == BULK_BATCH_SIZE:
+                _import_batch(batch, executor, id_map, results)
+                batch = []
+        if batch:
+            _import_batch(batch, executor, id_map, results)
+        
+        status = 201 if results['created'] else 400
+        return jsonify(results), status
+    
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        return jsonify({'error': f'Invalid archive: {e}'}), 400
+    except BrokenProcessPool as e:
+        discard_bulk_executor(executor)
+        return jsonify({'error': str(e)}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/worlds/export', methods=['GET'])
+def export_worlds():
+    """Stream every world (or those of a language), sorted by ID.
+    
+    Query parameters:
+        language: Only export the worlds in this language (all of them if not given)
+        format: 'ndjson' (default; one {'id', 'language', 'filename', 'world'} entry per line) or
+            'tar' (the world files), both accepted by the bulk import
+    """
+    language = request.args.get('language', '').lower() or None
+    format = request.args.get('format', 'ndjson')
+    if format not in ['ndjson', 'tar']:
+        return jsonify({'error': f"Unknown format '{format}' (expected ndjson or tar)"}), 400
+    worlds = [world for world in world_index.worlds() if language is None or world['language'] == language]
+    
+    def read_world_files():
+        for world in worlds:
+            try:
+                with open(os.path.join(WORLDS_DIR, world['filename']), 'rb') as f:
+                    yield world, f.read()
+            except FileNotFoundError:
+                # Deleted since the list was taken
+                continue
+    
+    def generate_ndjson():
+        for world, data in read_world_files():
+            entry = {'id': world['id'], 'language': world['language'], 'filename': world['filename'], 'world': json.loads(data)}
+            yield json.dumps(entry, ensure_ascii=False) + '\n'
+    
+    def generate_tar():
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w|') as archive:
+            for world, data in read_world_files():
+                info = tarfile.TarInfo(world['filename'])
+                info.size, info.mtime = len(data), int(time.time())
+                archive.addfile(info, io.BytesIO(data))
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    if format == 'tar':
+        return Response(stream_with_context(generate_tar()), mimetype='application/x-tar',
+                        headers={'Content-Disposition': 'attachment; filename=worlds.tar'})
+    return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+
+
+def _diagnostic(section, entry_id, field, message):
+    return {'section': section, 'id': entry_id, 'field': field, 'message': message}
+
+
+def _check_name(section, entry):
+    if not isinstance(entry.get('name'), str) or not entry['name'].strip():
+        return [_diagnostic(section, entry.get('id'), 'name', 'The name is required')]
+    return []
+
+
+def _check_held_items(section, entry, field, ids):
+    return [_diagnostic(section, entry.get('id'), field, f"Unknown item '{item_id}'")
+            for item_id in entry.get(field, []) if item_id not in ids['items']]
+
+
+def _check_location(location, ids):
+    """Check the references of a location (connections, blocked passages and items)."""
+    diagnostics = _check_name('locations', location)
+    location_id = location.get('id')
+    for connecting_id in location.get('connecting_locations', []):
+        if connecting_id not in ids['locations']:
+            diagnostics.append(_diagnostic('locations', location_id, 'connecting_locations', f"Unknown location '{connecting_id}'"))
+        elif connecting_id == location_id:
+            diagnostics.append(_diagnostic('locations', location_id, 'connecting_locations', 'A location cannot connect to itself'))
+    
+    for blocked_id, passage in (location.get('blocked_locations') or {}).items():
+        field = f'blocked_locations.{blocked_id}'
+        if blocked_id not in ids['locations']:
+            diagnostics.append(_diagnostic('locations', location_id, field, f"Unknown location '{blocked_id}'"))
+        obstacle = passage.get('obstacle') if isinstance(passage, dict) else None
+        if not isinstance(obstacle, dict):
+            diagnostics.append(_diagnostic('locations', location_id, field, 'The blocked passage has no obstacle'))
+            continue
+        if obstacle.get('type') == ComponentKind.ITEM.value:
+            if obstacle.get('id') not in ids['items']:
+                diagnostics.append(_diagnostic('locations', location_id, field, f"Unknown obstacle item '{obstacle.get('id')}'"))
+        elif obstacle.get('type') == ComponentKind.PUZZLE.value:
+            missing = [key for key in ['name', 'descriptions', 'problem', 'answer'] if key not in obstacle]
+            if missing:
+                diagnostics.append(_diagnostic('locations', location_id, field, f"The puzzle has no {', '.join(missing)}"))
+        else:
+            diagnostics.append(_diagnostic('locations', location_id, field, f"Unknown obstacle type '{obstacle.get('type')}'"))
+        if passage.get('key') and passage['key'] not in ids['items']:
+            diagnostics.append(_diagnostic('locations', location_id, field, f"Unknown key item '{passage['key']}'"))
+    
+    return diagnostics + _check_held_items('locations', location, 'items', ids)
+
+
+def _check_item(item, ids):
+    """Check that an item has a name."""
+    return _check_name('items', item)
+
+
+def _check_character(character, ids, section='characters'):
+    """Check the location and inventory of a character (or of the player)."""
+    diagnostics = _check_name(section, character)
+    if character.get('location') not in ids['locations']:
+        diagnostics.append(_diagnostic(section, character.get('id'), 'location', f"Unknown location '{character.get('location')}'"))
+    return diagnostics + _check_held_items(section, character, 'inventory', ids)
+
+
+def _check_player(player, ids):
+    return _check_character(player, ids, section='player')
+
+
+def _check_objective(objective, ids):
+    """Check that the components of the objective exist."""
+    diagnostics = []
+    sections = {ComponentKind.LOCATION.value: 'locations', ComponentKind.ITEM.value: 'items', ComponentKind.CHARACTER.value: 'characters'}
+    for part in ['first', 'second']:
+        target = objective.get(part) or {}
+        if target.get('type') not in sections:
+            diagnostics.append(_diagnostic('objective', None, part, f"Unknown objective type '{target.get('type')}'"))
+        elif target.get('id') not in ids[sections[target['type']]]:
+            diagnostics.append(_diagnostic('objective', None, part, f"Unknown {target['type'].lower()} '{target.get('id')}'"))
+    return diagnostics
+
+
+ENTRY_CHECKS = {
+    'locations': _check_location,
+    'items': _check_item,
+    'characters': _check_character,
+    'player': _check_player,
+    'objective': _check_objective,
+}
+
+_validation_cache = OrderedDict()
+_validation_cache_lock = threading.Lock()
+
+
+def _check_entry(section, entry, ids, ids_digest):
+    """Check an entry of a world, reusing the diagnostics of the same entry with the same IDs.
+    
+    Returns:
+        A (diagnostics, cached) tuple
+    """
+    key = (section, hashlib.sha1(json.dumps(entry, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest(), ids_digest)
+    with _validation_cache_lock:
+        if key in _validation_cache:
+            _validation_cache.move_to_end(key)
+            return _validation_cache[key], True
+    
+    diagnostics = ENTRY_CHECKS[section](entry, ids)
+    with _validation_cache_lock:
+        _validation_cache[key] = diagnostics
+        if len(_validation_cache) > VALIDATION_CACHE_SIZE:
+            _validation_cache.popitem(last=False)
+    return diagnostics, False
+
+
+def _graph_metrics(locations, start_id):
+    """Count the passages between the locations and the locations the player can reach."""
+    open_passages = {location['id']: set(location.get('connecting_locations', [])) for location in locations}
+    all_passages = {location['id']: open_passages[location['id']] | set(location.get('blocked_locations') or {})
+                    for location in locations}
+    
+    def reachable(passages):
+        visited, frontier = {start_id}, [start_id]
+        while frontier:
+            for next_id in passages.get(frontier.pop(), ()):
+                if next_id in passages and next_id not in visited:
+                    visited.add(next_id)
+                    frontier.append(next_id)
+        return visited if start_id in passages else set()
+    
+    reachable_now, reachable_ever = reachable(open_passages), reachable(all_passages)
+    return {
+        'locations': len(locations),
+        'passages': len({frozenset((a, b)) for a, targets in open_passages.items() for b in targets if a != b}),
+        'blocked_passages': sum(len(location.get('blocked_locations') or {}) for location in locations),
+        'reachable_locations': len(reachable_now),
+        'reachable_locations_unblocking': len(reachable_ever),
+        'unreachable_locations': [location['id'] for location in locations if location['id'] not in reachable_ever],
+    }
+
+
+def validate_world_dict(world_dict):
+    """Find all the reference and consistency errors of a world, without loading it.
+    
+    Each location, item, character, the player and the objective are checked against indexes of
+    the IDs of the world. The diagnostics of an entry are cached by its content and the IDs of the
+    world, so when the editor validates after each change only the changed entries are checked.
+    
+    Returns:
+        Dictionary with 'valid', the 'errors' (that prevent loading the world), the 'warnings'
+        (e.g. locations the player can never reach), the graph 'metrics' and the number of
+        entries that were 'checked' (the others came from the cache)
+    """
+    errors, warnings = [], []
+    sections = {section: world_dict.get(section) or [] for section in ['locations', 'items', 'characters']}
+    for section, entries in sections.items():
+        if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+            return {'valid': False, 'errors': [_diagnostic(section, None, None, f'The {section} must be a list of objects')],
+                    'warnings': [], 'metrics': {}, 'checked': 0}
+    player = world_dict.get('player') if isinstance(world_dict.get('player'), dict) else None
+    if player is None:
+        errors.append(_diagnostic('player', None, None, 'The player is required'))
+    if not sections['locations']:
+        errors.append(_diagnostic('locations', None, None, 'At least one location is required'))
+    
+    # Indexes of the IDs, and errors that involve several entries
+    ids = {section: {entry.get('id') for entry in entries} for section, entries in sections.items()}
+    ids['characters'] = ids['characters'] | ({player.get('id')} if player else set())
+    for section, entries in sections.items():
+        for field in ['id', 'name']:
+            for value, count in Counter(entry.get(field) for entry in entries).items():
+                if count > 1:
+                    errors.append(_diagnostic(section, value if field == 'id' else None, field, f"{count} {section} have the {field} '{value}'"))
+    holders = Counter(item_id for location in sections['locations'] for item_id in location.get('items', []))
+    holders.update(item_id for character in sections['characters'] + ([player] if player else []) for item_id in character.get('inventory', []))
+    errors += [_diagnostic('items', item_id, None, f"The item '{item_id}' is in {count} places") for item_id, count in holders.items() if count > 1]
+    
+    ids_digest = hashlib.sha1(repr(sorted((section, sorted(map(str, values))) for section, values in ids.items())).encode('utf-8')).hexdigest()
+    entries = [(section, entry) for section, section_entries in sections.items() for entry in section_entries]
+    entries += [('player', player)] if player else []
+    entries += [('objective', world_dict['objective'])] if isinstance(world_dict.get('objective'), dict) else []
+    checked = 0
+    for section, entry in entries:
+        diagnostics, cached = _check_entry(section, entry, ids, ids_digest)
+        errors += diagnostics
+        checked += not cached
+    
+    metrics = _graph_metrics(sections['locations'], player.get('location') if player else None)
+    metrics.update({'items': len(sections['items']), 'characters': len(sections['characters'])})
+    warnings += [_diagnostic('locations', location_id, None, 'The player can never reach this location')
+                 for location_id in metrics['unreachable_locations']]
+    obstacles = {passage['obstacle'].get('id') for location in sections['locations'] for passage in (location.get('blocked_locations') or {}).values()
+                 if isinstance(passage, dict) and isinstance(passage.get('obstacle'), dict)}
+    warnings += [_diagnostic('items', item['id'], None, 'The item is not in any location or inventory')
+                 for item in sections['items'] if item.get('id') not in holders and item.get('id') not in obstacles]
+    
+    return {'valid': not errors, 'errors': errors, 'warnings': warnings, 'metrics': metrics, 'checked': checked}
+
+
+@app.route('/api/worlds/validate', methods=['POST'])
+def validate_world():
+    """Validate a world without saving it, for the editor to show the problems while it is edited.
+    
+    The body is the form data of the editor (like in create_world), or {'world': world dictionary}.
+    The objective is not checked for solvability (the world is checked when it is saved).
+    
+    Returns:
+        The diagnostics of validate_world_dict
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'The body must be a JSON object'}), 400
+        world_dict = data['world'] if isinstance(data.get('world'), dict) else _form_to_world_dict(data)
+        return jsonify(validate_world_dict(world_dict)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 def _form_to_world_dict(form_data):
     """Convert form data to world dictionary format.
     
@@ -5,32 +5,22 @@ import os
 import jsonpickle
 from utils import premade_worlds
 
+from prompts import prompt_narrate_current_scene, prompt_describe_objective
 from models import WorldUpdatePrediction
-from prompts import prompt_narrate_current_scene, prompt_world_update, prompt_describe_objective
+from reasoning import predict_world_update, repair_world_update
+from speculation import SpeculativePrefetcher
+from fast_commands import match_trivial_command
 from utils.config_loader import load_config
+from world import load_languages
 from ui import create_and_launch_interface
 
 PATH_GAMELOGS = 'data/playthroughs/raw'
 
-def clean_json_response(response: str) -> str:
-    """Strip markdown code blocks from LLM JSON response if present.
-    
-    Handles formats like:
-    - ```json {...} ```
-    - ``` {...} ```
-    - Any leading/trailing whitespace and backticks
-    """
-    response = response.strip()
-    
-    # Remove markdown code block wrappers
-    if response.startswith('```'):
-        # Remove starting ``` and optional language identifier (e.g., ```json)
-        response = re.sub(r'^```(?:json)?\s*', '', response)
-        # Remove ending ```
-        response = re.sub(r'\s*```$', '', response)
-        response = response.strip()
-    
-    return response
+# Narration of a turn whose predicted changes the world rejected (nothing changed)
+REJECTED_UPDATE_NARRATIONS = {
+    'en': "You cannot do that right now.",
+    'es': "No puedes hacer eso ahora.",
+}
 
 def save_game_log():
     """Save the game log to disk."""
@@ -52,6 +42,7 @@ def create_turn_entry(turn_num, narration, prev_symbolic_state="", prev_rendered
     """
     game_log_dictionary[turn_num] = {
         "date": time.ctime(time.time()),
+        "created_ns": time.monotonic_ns(),
         "narration": narration,
         "previous_symbolic_world_state": prev_symbolic_state,
         "previous_rendered_world_state": prev_rendered_state,
@@ -71,6 +62,21 @@ def update_turn_with_user_input(turn_num, user_input, predicted_outcomes,
         game_log_dictionary[turn_num]["updated_rendered_world_state"] = updated_rendered_state
         save_game_log()
 
+def render_reasoning_world_state(input):
+    """Render the world state given to the reasoning model for a player input.
+
+    The scene may be rendered for the input, within a token budget or as JSON (see the render options).
+    """
+    if render_token_budget or render_adjacent_items or render_format != 'text':
+        return world.render_world(language=language, token_budget=render_token_budget or None, input=input,
+                                  adjacent_items=render_adjacent_items, format=render_format)
+    return world.render_world(language=language)
+
+def record_llm_call(turn_num, start_ns):
+    """Extend the span of the model calls of a turn (llm_start_ns to llm_end_ns) with a call that just ended."""
+    game_log_dictionary[turn_num].setdefault("llm_start_ns", start_ns)
+    game_log_dictionary[turn_num]["llm_end_ns"] = time.monotonic_ns()
+
 # Load configuration and initialize models
 config_data = load_config()
 config = config_data['config']
@@ -80,6 +86,14 @@ narrative_model = config_data['narrative_model']
 log_filename = config_data['log_filename']
 reasoning_model_name = config_data['reasoning_model_name']
 narrative_model_name = config_data['narrative_model_name']
+fallback_reasoning_model = config_data['fallback_reasoning_model']
+reasoning_policy = config_data['reasoning_policy']
+render_token_budget = config.getint('Options', 'RenderTokenBudget', fallback=0)
+render_adjacent_items = config.getboolean('Options', 'RenderAdjacentItems', fallback=False)
+render_format = config.get('Options', 'RenderFormat', fallback='text')
+
+# Phrase tables of additional languages (data/languages/<language>.json)
+load_languages()
 
 # The game loop
 def game_loop(message, history):
@@ -91,6 +105,11 @@ def game_loop(message, history):
     global last_predicted_outcomes
     global last_world_state
 
+    # Monotonic timestamps (in nanoseconds) of the turn and of its model calls; a retried input starts again
+    for key in ("llm_start_ns", "llm_end_ns", "turn_end_ns"):
+        game_log_dictionary[number_of_turns].pop(key, None)
+    game_log_dictionary[number_of_turns]["turn_start_ns"] = time.monotonic_ns()
+
     # Update the current turn (which was pre-created with empty user_input) with player's input
     update_turn_with_user_input(
         turn_num=number_of_turns,
@@ -102,35 +121,83 @@ def game_loop(message, history):
 
     answer = ""
 
-    # Get the changes in the world
+    # Get the changes in the world: trivial commands are handled locally, otherwise
+    # from a speculative prefetch if the input was predicted, or from the reasoning model
     prev_rendered_state = world.render_world(language=language)
-    system_msg_update, user_msg_update = prompt_world_update(prev_rendered_state, message, language=language)
-    response_update = reasoning_model.prompt_model(system_msg=system_msg_update, user_msg=user_msg_update)
-
-    # Clean any markdown wrappers from the response
-    response_update = clean_json_response(response_update)
-
-    # Parse JSON response into Pydantic model
-    try:
-        world_update = WorldUpdatePrediction.model_validate_json(response_update)
-        
-        # Show the detected changes in the fictional world
-        predicted_outcomes_text = world_update.model_dump_json(indent=2)
-        last_predicted_outcomes = f"Player input: {message}\n{predicted_outcomes_text}\n"
-        print(f"🛠️ Predicted outcomes of the player input 🛠️\n{last_predicted_outcomes}")
-        
-    except Exception as e:
-        print(f"Error parsing world update response: {e}")
-        print(f"Raw response: {response_update}")
+    fast_command = match_trivial_command(message, world, language=language)
+    if fast_command is not None:
+        fast_command, world_update = fast_command
+        game_log_dictionary[number_of_turns]["fast_command"] = fast_command
+        if prefetcher is not None:
+            prefetcher.cancel()
+    else:
+        # The reasoning model may get a scene rendered for this input, within a token budget or as JSON
+        reasoning_world_state = render_reasoning_world_state(message)
+        if reasoning_world_state != prev_rendered_state:
+            game_log_dictionary[number_of_turns]["reasoning_world_state"] = reasoning_world_state
+
+        # A prefetch is only used if it was prompted with the same world state
+        prefetched_response = None
+        if prefetcher is not None:
+            prefetched_response = prefetcher.take(message, prev_rendered_state, reasoning_world_state, timeout=reasoning_policy.timeout)
+            game_log_dictionary[number_of_turns]["speculative_hit"] = prefetched_response is not None
+
+        # Retries, repairs and fallback are recorded in the turn log
+        llm_start_ns = time.monotonic_ns()
+        world_update, reasoning_attempts = predict_world_update(
+            reasoning_model,
+            reasoning_world_state,
+            message,
+            language=language,
+            policy=reasoning_policy,
+            fallback_model=fallback_reasoning_model,
+            initial_response=prefetched_response
+        )
+        record_llm_call(number_of_turns, llm_start_ns)
+        game_log_dictionary[number_of_turns]["reasoning_attempts"] = reasoning_attempts
+
+    if world_update is None:
+        print(f"Error processing the player input after {len(reasoning_attempts)} attempts")
+        save_game_log()
         return "Error processing your input. Please try again."
+
+    # Show the detected changes in the fictional world
+    predicted_outcomes_text = world_update.model_dump_json(indent=2)
+    last_predicted_outcomes = f"Player input: {message}\n{predicted_outcomes_text}\n"
+    print(f"🛠️ Predicted outcomes of the player input 🛠️\n{last_predicted_outcomes}")
     
-    # World update
-    world.update(response_update)
+    # World update (a travel to a location that is not adjacent has a step for each location of the route)
+    update_result = world.update(world_update.model_dump_json())
+    update_repairs = 0
+    while not update_result.ok and fast_command is None and update_repairs < reasoning_policy.max_update_repairs:
+        # The world rejected the prediction and was not changed: ask for a prediction it can apply
+        update_repairs += 1
+        llm_start_ns = time.monotonic_ns()
+        repaired_update, attempt = repair_world_update(
+            reasoning_model,
+            reasoning_world_state,
+            message,
+            world_update.model_dump_json(),
+            update_result.describe(),
+            language=language,
+            policy=reasoning_policy
+        )
+        record_llm_call(number_of_turns, llm_start_ns)
+        reasoning_attempts.append(attempt)
+        if repaired_update is not None:
+            game_log_dictionary[number_of_turns].setdefault("rejected_world_update", update_result.to_dict())
+            world_update = repaired_update
+            update_result = world.update(world_update.model_dump_json())
+    if not update_result.ok:
+        # Nothing was applied, so the rejected narration is not told and the log keeps no predicted changes
+        game_log_dictionary[number_of_turns]["rejected_predicted_outcomes"] = world_update.model_dump_json(indent=2)
+        world_update = WorldUpdatePrediction(narration=REJECTED_UPDATE_NARRATIONS.get(language, REJECTED_UPDATE_NARRATIONS['en']))
+    game_log_dictionary[number_of_turns]["world_update_result"] = update_result.to_dict()
     updated_symbolic_state = jsonpickle.encode(world, unpicklable=True)
     updated_rendered_state = world.render_world(language=language)
     
-    if last_player_position is not world.player.location:
-        # Narrate new scene
+    if last_player_position is not world.player.location or fast_command == 'look':
+        # Narrate new scene (or the current one again, if the player looked around)
         last_player_position = world.player.location
         system_msg_new_scene, user_msg_new_scene = prompt_narrate_current_scene(
             updated_rendered_state,
@@ -138,7 +205,9 @@ def game_loop(message, history):
             language=language
             )
 
+        llm_start_ns = time.monotonic_ns()
         new_scene_narration = narrative_model.prompt_model(system_msg=system_msg_new_scene, user_msg=user_msg_new_scene)
+        record_llm_call(number_of_turns, llm_start_ns)
         world.player.visited_locations[world.player.location.name]+=[new_scene_narration] 
         answer += f"\n{new_scene_narration}\n\n"
     else:
@@ -162,6 +231,7 @@ def game_loop(message, history):
     game_log_dictionary[number_of_turns]["predicted_outcomes"] = world_update.model_dump_json(indent=2)
     game_log_dictionary[number_of_turns]["updated_symbolic_world_state"] = updated_symbolic_state
     game_log_dictionary[number_of_turns]["updated_rendered_world_state"] = updated_rendered_state
+    game_log_dictionary[number_of_turns]["turn_end_ns"] = time.monotonic_ns()
     save_game_log()
     
     # Store the answer for next turn
@@ -173,6 +243,10 @@ def game_loop(message, history):
                      prev_symbolic_state=updated_symbolic_state,
                      prev_rendered_state=updated_rendered_state)
     save_game_log()
+
+    # Prefetch the predictable inputs for the next turn while the player types
+    if prefetcher is not None:
+        prefetcher.schedule(world, updated_rendered_state, render=render_reasoning_world_state)
     
     return answer.replace("<",r"\<").replace(">", r"\>")
 
@@ -194,6 +268,17 @@ previous_answer = ""
 last_predicted_outcomes = ""
 last_world_state = ""
 
+# Optional speculative mode: prefetch the world updates of predictable inputs
+prefetcher = None
+if config.getboolean('Speculation', 'Enabled', fallback=False):
+    prefetcher = SpeculativePrefetcher(
+        reasoning_model,
+        language=language,
+        max_prefetches_per_turn=config.getint('Speculation', 'MaxPrefetchesPerTurn', fallback=4),
+        max_prefetches_per_session=config.getint('Speculation', 'MaxPrefetchesPerSession', fallback=200),
+        timeout=reasoning_policy.timeout
+    )
+
 print(f"\n🌎 World state 🌍\n{world.render_world(language=language)}\n")
 
 #Generate a description of the starting scene
@@ -224,6 +309,9 @@ create_turn_entry(number_of_turns, starting_narration_for_log,
                   prev_rendered_state=initial_rendered_state)
 save_game_log()
 
+if prefetcher is not None:
+    prefetcher.schedule(world, initial_rendered_state, render=render_reasoning_world_state)
+
 # Instantiate the Gradio app
 gradio_interface = create_and_launch_interface(game_loop, starting_narration_for_log)
 
@@ -0,0 +1,91 @@
+"""Rule-based fast path for trivial player commands.
+
+Commands like checking the inventory, looking around or going to a reachable
+location are fully determined by the world state, so they are answered locally
+without prompting the reasoning model. Only unambiguous matches are handled
+here; everything else goes through `prompt_world_update` as usual.
+"""
+
+from models import WorldUpdatePrediction, WorldUpdateStep
+from speculation import normalize_input
+from world import normalize_name
+
+INVENTORY_COMMANDS = {
+    'en': ['inventory', 'i', 'inv', 'check inventory', 'show inventory', 'open inventory', 'what do i have'],
+    'es': ['inventario', 'inv', 'ver inventario', 'mirar inventario', 'revisar inventario', 'abrir inventario', 'que tengo'],
+}
+
+LOOK_COMMANDS = {
+    'en': ['look', 'l', 'look around', 'where am i', 'describe scene'],
+    'es': ['mirar', 'miro', 'mira', 'mirar alrededor', 'miro alrededor', 'mirar a mi alrededor', 'observar', 'donde estoy'],
+}
+
+NARRATIONS = {
+    'en': {
+        'inventory': 'You have the following items: {}.',
+        'empty_inventory': 'Your inventory is empty.',
+        'look': 'You look around.',
+        'move': 'You go to {}.',
+    },
+    'es': {
+        'inventory': 'Tienes los siguientes objetos: {}.',
+        'empty_inventory': 'Tu inventario está vacío.',
+        'look': 'Miras a tu alrededor.',
+        'move': 'Vas a {}.',
+    },
+}
+
+# The verb that `normalize_input` leaves at the start of a movement command
+MOVE_VERBS = {'en': 'go to', 'es': 'ir a'}
+
+
+def match_trivial_command(message: str, world, language: str = 'en') -> 'tuple[str, WorldUpdatePrediction] | None':
+    """Match the player input against the trivial commands.
+
+    Args:
+        message: The player input
+        world: The current world
+        language: The language of the player input ('en' or 'es')
+
+    Returns:
+        A (command, prediction) tuple, where command is 'inventory', 'look', 'move' or 'travel',
+        or None if the input is not an unambiguous trivial command.
+        A 'look' command still needs the scene to be narrated by the narrative model, and a
+        'travel' command goes to a location that is not adjacent but was already visited, with
+        one step per location of the shortest route, so it is applied like any other world update.
+    """
+    language = language if language in NARRATIONS else 'en'
+    narrations = NARRATIONS[language]
+    command = normalize_input(message, language)
+
+    if command in INVENTORY_COMMANDS[language]:
+        if world.player.inventory:
+            narration = narrations['inventory'].format(', '.join(item.name for item in world.player.inventory))
+        else:
+            narration = narrations['empty_inventory']
+        return 'inventory', WorldUpdatePrediction(narration=narration)
+
+    if command in LOOK_COMMANDS[language]:
+        return 'look', WorldUpdatePrediction(narration=narrations['look'])
+
+    move_verb = MOVE_VERBS[language]
+    if command.startswith(move_verb + ' '):
+        target = command[len(move_verb) + 1:]
+        matches = [location for location in world.player.location.connecting_locations
+                   if normalize_name(location.name, language) == target]
+        if len(matches) == 1:
+            return 'move', WorldUpdatePrediction(player_movement=matches[0].name,
+                                                 narration=narrations['move'].format(matches[0].name))
+
+        # A location visited before is reached in a single turn if there is an open route to it,
+        # the others are left to the reasoning model so the player does not skip the exploration
+        matches = [world.locations[name] for name in world.player.visited_locations
+                   if name in world.locations and normalize_name(name, language) == target]
+        if len(matches) == 1 and matches[0] is not world.player.location:
+            path = world.shortest_path(matches[0])
+            if path is not None:
+                return 'travel', WorldUpdatePrediction(player_movement=path[1].name,
+                                                       steps=[WorldUpdateStep(player_movement=location.name) for location in path[2:]],
+                                                       narration=narrations['move'].format(matches[0].name))
+
+    return None
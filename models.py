@@ -3,6 +3,10 @@ from google import genai
 from google.genai import types
 import requests
 import os
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field, field_validator
 
@@ -10,7 +14,7 @@ load_dotenv()
 
 def get_llm(model_name: str = "gemini-2.5-flash") -> object:
 
-    google_models = ["gemini-2.5-flash"]
+    google_models = ["gemini-2.5-flash", "gemini-2.5-flash-lite", "gemini-2.5-pro"]
 
     model = None
 
@@ -19,6 +23,37 @@ def get_llm(model_name: str = "gemini-2.5-flash") -> object:
 
     return model
 
+class LatencyHistogram():
+    """A histogram of the latencies (in seconds) of the calls to a model, with logarithmic buckets."""
+    def __init__ (self, min_latency: float = 0.05, max_latency: float = 300.0, buckets_per_decade: int = 10) -> None:
+        decades = math.log10(max_latency / min_latency)
+        self.bounds = [min_latency * 10 ** (i / buckets_per_decade) for i in range(int(decades * buckets_per_decade) + 1)]
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        """Add a latency to the histogram."""
+        index = 0
+        while index < len(self.bounds) and latency > self.bounds[index]:
+            index += 1
+        with self.lock:
+            self.counts[index] += 1
+            self.total += 1
+
+    def quantile(self, q: float) -> 'float | None':
+        """Return the upper bound of the bucket that contains the q quantile, or None if there are no samples."""
+        with self.lock:
+            if self.total == 0:
+                return None
+            target = q * self.total
+            cumulative = 0
+            for index, count in enumerate(self.counts):
+                cumulative += count
+                if cumulative >= target and count > 0:
+                    return self.bounds[min(index, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
 class GeminiModel():
     def __init__ (self, API_key:str, model_name:str = "gemini-2.5-flash") -> None:
         """"Initialize the Gemini model using an API key."""
@@ -48,6 +83,20 @@ class GeminiModel():
         self.client = genai.Client(api_key=os.getenv(API_key))
         self.model_name = model_name
         self.temperature = 0.7
+        self.timeout = None
+
+        # Latencies of the successful calls, used to choose when to hedge
+        self.latencies = LatencyHistogram()
+
+        # Hedged requests: if a call takes longer than the hedging quantile of the observed
+        # latencies, a duplicate request is sent and the first valid response is used
+        self.hedging = False
+        self.hedging_quantile = 0.9
+        self.hedging_min_samples = 10
+        self.hedging_budget = 20
+        self.hedged_requests = 0
+        self._hedging_lock = threading.Lock()
+        self._executor = None
 
     # def build_decision_config(self):
     #     kwargs = {"temperature": self.temperature,"response_mime_type": "text/plain"}
@@ -55,7 +104,7 @@ class GeminiModel():
     #         kwargs["thinking_config"] = genai.types.ThinkingConfig(thinking_level="MEDIUM")
     #     return genai.types.GenerateContentConfig(**kwargs)
 
-    def build_decision_config(self):
+    def build_decision_config(self, timeout: float = None):
         # Define the categories you want to suppress
         categories = [
             types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
@@ -82,18 +131,90 @@ class GeminiModel():
         if hasattr(types, "ThinkingConfig"):
             kwargs["thinking_config"] = types.ThinkingConfig(include_thoughts=True)
 
+        # Deadline for the request (the API expects milliseconds)
+        timeout = timeout if timeout is not None else self.timeout
+        if timeout is not None:
+            kwargs["http_options"] = types.HttpOptions(timeout=int(timeout * 1000))
+
         return types.GenerateContentConfig(**kwargs)
 
 
 
-    def prompt_model(self,system_msg: str, user_msg:str) -> str:
-        """Prompt the Gemini model."""
+    def prompt_model(self,system_msg: str, user_msg:str, timeout: float = None, speculative: bool = False) -> str:
+        """Prompt the Gemini model.
+
+        If timeout (in seconds) is given, or set in self.timeout, the request fails when the deadline is exceeded.
+        If hedging is enabled, a slow call is duplicated (see prompt_model_hedged).
+        Speculative calls (made in the background, see speculation.py) are never hedged and their latency
+        is not recorded, so they do not spend the hedging budget or skew the latencies of the player calls.
+        """
+        if speculative:
+            return self._generate(system_msg, user_msg, timeout=timeout, record_latency=False)
+
+        if self.hedging:
+            return self.prompt_model_hedged(system_msg, user_msg, timeout=timeout)
+
+        return self._generate(system_msg, user_msg, timeout=timeout)
+
+    def prompt_model_hedged(self, system_msg: str, user_msg: str, timeout: float = None) -> str:
+        """Prompt the Gemini model, sending a duplicate request if the first one is slow.
+
+        The duplicate is sent when the call has not returned after the hedging quantile
+        of the latencies observed so far, as long as there are enough samples and the
+        hedging budget of the session is not spent. The first valid response wins; the
+        other request is cancelled if it has not started, or its response is discarded.
+        """
+        threshold = None
+        if self.latencies.total >= self.hedging_min_samples and self.hedged_requests < self.hedging_budget:
+            threshold = self.latencies.quantile(self.hedging_quantile)
 
+        if threshold is None:
+            return self._generate(system_msg, user_msg, timeout=timeout)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='hedging')
+
+        pending = {self._executor.submit(self._generate, system_msg, user_msg, timeout)}
+        done, pending = wait(pending, timeout=threshold)
+        if not done and self._reserve_hedge():
+            pending.add(self._executor.submit(self._generate, system_msg, user_msg, timeout))
+
+        # An empty response is only used if no request returns a valid one
+        error, empty_response = None, False
+        while True:
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                elif not future.result():
+                    empty_response = True
+                else:
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+            if not pending:
+                if empty_response:
+                    return ""
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def _reserve_hedge(self) -> bool:
+        """Count a duplicate request against the hedging budget, if it is not spent (calls run in several threads)."""
+        with self._hedging_lock:
+            if self.hedged_requests >= self.hedging_budget:
+                return False
+            self.hedged_requests += 1
+            return True
+
+    def _generate(self, system_msg: str, user_msg: str, timeout: float = None, record_latency: bool = True) -> str:
+        """Send a single request to the Gemini model and record its latency (unless record_latency is False)."""
+        start = time.perf_counter()
         response = self.client.models.generate_content(
               model=self.model_name,
               contents=[system_msg + "\n\n" + user_msg],
-              config=self.build_decision_config(),
+              config=self.build_decision_config(timeout=timeout),
           )
+        if record_latency:
+            self.latencies.record(time.perf_counter() - start)
 
         return response.text
 
@@ -108,12 +229,11 @@ class MovedObject(BaseModel):
     destination: str = Field(..., description="Destination location, character name, or 'Inventory'")
 
 
-class WorldUpdatePrediction(BaseModel):
-    """Structured prediction of world state changes from LLM output."""
+class WorldUpdateStep(BaseModel):
+    """The changes in the world caused by a single action of the player."""
     moved_items: list[MovedObject] = Field(default_factory=list, description="List of objects that were moved")
     unblocked_locations: list[str] = Field(default_factory=list, description="List of previously blocked passages that are now accessible")
     player_movement: str | None = Field(default=None, description="New location if player moved, None otherwise")
-    narration: str = Field(..., description="Narration describing the world changes")
 
     @field_validator('player_movement')
     @classmethod
@@ -123,6 +243,16 @@ class WorldUpdatePrediction(BaseModel):
             return None
         return v
 
+
+class WorldUpdatePrediction(WorldUpdateStep):
+    """Structured prediction of world state changes from LLM output.
+
+    The top-level changes are those of the first action of the player input. Compound
+    inputs ("take the key, open the door and go north") list the following actions in steps.
+    """
+    steps: list[WorldUpdateStep] = Field(default_factory=list, description="Changes of the following actions of a compound input, in order")
+    narration: str = Field(..., description="Narration describing the world changes")
+
     @field_validator('narration')
     @classmethod
     def validate_narration(cls, v: str) -> str:
@@ -130,3 +260,10 @@ class WorldUpdatePrediction(BaseModel):
         if not v or not v.strip():
             raise ValueError("Narration cannot be empty")
         return v.strip()
+
+    def get_steps(self) -> 'list[WorldUpdateStep]':
+        """Return the changes of every action, in the order they have to be applied."""
+        first_step = WorldUpdateStep(moved_items=self.moved_items,
+                                     unblocked_locations=self.unblocked_locations,
+                                     player_movement=self.player_movement)
+        return [first_step] + self.steps
@@ -1,3 +1,39 @@
+from world import ComponentKind, lookup_kind
+
+OBJECTIVE_TEMPLATES = {
+    'en': {
+        (ComponentKind.CHARACTER, ComponentKind.LOCATION): 'You have to go to <{second}>.',
+        (ComponentKind.CHARACTER, ComponentKind.ITEM): '<{first}> has to get the item <{second}>.',
+        (ComponentKind.ITEM, ComponentKind.LOCATION): 'You have to leave item <{first}> in place <{second}>.',
+        (ComponentKind.ITEM, ComponentKind.CHARACTER): '<{first}> has to be given to <{second}>.',
+        (ComponentKind.CHARACTER, ComponentKind.CHARACTER): '<{first}> has to find <{second}>.',
+    },
+    'es': {
+        (ComponentKind.CHARACTER, ComponentKind.LOCATION): 'Tienes que ir a <{second}>.',
+        (ComponentKind.CHARACTER, ComponentKind.ITEM): '<{first}> tiene que conseguir el objeto <{second}>.',
+        (ComponentKind.ITEM, ComponentKind.LOCATION): 'Tienes que dejar el objeto <{first}> en el lugar <{second}>.',
+        (ComponentKind.ITEM, ComponentKind.CHARACTER): 'El objeto <{first}> tiene que ser entregado a <{second}>.',
+        (ComponentKind.CHARACTER, ComponentKind.CHARACTER): '<{first}> tiene que encontrar a <{second}>.',
+    },
+}
+
+JSON_WORLD_STATE_NOTES = {
+    'en': 'The world state is JSON: each component has an "id" and a "name", the locations with "reachable": false are blocked by "blocked_by", and each item is held by its "holder" or blocks the passage to "blocks". Refer to the components by name or ID, and to the player\'s inventory as "Inventory". Never reveal a "secret_answer".',
+    'es': 'El estado del mundo es JSON: cada componente tiene un "id" y un nombre ("name"), los lugares con "reachable": false están bloqueados por "blocked_by", y cada objeto lo tiene su "holder" o bloquea el pasaje a "blocks". Refiérete a los componentes por nombre o ID, y al inventario del jugador como "Inventory". Nunca reveles una "secret_answer".',
+}
+
+def _world_state_note (world_state: str, language: str) -> str:
+    """Explain the structure of a world state rendered as JSON (see World.render_world), or nothing for the text format."""
+    if not world_state.lstrip().startswith('{'):
+        return ""
+    return f"\n    \n    {JSON_WORLD_STATE_NOTES[language]}"
+
+def _objective_sentence (objective, language: str) -> str:
+    template = lookup_kind(OBJECTIVE_TEMPLATES[language], objective[0], objective[1])
+    if template is None:
+        return ""
+    return template.format(first=objective[0].name, second=objective[1].name)
+
 def prompt_describe_objective (objective, language:str = 'en'):
     system_msg = ""
     user_msg = ""
@@ -15,20 +51,10 @@ def prompt_describe_objective_english (objective):
     
     Always put your generated narration between # characters. For example: # You have to get the <key> # or # You have to reach the <castle> #. The narration should be clear and direct, ensuring the player understands the instruction."""
 
-    first_component_class = objective[0].__class__.__name__
-    second_component_class = objective[1].__class__.__name__
     user_msg = ""
-
-    if first_component_class == "Character" and second_component_class == "Location":
-        user_msg =  f'The objective to narrate in an alterative way is "You have to go to <{objective[1].name}>."'
-    elif first_component_class == "Character" and second_component_class == "Item":
-        user_msg = f'The objective to narrate in an alterative way is "<{objective[0].name}> has to get the item <{objective[1].name}>."'
-    elif first_component_class == "Item" and second_component_class == "Location":
-        user_msg = f'The objective to narrate in an alterative way is "You have to leave item <{objective[0].name}> in place <{objective[1].name}>."'
-    elif first_component_class == "Item" and second_component_class == "Character":
-        user_msg = f'The objective to narrate in an alterative way is "<{objective[0].name}> has to be given to <{objective[1].name}>."'
-    elif first_component_class == "Character" and second_component_class == "Character":
-        user_msg = f'The objective to narrate in an alterative way is "<{objective[0].name}> has to find <{objective[1].name}>."'
+    sentence = _objective_sentence(objective, 'en')
+    if sentence:
+        user_msg = f'The objective to narrate in an alterative way is "{sentence}"'
 
     return system_msg, user_msg 
 
@@ -38,20 +64,10 @@ def prompt_describe_objective_spanish (objective):
     
     Pon siempre tu narración generada entre caracteres #. Por ejemplo: # Tienes que conseguir la <llave> # o # Tienes que llegar al <Castillo> #. La narración debe ser clara y directa, asegurando que el jugador entienda la instrucción."""
 
-    first_component_class = objective[0].__class__.__name__
-    second_component_class = objective[1].__class__.__name__
     user_msg = ""
-
-    if first_component_class == "Character" and second_component_class == "Location":
-        user_msg = f'El objetivo a decir de forma alternativa es "Tienes que ir a <{objective[1].name}>."'
-    elif first_component_class == "Character" and second_component_class == "Item":
-        user_msg = f'El objetivo a decir de forma alternativa es "<{objective[0].name}> tiene que conseguir el objeto <{objective[1].name}>."'
-    elif first_component_class == "Item" and second_component_class == "Location":
-        user_msg = f'El objetivo a decir de forma alternativa es "Tienes que dejar el objeto <{objective[0].name}> en el lugar <{objective[1].name}>."'
-    elif first_component_class == "Item" and second_component_class == "Character":
-        user_msg = f'El objetivo a decir de forma alternativa es "El objeto <{objective[0].name}> tiene que ser entregado a <{objective[1].name}>."'
-    elif first_component_class == "Character" and second_component_class == "Character":
-        user_msg = f'El objetivo a decir de forma alternativa es "<{objective[0].name}> tiene que encontrar a <{objective[1].name}>."'
+    sentence = _objective_sentence(objective, 'es')
+    if sentence:
+        user_msg = f'El objetivo a decir de forma alternativa es "{sentence}"'
 
     return system_msg, user_msg
 
@@ -130,12 +146,14 @@ def prompt_world_update_spanish (world_state: str, input: str):
     (C) No asumas que lo que dice el jugador siempre tiene sentido; quizás esas acciones intentan hacer algo que el mundo no lo permite.
     (D) La entrada del jugador puede ser una ACCIÓN (que causa cambios en el mundo) o una PREGUNTA (que solicita información sobre el mundo). Cuando sea una pregunta, SOLO debes responder basándote en la información presente en el parámetro world_state. Si la información necesaria para responder la pregunta no está en world_state, responde en la narración de forma narrativa y manteniendo el rol de narrador (Game Master), sin romper el juego de rol. Por ejemplo, en lugar de decir "No sé", di algo como "El personaje no ha mencionado su edad" o "Eso no es algo que haya determinado aún". Para preguntas, todos los otros campos (moved_items, unblocked_locations, player_movement) deben estar vacíos/null.
     (E) Cuando el jugador realiza una ACCIÓN NARRATIVA/SOCIAL que no causa cambios mecánicos en el mundo (como hablar con un personaje, complimentar a alguien, o realizar acciones descriptivas), debes responder con ROLEPLAY CREATIVO basado en las descripciones de los componentes en el world_state. Usa las características y descripciones del personaje para crear respuestas auténticas. NUNCA simplemente repitas lo que el jugador hizo; en su lugar, genera la reacción/respuesta del NPC o la continuación narrativa. Mantén consistencia con los hechos del world_state pero sé creativo dentro de esos límites.
+    (F) Si la entrada del jugador tiene varias acciones seguidas, pon los cambios de la primera acción en los campos principales y los de cada una de las siguientes acciones, en orden, en "steps". Cada acción ocurre después de las anteriores (por ejemplo, un pasaje se desbloquea desde el lugar al que el jugador llegó en la acción anterior). Si hay una sola acción, "steps" debe estar vacío. Si alguna de las acciones no es posible, no incluyas esa acción ni las siguientes.
     
     IMPORTANTE: Debes responder ÚNICAMENTE con un JSON válido sin ningún texto adicional. NO ENVUELVAS el JSON en bloques de código markdown (sin ```json ``` ni backticks). El JSON debe tener exactamente esta estructura:
     {
       "moved_items": [{"name": "<nombre_objeto>", "destination": "<destino>"}, ...],
       "unblocked_locations": ["<lugar>", ...],
       "player_movement": "<nuevo_lugar>" o null,
+      "steps": [{"moved_items": [...], "unblocked_locations": [...], "player_movement": "<nuevo_lugar>" o null}, ...],
       "narration": "<texto_narracion>"
     }
     
@@ -214,11 +232,24 @@ def prompt_world_update_spanish (world_state: str, input: str):
       "narration": "Rosa sonríe calurosamente. 'Hola!. Es lindo verte por aquí.'"
     }
     
+    Ejemplo 10 (El jugador hace varias acciones seguidas):
+    Entrada del jugador: "Tomo la llave, abro la puerta del Sótano y bajo"
+    {
+      "moved_items": [{"name": "llave", "destination": "Inventory"}],
+      "unblocked_locations": [],
+      "player_movement": null,
+      "steps": [
+        {"moved_items": [], "unblocked_locations": ["Sótano"], "player_movement": null},
+        {"moved_items": [], "unblocked_locations": [], "player_movement": "Sótano"}
+      ],
+      "narration": "Tomas la llave, abres la puerta con ella y bajas al Sótano."
+    }
+    
     Recuerda: la narración debe describir los cambios detectados sin hacer avanzar la historia ni crear detalles no incluidos en el estado del mundo. Cuando respondas preguntas, SOLO usa información del world_state proporcionado. Para acciones narrativas/sociales, usa las descripciones del world_state para crear respuestas de NPCs auténticas y creativas. Puedes responder preguntas del jugador sobre objetos, personajes o el lugar en el que se encuentra, pero SOLO si esa información está presente en el world_state."""
     
     user_msg = f"""Expresa los cambios en el mundo en formato JSON, teniendo en cuenta que el jugador ingresó esta entrada "{input}" a partir de este estado del mundo:
     
-    {world_state}"""
+    {world_state}{_world_state_note(world_state, 'es')}"""
 
     return system_msg, user_msg
 
@@ -231,12 +262,14 @@ def prompt_world_update_english (world_state: str, input: str):
     (C) Do not assume that the player input always makes sense; maybe those actions try to do something that the world does not allow.
     (D) The player input can be either an ACTION (which causes changes in the world) or a QUESTION (which requests information about the world). When it is a question, you should ONLY answer based on the information present in the world_state parameter. If the information needed to answer the question is not in the world_state, respond in the narration in a narrative manner while maintaining your role as storyteller (Game Master), without breaking character. For example, instead of saying "I don't know", say something like "The character hasn't mentioned his age" or "That's not something I've determined yet". For questions, all other fields (moved_items, unblocked_locations, player_movement) should be empty arrays/null.
     (E) When the player performs a NARRATIVE/SOCIAL ACTION that does not cause mechanical changes in the world (such as talking to a character, complimenting someone, or performing descriptive actions), you should respond with CREATIVE ROLEPLAY based on the component descriptions in world_state. Use the characteristics and descriptions of the character to create authentic NPC responses. NEVER simply repeat what the player did; instead, generate the NPC's reaction or narrative continuation. Maintain consistency with the facts in world_state but be creative within those boundaries.
+    (F) If the player input has several actions in a row, put the changes of the first action in the top-level fields and the changes of each following action, in order, in "steps". Each action happens after the previous ones (for example, a passage is unblocked from the place the player reached in the previous action). If there is a single action, "steps" must be empty. If one of the actions is not possible, do not include it nor the following ones.
     
     IMPORTANT: You must respond ONLY with valid JSON without any additional text. DO NOT wrap the JSON in markdown code blocks (no ```json ``` or backticks). The JSON must have exactly this structure:
     {
       "moved_items": [{"name": "<object_name>", "destination": "<destination>"}, ...],
       "unblocked_locations": ["<location>", ...],
       "player_movement": "<new_location>" or null,
+      "steps": [{"moved_items": [...], "unblocked_locations": [...], "player_movement": "<new_location>" or null}, ...],
       "narration": "<narration_text>"
     }
     
@@ -315,10 +348,105 @@ def prompt_world_update_english (world_state: str, input: str):
       "narration": "Rosa smiles warmly. 'Hello! It's nice to see you here.'"
     }
     
+    Example 10 (The player performs several actions in a row):
+    Player input: "I take the key, open the door to the basement and go down"
+    {
+      "moved_items": [{"name": "key", "destination": "Inventory"}],
+      "unblocked_locations": [],
+      "player_movement": null,
+      "steps": [
+        {"moved_items": [], "unblocked_locations": ["Basement"], "player_movement": null},
+        {"moved_items": [], "unblocked_locations": [], "player_movement": "Basement"}
+      ],
+      "narration": "You take the key, open the door with it and go down to the basement."
+    }
+    
     Remember: the narration should describe the changes detected without moving the story forward and without creating details not included in the world state. When answering questions, ONLY use information from the provided world_state. For narrative/social actions, use the descriptions in world_state to create authentic and creative NPC responses. You can answer the player's questions about objects, characters, or the place they are in, but ONLY if that information is present in the world_state."""
     
     user_msg = f"""Give the changes in the world in JSON format, after this player input "{input}" on this world state:
     
-    {world_state}"""
+    {world_state}{_world_state_note(world_state, 'en')}"""
+
+    return system_msg, user_msg
+
+def prompt_repair_world_update (world_state: str, input: str, invalid_response: str, error: str, language: str = 'en'):
+    system_msg = ""
+    user_msg = ""
+
+    if language == 'es':
+        system_msg, user_msg = prompt_repair_world_update_spanish(world_state, input, invalid_response, error)
+    else:
+        system_msg, user_msg = prompt_repair_world_update_english(world_state, input, invalid_response, error)
+
+
+    return system_msg, user_msg
+
+def prompt_repair_world_update_spanish (world_state: str, input: str, invalid_response: str, error: str):
+    system_msg, user_msg = prompt_world_update_spanish(world_state, input)
+
+    user_msg += f"""
+    
+    Tu respuesta anterior no es un JSON válido con la estructura pedida:
+    {invalid_response}
+    
+    Este es el error de validación: {error}
+    
+    Corrige la respuesta y responde ÚNICAMENTE con el JSON válido."""
+
+    return system_msg, user_msg
+
+def prompt_repair_world_update_english (world_state: str, input: str, invalid_response: str, error: str):
+    system_msg, user_msg = prompt_world_update_english(world_state, input)
+
+    user_msg += f"""
+    
+    Your previous answer is not valid JSON with the requested structure:
+    {invalid_response}
+    
+    This is the validation error: {error}
+    
+    Fix the answer and respond ONLY with the valid JSON."""
+
+    return system_msg, user_msg
+
+def prompt_rejected_world_update (world_state: str, input: str, rejected_response: str, report: str, language: str = 'en'):
+    system_msg = ""
+    user_msg = ""
+
+    if language == 'es':
+        system_msg, user_msg = prompt_rejected_world_update_spanish(world_state, input, rejected_response, report)
+    else:
+        system_msg, user_msg = prompt_rejected_world_update_english(world_state, input, rejected_response, report)
+
+
+    return system_msg, user_msg
+
+def prompt_rejected_world_update_spanish (world_state: str, input: str, rejected_response: str, report: str):
+    system_msg, user_msg = prompt_world_update_spanish(world_state, input)
+
+    user_msg += f"""
+    
+    Tu respuesta anterior tiene cambios que no son posibles en este estado del mundo:
+    {rejected_response}
+    
+    Estos son los cambios rechazados:
+    {report}
+    
+    Usa solo los nombres que aparecen en el estado del mundo, y no incluyas acciones que el jugador no puede hacer. Responde ÚNICAMENTE con el JSON corregido."""
 
-    return system_msg, user_msg
\ No newline at end of file
+    return system_msg, user_msg
+
+def prompt_rejected_world_update_english (world_state: str, input: str, rejected_response: str, report: str):
+    system_msg, user_msg = prompt_world_update_english(world_state, input)
+
+    user_msg += f"""
+    
+    Your previous answer has changes that are not possible in this world state:
+    {rejected_response}
+    
+    These are the rejected changes:
+    {report}
+    
+    Only use the names that appear in the world state, and do not include actions the player cannot perform. Respond ONLY with the fixed JSON."""
+
+    return system_msg, user_msg
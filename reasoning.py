@@ -0,0 +1,205 @@
+"""Robust prompting of the reasoning model for world updates.
+
+A call to the reasoning model can hang, fail or return JSON that does not
+validate as a `WorldUpdatePrediction`. This module applies a retry policy:
+per-call deadlines, bounded retries with exponential backoff, a repair pass
+that re-prompts with the validation error, and an optional fallback model.
+Predictions that the world rejects can also be repaired once, re-prompting with
+the rejected changes. Every attempt is recorded so it can be stored in the turn log.
+"""
+
+import re
+import time
+
+from pydantic import ValidationError
+
+from models import WorldUpdatePrediction
+from prompts import prompt_world_update, prompt_repair_world_update, prompt_rejected_world_update
+
+
+def clean_json_response(response: str) -> str:
+    """Strip markdown code blocks from LLM JSON response if present.
+
+    Handles formats like:
+    - ```json {...} ```
+    - ``` {...} ```
+    - Any leading/trailing whitespace and backticks
+    """
+    response = response.strip()
+
+    # Remove markdown code block wrappers
+    if response.startswith('```'):
+        # Remove starting ``` and optional language identifier (e.g., ```json)
+        response = re.sub(r'^```(?:json)?\s*', '', response)
+        # Remove ending ```
+        response = re.sub(r'\s*```$', '', response)
+        response = response.strip()
+
+    return response
+
+
+class RetryPolicy:
+    """A class to represent how the calls to the reasoning model are retried."""
+    def __init__(self, timeout: float = 30.0, max_retries: int = 2, max_repairs: int = 1, backoff: float = 1.0, max_backoff: float = 8.0,
+                 max_update_repairs: int = 1) -> None:
+
+        self.timeout = timeout
+        """the deadline for each call, in seconds"""
+
+        self.max_retries = max_retries
+        """the number of extra calls after a failed call (error or timeout), per model"""
+
+        self.max_repairs = max_repairs
+        """the number of calls re-prompting with the validation error, per model"""
+
+        self.backoff = backoff
+        """the waiting time before the first retry, doubled on every retry"""
+
+        self.max_backoff = max_backoff
+        """the maximum waiting time between retries"""
+
+        self.max_update_repairs = max_update_repairs
+        """the number of calls re-prompting with the changes that the world rejected, per turn"""
+
+    @classmethod
+    def from_config(cls, config) -> 'RetryPolicy':
+        """Build the policy from the [Models] section of the configuration."""
+        return cls(
+            timeout=config.getfloat('Models', 'ReasoningTimeout', fallback=30.0),
+            max_retries=config.getint('Models', 'ReasoningRetries', fallback=2),
+            max_repairs=config.getint('Models', 'ReasoningRepairs', fallback=1),
+            backoff=config.getfloat('Models', 'ReasoningBackoff', fallback=1.0),
+            max_update_repairs=config.getint('Models', 'ReasoningUpdateRepairs', fallback=1),
+        )
+
+
+def _validate(response: str) -> WorldUpdatePrediction:
+    """Parse a raw response of the reasoning model into a WorldUpdatePrediction."""
+    if response is None:
+        raise ValueError("The model returned an empty response")
+    return WorldUpdatePrediction.model_validate_json(clean_json_response(response))
+
+
+def predict_world_update(model, world_state: str, input: str, language: str = 'en', policy: RetryPolicy = None,
+                         fallback_model = None, initial_response: str = None) -> 'tuple[WorldUpdatePrediction | None, list[dict]]':
+    """Prompt the reasoning model for the world update caused by the player input.
+
+    Args:
+        model: The reasoning model
+        world_state: The rendered world state
+        input: The player input
+        language: Language of the prompts ('en' or 'es')
+        policy: The retry policy (the default policy is used if None)
+        fallback_model: A model to use if every attempt with the reasoning model failed
+        initial_response: A response already obtained for this input (e.g. prefetched), validated before any call
+
+    Returns:
+        A (prediction, attempts) tuple. The prediction is None if every attempt failed.
+        Each attempt is a dictionary with the model name, the kind of attempt
+        ('prefetched', 'initial', 'retry', 'repair' or 'fallback'), its status
+        ('ok', 'invalid' or 'error'), the duration in seconds and the error message, if any.
+    """
+    policy = policy or RetryPolicy()
+    attempts = []
+    invalid_response, last_error = None, None
+
+    if initial_response is not None:
+        try:
+            prediction = _validate(initial_response)
+            attempts.append({"model": "prefetched", "kind": "prefetched", "status": "ok", "duration": 0.0, "error": None})
+            return prediction, attempts
+        except (ValidationError, ValueError) as e:
+            invalid_response, last_error = initial_response, e
+            attempts.append({"model": "prefetched", "kind": "prefetched", "status": "invalid", "duration": 0.0, "error": str(e)})
+
+    models = [model] + ([fallback_model] if fallback_model is not None else [])
+    for model_index, current_model in enumerate(models):
+        retries, repairs = 0, 0
+        kind = 'initial' if model_index == 0 else 'fallback'
+
+        while True:
+            if invalid_response is not None and repairs < policy.max_repairs:
+                kind = 'repair'
+                repairs += 1
+                system_msg, user_msg = prompt_repair_world_update(world_state, input, invalid_response, str(last_error), language=language)
+            else:
+                system_msg, user_msg = prompt_world_update(world_state, input, language=language)
+
+            start = time.perf_counter()
+            status, error, response = 'ok', None, None
+            try:
+                response = current_model.prompt_model(system_msg=system_msg, user_msg=user_msg, timeout=policy.timeout)
+                prediction = _validate(response)
+            except (ValidationError, ValueError) as e:
+                status, error = 'invalid', e
+            except Exception as e:
+                status, error = 'error', e
+
+            attempts.append({
+                "model": getattr(current_model, 'model_name', str(current_model)),
+                "kind": kind,
+                "status": status,
+                "duration": time.perf_counter() - start,
+                "error": str(error) if error is not None else None
+            })
+
+            if status == 'ok':
+                return prediction, attempts
+
+            print(f"Reasoning attempt failed ({kind}, {status}): {error}")
+            last_error = error
+            if status == 'invalid':
+                invalid_response = response
+                if repairs < policy.max_repairs:
+                    continue
+            else:
+                invalid_response = None
+
+            if retries >= policy.max_retries:
+                break
+            time.sleep(min(policy.backoff * (2 ** retries), policy.max_backoff))
+            retries += 1
+            kind = 'retry' if model_index == 0 else 'fallback'
+
+        invalid_response = None
+
+    return None, attempts
+
+
+def repair_world_update(model, world_state: str, input: str, rejected_response: str, report: str, language: str = 'en',
+                        policy: RetryPolicy = None) -> 'tuple[WorldUpdatePrediction | None, dict]':
+    """Prompt the reasoning model once more, with the changes of its prediction that the world rejected.
+
+    Args:
+        model: The reasoning model
+        world_state: The rendered world state
+        input: The player input
+        rejected_response: The prediction (as JSON) that the world could not apply
+        report: The description of the rejected changes (see `WorldUpdateResult.describe`)
+        language: Language of the prompts ('en' or 'es')
+        policy: The retry policy, for the deadline of the call (the default policy is used if None)
+
+    Returns:
+        A (prediction, attempt) tuple. The prediction is None if the call failed or the response is not valid.
+    """
+    policy = policy or RetryPolicy()
+    system_msg, user_msg = prompt_rejected_world_update(world_state, input, rejected_response, report, language=language)
+
+    start = time.perf_counter()
+    prediction, status, error = None, 'ok', None
+    try:
+        response = model.prompt_model(system_msg=system_msg, user_msg=user_msg, timeout=policy.timeout)
+        prediction = _validate(response)
+    except (ValidationError, ValueError) as e:
+        status, error = 'invalid', e
+    except Exception as e:
+        status, error = 'error', e
+
+    attempt = {
+        "model": getattr(model, 'model_name', str(model)),
+        "kind": "world_repair",
+        "status": status,
+        "duration": time.perf_counter() - start,
+        "error": str(error) if error is not None else None
+    }
+    return prediction, attempt
@@ -0,0 +1,193 @@
+"""Speculative precomputation of world updates while the player types.
+
+After each turn, the canonical actions that can be predicted from the rendered
+world state (going to each reachable location and taking each visible item) are
+sent to the reasoning model in the background. When the player input matches
+one of them after normalization, the prefetched prediction is used instead of
+waiting for a new reasoning call.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+from prompts import prompt_world_update
+from world import normalize_name
+
+CANONICAL_ACTIONS = {
+    'en': {'move': 'go to {}', 'take': 'take {}'},
+    'es': {'move': 'ir a {}', 'take': 'tomar {}'},
+}
+
+# Verbs that are normalized to the verb of the canonical action
+VERB_SYNONYMS = {
+    'en': {
+        'go to': ['go to', 'walk to', 'move to', 'head to', 'enter', 'go into', 'go'],
+        'take': ['take', 'get', 'grab', 'pick up', 'pick'],
+    },
+    'es': {
+        'ir a': ['ir a', 'ir al', 'voy a', 'voy al', 've a', 've al', 'caminar a', 'camino a', 'entrar a', 'entrar en', 'entro a', 'entro en'],
+        'tomar': ['tomar', 'tomo', 'toma', 'agarrar', 'agarro', 'agarra', 'coger', 'cojo', 'recoger', 'recojo'],
+    },
+}
+
+
+def normalize_input(text: str, language: str = 'en') -> str:
+    """Normalize a player input so equivalent phrasings of a canonical action match.
+
+    Normalizes it like the component names (see `world.normalize_name`) and
+    replaces known verb synonyms with the verb of the canonical action. The
+    articles are removed after the verbs are replaced, as some verbs include one ('ir al').
+    """
+    text = normalize_name(text, language, remove_articles=False)
+
+    synonyms = VERB_SYNONYMS.get(language, VERB_SYNONYMS['en'])
+    for canonical_verb, verbs in synonyms.items():
+        for verb in sorted(verbs, key=len, reverse=True):
+            if text == verb or text.startswith(verb + ' '):
+                text = canonical_verb + text[len(verb):]
+                break
+        else:
+            continue
+        break
+
+    return normalize_name(text, language)
+
+
+def enumerate_canonical_actions(world, language: str = 'en') -> 'list[str]':
+    """Return the canonical actions for the components rendered in the current scene.
+
+    These are the same reachable locations and visible items listed by
+    `World.render_world`, most likely first: reachable locations, then items.
+    """
+    templates = CANONICAL_ACTIONS.get(language, CANONICAL_ACTIONS['en'])
+    player_location = world.player.location
+
+    actions = [templates['move'].format(location.name) for location in player_location.connecting_locations]
+    actions += [templates['take'].format(item.name) for item in player_location.items if item.gettable]
+    return actions
+
+
+class SpeculativePrefetcher:
+    """Prefetches the reasoning model predictions for the canonical actions of each turn.
+
+    Prefetches run in a small background pool so they do not compete with the
+    calls of the current turn. They are bounded by a per-turn and a per-session
+    budget, and the pending ones are cancelled as soon as the player sends an input.
+    Each prefetch has the same deadline as a reasoning call, so a hung call cannot
+    block the turn that uses it.
+    """
+
+    def __init__(self, reasoning_model, language: str = 'en', max_prefetches_per_turn: int = 4,
+                 max_prefetches_per_session: int = 200, max_workers: int = 1, timeout: float = None) -> None:
+
+        self.reasoning_model = reasoning_model
+        """the model used to predict the world updates"""
+
+        self.language = language
+        """the language of the prompts and of the player inputs"""
+
+        self.max_prefetches_per_turn = max_prefetches_per_turn
+        """the maximum number of canonical actions prefetched after each turn"""
+
+        self.remaining_budget = max_prefetches_per_session
+        """the number of prefetches left for the session"""
+
+        self.timeout = timeout
+        """the deadline for each prefetch call, and the maximum wait for a running prefetch, in seconds"""
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='speculation')
+        self.lock = threading.Lock()
+        self.world_state = None
+        self.prefetched = {}
+        self.hits = 0
+
+    def schedule(self, world, world_state: str, render=None) -> 'list[str]':
+        """Cancel the previous prefetches and start the ones for the given world state.
+
+        Args:
+            world: The world, used to enumerate the canonical actions
+            world_state: The rendered world state the player will act upon
+            render: Function that renders the world state given to the reasoning model for an
+                input, so a prefetch is prompted like the actual call (world_state if None)
+
+        Returns:
+            The list of canonical actions that were scheduled
+        """
+        self.cancel()
+        scheduled = []
+
+        with self.lock:
+            self.world_state = world_state
+            for action in enumerate_canonical_actions(world, self.language):
+                if len(scheduled) >= self.max_prefetches_per_turn or self.remaining_budget <= 0:
+                    break
+                key = normalize_input(action, self.language)
+                if key in self.prefetched:
+                    continue
+                prompt_state = render(action) if render is not None else world_state
+                self.prefetched[key] = (self.executor.submit(self._predict, prompt_state, action), prompt_state)
+                self.remaining_budget -= 1
+                scheduled.append(action)
+
+        return scheduled
+
+    def take(self, message: str, world_state: str, prompt_state: str = None, timeout: float = None) -> 'str | None':
+        """Return the prefetched prediction for the player input, if there is one.
+
+        All the other prefetches are cancelled. If the matching prefetch is still
+        running, this waits for it, as it started before a new call would. If it is
+        still queued (behind other prefetches), it is cancelled and None is returned,
+        so a new call is made right away.
+
+        Args:
+            message: The player input
+            world_state: The rendered world state the player acted upon
+            prompt_state: The world state the reasoning model would be given for the input (world_state
+                if None). A prefetch prompted with a different state is not used.
+            timeout: Maximum time to wait for a running prefetch (in seconds, self.timeout if None)
+
+        Returns:
+            The raw response of the reasoning model, or None if there is no usable prefetch
+        """
+        prompt_state = prompt_state if prompt_state is not None else world_state
+        with self.lock:
+            future = None
+            if world_state == self.world_state:
+                future, prefetched_state = self.prefetched.pop(normalize_input(message, self.language), (None, None))
+                if future is not None and prefetched_state != prompt_state:
+                    future.cancel()
+                    future = None
+        self.cancel()
+
+        if future is None or future.cancel():
+            return None
+        timeout = timeout if timeout is not None else self.timeout
+        try:
+            response = future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            print(f"Speculative prefetch not finished after {timeout} seconds")
+            return None
+        except Exception as e:
+            print(f"Speculative prefetch failed: {e}")
+            return None
+
+        self.hits += 1
+        return response
+
+    def cancel(self) -> None:
+        """Cancel the pending prefetches and discard the ones already running."""
+        with self.lock:
+            for future, _ in self.prefetched.values():
+                future.cancel()
+            self.prefetched = {}
+            self.world_state = None
+
+    def shutdown(self) -> None:
+        """Cancel the prefetches and stop the background workers."""
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _predict(self, world_state: str, action: str) -> str:
+        """Prompt the reasoning model for the world update of a canonical action."""
+        system_msg, user_msg = prompt_world_update(world_state, action, language=self.language)
+        return self.reasoning_model.prompt_model(system_msg=system_msg, user_msg=user_msg, timeout=self.timeout, speculative=True)
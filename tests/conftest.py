@@ -0,0 +1,35 @@
+"""Shared fixtures of the tests."""
+
+import os
+import sys
+
+import pytest
+
+# The modules of the repository are imported from its root, as when running app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from world import World, Location, Item, Character
+
+
+@pytest.fixture
+def small_world():
+    """A corridor of three locations (hall - kitchen - garden), with a key in the hall and the garden locked by a door."""
+    hall = Location('Hall', ['A hall'])
+    kitchen = Location('Kitchen', ['A kitchen'])
+    garden = Location('Garden', ['A garden'])
+    hall.connecting_locations = [kitchen]
+    kitchen.connecting_locations = [hall, garden]
+    garden.connecting_locations = [kitchen]
+    key = Item('Key', ['A small key'])
+    door = Item('Door', ['A locked door'], gettable=False)
+    hall.items = [key]
+    kitchen.block_passage(garden, door, key=key)
+    garden.connecting_locations = []
+
+    player = Character('Player', ['The player'], hall)
+    world = World(player)
+    for location in (hall, kitchen, garden):
+        world.add_location(location)
+    for item in (key, door):
+        world.add_item(item)
+    return world
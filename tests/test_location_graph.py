@@ -0,0 +1,67 @@
+"""Tests of the reachability and shortest path index over the locations (LocationGraph)."""
+
+from world import Item, WorldTransaction
+
+
+def test_unblocking_a_passage_updates_the_cached_searches(small_world):
+    hall, kitchen, garden = (small_world.locations[name] for name in ('Hall', 'Kitchen', 'Garden'))
+    graph = small_world.location_graph
+    assert small_world.shortest_path(garden) is None
+    assert hall in graph.searches
+
+    kitchen.unblock_passage(garden)
+
+    assert hall not in graph.searches
+    assert small_world.shortest_path(garden) == [hall, kitchen, garden]
+    # The passage was symmetric, so the way back is open too
+    assert small_world.shortest_path(hall, origin=garden) == [garden, kitchen, hall]
+
+
+def test_blocking_a_passage_updates_the_cached_searches(small_world):
+    hall, kitchen = small_world.locations['Hall'], small_world.locations['Kitchen']
+    assert small_world.is_reachable(kitchen)
+
+    hall.block_passage(kitchen, Item('Rubble', ['A pile of rubble'], gettable=False))
+
+    assert not small_world.is_reachable(kitchen)
+    assert small_world.shortest_path(kitchen) is None
+    assert small_world.location_graph.reachable_from(hall) == {hall}
+
+
+def test_unaffected_searches_are_kept(small_world):
+    hall, kitchen, garden = (small_world.locations[name] for name in ('Hall', 'Kitchen', 'Garden'))
+    graph = small_world.location_graph
+    graph.reachable_from(garden)
+    garden_search = graph.searches[garden]
+
+    # The garden cannot reach the hall, so opening a passage from the hall does not change its search
+    hall.block_passage(kitchen, Item('Rubble', ['A pile of rubble'], gettable=False))
+    hall.unblock_passage(kitchen)
+
+    assert graph.searches[garden] is garden_search
+
+
+def test_strongly_connected_components_follow_the_passages(small_world):
+    hall, kitchen, garden = (small_world.locations[name] for name in ('Hall', 'Kitchen', 'Garden'))
+    graph = small_world.location_graph
+    assert graph.component_of(hall) == {hall, kitchen}
+    assert graph.component_of(garden) == {garden}
+
+    kitchen.unblock_passage(garden)
+
+    assert graph.component_of(garden) == {hall, kitchen, garden}
+
+
+def test_rollback_notifies_the_graph(small_world):
+    """A rolled back update must leave the graph as if the passage had never been opened."""
+    kitchen, garden = small_world.locations['Kitchen'], small_world.locations['Garden']
+    transaction = WorldTransaction()
+    transaction.touch(kitchen)
+    transaction.touch(garden)
+    kitchen.unblock_passage(garden)
+    assert small_world.is_reachable(garden)
+
+    transaction.rollback()
+
+    assert not small_world.is_reachable(garden)
+    assert small_world.location_graph.component_of(garden) == {garden}
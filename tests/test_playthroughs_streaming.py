@@ -0,0 +1,60 @@
+"""Tests of the incremental reader of playthrough files (iter_playthrough)."""
+
+import json
+
+import pytest
+
+from utils.playthroughs_processing import iter_playthrough, iter_turns
+
+PLAYTHROUGH = {
+    "nickname": "anonymous",
+    "language": "es",
+    "1": {"user_input": "mirar", "narration": "Miras a tu alrededor. " * 40, "timestamp": 1700000000.25},
+    "2": {"user_input": "ir a la \"plaza\" {norte}", "narration": "", "timestamp": -0.0, "turn_start_ns": 12345678901234},
+    "objective_completed": True,
+    "objective_completed_turn": 2,
+    "duration": 1234.5,
+}
+
+
+def write(tmp_path, text):
+    path = tmp_path / "playthrough.json"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 4])
+def test_reads_the_same_entries_as_json_load(tmp_path, chunk_size, indent):
+    path = write(tmp_path, json.dumps(PLAYTHROUGH, ensure_ascii=False, indent=indent))
+
+    assert list(iter_playthrough(path, chunk_size=chunk_size)) == list(PLAYTHROUGH.items())
+    assert [turn for turn, _ in iter_turns(path)] == [1, 2]
+
+
+def test_empty_playthrough(tmp_path):
+    assert list(iter_playthrough(write(tmp_path, " { } "))) == []
+
+
+@pytest.mark.parametrize("chunk_size", [3, 1 << 20])
+def test_truncated_file_raises_after_the_complete_entries(tmp_path, chunk_size):
+    text = json.dumps(PLAYTHROUGH, ensure_ascii=False)
+    complete = 0
+    for cut in range(1, len(text)):
+        path = write(tmp_path, text[:cut])
+        entries = []
+        with pytest.raises(ValueError):
+            for entry in iter_playthrough(path, chunk_size=chunk_size):
+                entries.append(entry)
+        # Only whole entries are yielded, never a value cut in the middle
+        assert entries == list(PLAYTHROUGH.items())[:len(entries)]
+        complete = max(complete, len(entries))
+    # The last entry is only known to be whole once the object is closed
+    assert complete == len(PLAYTHROUGH) - 1
+
+
+def test_file_that_is_not_an_object(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_playthrough(write(tmp_path, "[1, 2]")))
+    with pytest.raises(ValueError):
+        list(iter_playthrough(write(tmp_path, "")))
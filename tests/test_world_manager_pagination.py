@@ -0,0 +1,99 @@
+"""Tests of the pagination of the list of worlds of the World Manager (GET /api/worlds)."""
+
+import json
+
+import pytest
+
+import admin.world_manager as world_manager
+
+# (filename, player name, number of locations, number of characters), with repeated names and counts
+# so the pages have to break the ties with the ID and filename
+WORLDS = [
+    ('0_en.json', 'Ana', 3, 1),
+    ('0_es.json', 'ana', 3, 1),
+    ('1_en.json', 'Bruno', 5, 2),
+    ('2_es.json', 'Carla', 3, 0),
+    ('3_en.json', 'Bruno', 1, 2),
+    ('4_es.json', 'Diego', 5, 1),
+    ('5_en.json', 'Eva', 2, 0),
+]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    for filename, player_name, num_locations, num_characters in WORLDS:
+        world = {
+            'locations': [{'name': f'Location {i}'} for i in range(num_locations)],
+            'characters': [{'name': f'Character {i}'} for i in range(num_characters)],
+            'player': {'name': player_name},
+        }
+        (tmp_path / filename).write_text(json.dumps(world), encoding='utf-8')
+    monkeypatch.setattr(world_manager, 'WORLDS_DIR', str(tmp_path))
+    monkeypatch.setattr(world_manager, 'world_index', world_manager.WorldIndex(str(tmp_path)))
+    return world_manager.app.test_client()
+
+
+def walk(client, **params):
+    """Get every page of the list, following the cursors."""
+    filenames, cursor, pages = [], None, 0
+    while True:
+        response = client.get('/api/worlds', query_string={**params, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body['worlds']) <= params['limit']
+        filenames += [world['filename'] for world in body['worlds']]
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            return filenames, body['total'], pages
+
+
+@pytest.mark.parametrize('sort', list(world_manager.SORT_KEYS))
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_pages_cover_every_world_once_in_order(client, sort, order):
+    filenames, total, pages = walk(client, sort=sort, order=order, limit=2)
+
+    whole = client.get('/api/worlds', query_string={'sort': sort, 'order': order, 'limit': 100}).get_json()
+    assert filenames == [world['filename'] for world in whole['worlds']]
+    assert len(filenames) == len(set(filenames)) == total == len(WORLDS)
+    assert pages == 4
+
+    worlds = sorted(whole['worlds'], key=world_manager.SORT_KEYS[sort], reverse=order == 'desc')
+    assert filenames == [world['filename'] for world in worlds]
+
+
+def test_filters_apply_to_every_page(client):
+    filenames, total, _ = walk(client, language='es', sort='name', limit=1)
+    assert filenames == ['0_es.json', '2_es.json', '4_es.json']
+    assert total == 3
+
+    filenames, total, _ = walk(client, name='bruno', limit=1)
+    assert filenames == ['1_en.json', '3_en.json']
+    assert total == 2
+
+
+def test_last_page_has_no_cursor(client):
+    body = client.get('/api/worlds', query_string={'limit': len(WORLDS)}).get_json()
+    assert len(body['worlds']) == len(WORLDS)
+    assert body['next_cursor'] is None
+
+
+def test_invalid_cursors_are_rejected(client):
+    assert client.get('/api/worlds', query_string={'cursor': 'not a cursor'}).status_code == 400
+
+    # A cursor only makes sense in the sort order it was made for
+    cursor = client.get('/api/worlds', query_string={'sort': 'name', 'limit': 2}).get_json()['next_cursor']
+    assert client.get('/api/worlds', query_string={'sort': 'locations', 'cursor': cursor}).status_code == 400
+
+
+def test_etag_changes_with_the_worlds(client, tmp_path):
+    response = client.get('/api/worlds', query_string={'limit': 2})
+    etag = response.headers['ETag']
+    assert client.get('/api/worlds', query_string={'limit': 2}, headers={'If-None-Match': etag}).status_code == 304
+
+    (tmp_path / '6_en.json').write_text(json.dumps({'player': {'name': 'Fede'}}), encoding='utf-8')
+    world_manager.world_index.refresh(force=True)
+
+    response = client.get('/api/worlds', query_string={'limit': 2}, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['total'] == len(WORLDS) + 1
@@ -0,0 +1,87 @@
+"""Tests of the transactional world updates (World.update and WorldTransaction)."""
+
+import json
+
+from world import CharacterAtLocation, InOrder, WorldTransaction
+
+
+def prediction(**changes):
+    return json.dumps({"narration": "Something happens.", **changes})
+
+
+def test_update_applies_every_step(small_world):
+    result = small_world.update(prediction(
+        moved_items=[{"name": "Key", "destination": "Inventory"}],
+        player_movement="Kitchen",
+        steps=[{"unblocked_locations": ["Garden"]}, {"player_movement": "Garden"}]))
+
+    assert result.ok
+    assert small_world.player.location.name == 'Garden'
+    assert [item.name for item in small_world.player.inventory] == ['Key']
+    assert [change['change'] for change in result.applied] == ['moved_item', 'player_movement', 'unblocked_location', 'player_movement']
+
+
+def test_rejected_update_changes_nothing(small_world):
+    hall = small_world.player.location
+    result = small_world.update(prediction(
+        moved_items=[{"name": "Key", "destination": "Inventory"}],
+        steps=[{"player_movement": "Garden"}]))
+
+    assert not result.ok
+    assert result.applied == []
+    assert result.rejected[0]['change'] == 'player_movement'
+    assert small_world.player.location is hall
+    assert small_world.player.inventory == []
+    assert [item.name for item in hall.items] == ['Key']
+
+
+def test_invalid_prediction_is_rejected(small_world):
+    result = small_world.update('{"moved_items": ')
+
+    assert not result.ok
+    assert result.rejected[0]['change'] == 'prediction'
+
+
+def test_rollback_restores_components_and_indexes(small_world):
+    hall, kitchen, garden = (small_world.locations[name] for name in ('Hall', 'Kitchen', 'Garden'))
+    key = small_world.items['Key']
+    assert not small_world.is_reachable(garden)
+
+    transaction = WorldTransaction(small_world.objective_predicate)
+    small_world._process_moved_object('Key', 'Inventory', transaction)
+    transaction.touch(small_world.player)
+    small_world.player.move(kitchen)
+    transaction.touch(kitchen)
+    transaction.touch(garden)
+    kitchen.unblock_passage(garden)
+    assert small_world.is_reachable(garden)
+
+    transaction.rollback()
+
+    assert small_world.player.location is hall
+    assert list(small_world.player.visited_locations) == ['Hall']
+    assert small_world.player.inventory == [] and hall.items == [key]
+    assert small_world._find_item_holder(key) is hall
+    assert 'Garden' in kitchen.blocked_locations and garden not in kitchen.connecting_locations
+    assert not small_world.is_reachable(garden)
+
+
+def test_rollback_restores_the_objective_progress(small_world):
+    kitchen, hall = small_world.locations['Kitchen'], small_world.locations['Hall']
+    player = small_world.player
+    small_world.set_objective(InOrder(CharacterAtLocation(player, kitchen), CharacterAtLocation(player, hall)))
+
+    transaction = WorldTransaction(small_world.objective_predicate)
+    transaction.touch(player)
+    player.move(kitchen)
+    assert small_world.objective_predicate.current_step == 1
+
+    transaction.rollback()
+    assert small_world.objective_predicate.current_step == 0
+    assert not small_world.check_objective()
+
+    # The objective is still listening to the first step
+    player.move(kitchen)
+    assert small_world.objective_predicate.current_step == 1
+    player.move(hall)
+    assert small_world.check_objective()
@@ -1,6 +1,7 @@
 import configparser
 import time
 from models import get_llm
+from reasoning import RetryPolicy
 
 
 def load_config():
@@ -15,6 +16,8 @@ def load_config():
             - log_filename: Timestamped filename for game logs
             - reasoning_model_name: Name of the reasoning model
             - narrative_model_name: Name of the narrative model
+            - fallback_reasoning_model: Instantiated fallback reasoning LLM (None if not configured)
+            - reasoning_policy: RetryPolicy for the reasoning model calls
     """
     # Read configuration
     config = configparser.ConfigParser()
@@ -30,6 +33,17 @@ def load_config():
     # Initialize the models
     reasoning_model = get_llm(reasoning_model_name)
     narrative_model = get_llm(narrative_model_name)
+
+    # Optional hedged requests for the reasoning model
+    if reasoning_model is not None:
+        reasoning_model.hedging = config.getboolean('Models', 'ReasoningHedging', fallback=False)
+        reasoning_model.hedging_quantile = config.getfloat('Models', 'HedgingQuantile', fallback=0.9)
+        reasoning_model.hedging_budget = config.getint('Models', 'HedgingBudget', fallback=20)
+
+    # Optional fallback for the reasoning model, and the policy to retry its calls
+    fallback_reasoning_model_name = config['Models'].get('FallbackReasoningModel', '').strip()
+    fallback_reasoning_model = get_llm(fallback_reasoning_model_name) if fallback_reasoning_model_name else None
+    reasoning_policy = RetryPolicy.from_config(config)
     
     # Create a name for the log file
     timestamp = time.time()
@@ -44,4 +58,6 @@ def load_config():
         'log_filename': log_filename,
         'reasoning_model_name': reasoning_model_name,
         'narrative_model_name': narrative_model_name,
+        'fallback_reasoning_model': fallback_reasoning_model,
+        'reasoning_policy': reasoning_policy,
     }
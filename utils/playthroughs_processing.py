@@ -1,25 +1,161 @@
+import argparse
+import io
 import json
 import os
 import time
 import re
 import numpy
-from typing import Dict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, TextIO
 
 PATH_PLAYTHROUGHS = 'data/playthroughs/'
 DATE_FORMAT = "%a %b %d %H:%M:%S %Y"
+CHUNK_SIZE = 1 << 16
+# Record (in the output folder) of the playthroughs skipped because the objective was not completed
+INCOMPLETE_RECORD_FILENAME = '.incomplete_playthroughs.json'
 
 
+def iter_playthrough(playthrough_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator['tuple[str, Any]']:
+    """Read the entries of a playthrough file one at a time, without loading the whole file.
+
+    The top-level object is parsed incrementally: only the entry being decoded (e.g. one turn,
+    with its world snapshots) is kept in memory, so the memory used does not grow with the
+    number of turns.
+
+    Args:
+        playthrough_path: Path of the raw playthrough (JSON file)
+        chunk_size: Number of characters read from the file at a time
+
+    Yields:
+        (key, value) tuples of the top-level entries, in the order of the file
+    """
+    decoder = json.JSONDecoder()
+    with open(playthrough_path, 'r', encoding='utf-8') as f:
+        buffer, position, end_of_file = '', 0, False
+
+        def read(size: int) -> None:
+            nonlocal buffer, position, end_of_file
+            chunk = f.read(size)
+            end_of_file = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        def next_char() -> str:
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer) or end_of_file:
+                    return buffer[position:position + 1]
+                read(chunk_size)
+
+        def decode() -> Any:
+            nonlocal position
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                    # A number at the end of the buffer (e.g. '-0.') may continue in the next chunk
+                    if end < len(buffer) and buffer[end] not in '0123456789.eE+-':
+                        position = end
+                        return value
+                    if end_of_file:
+                        # A value that is not followed by ',' or '}' may have been cut (e.g. '12' from '12.5')
+                        if buffer[end:].lstrip()[:1] not in (',', '}'):
+                            raise json.JSONDecodeError("Unexpected end of file", buffer, end)
+                        position = end
+                        return value
+                except json.JSONDecodeError:
+                    if end_of_file:
+                        raise
+                # Read at least as much as is buffered, so a large value is decoded a bounded number of times
+                read(max(chunk_size, len(buffer) - position))
+
+        if next_char() != '{':
+            raise ValueError(f"Error: '{playthrough_path}' is not a playthrough (a JSON object)")
+        position += 1
+        while True:
+            char = next_char()
+            if char == '}':
+                return
+            if char == ',':
+                position += 1
+                next_char()
+            key = decode()
+            if next_char() != ':':
+                raise ValueError(f"Error: Invalid playthrough '{playthrough_path}' (expected ':' after '{key}')")
+            position += 1
+            next_char()
+            yield key, decode()
+
+
+def _playthrough_items(playthrough: 'dict | str') -> Iterator['tuple[str, Any]']:
+    """Iterate over the entries of a playthrough dictionary, or of a playthrough file without loading it."""
+    if isinstance(playthrough, dict):
+        return iter(playthrough.items())
+    return iter_playthrough(playthrough)
+
+
+def iter_turns(playthrough: 'dict | str') -> Iterator['tuple[int, dict]']:
+    """Iterate over the turns of a playthrough, one at a time.
+
+    Args:
+        playthrough: Playthrough dictionary, or the path of the playthrough file (read incrementally)
+
+    Yields:
+        (turn number, turn) tuples, in the order of the playthrough
+    """
+    for key, value in _playthrough_items(playthrough):
+        if key.isdigit():
+            yield int(key), value
+
+
+def _scan_playthrough(playthrough: 'dict | str') -> 'tuple[dict, dict, dict]':
+    """Read the values used by the statistics of a playthrough, one turn at a time.
+
+    Returns:
+        A (entries, timestamps, durations) tuple: the entries that are not turns (nickname,
+        objective_completed...), the timestamp of each turn, and the (turn time, model time) of
+        each turn recorded with monotonic timestamps, the last two by turn number
+    """
+    entries, timestamps, durations = {}, {}, {}
+    for key, value in _playthrough_items(playthrough):
+        if not key.isdigit():
+            entries[key] = value
+            continue
+        timestamps[int(key)] = get_turn_timestamp(value)
+        if "turn_start_ns" in value and "turn_end_ns" in value:
+            llm_time = (value["llm_end_ns"] - value["llm_start_ns"]) / 1e9 if "llm_start_ns" in value else 0.0
+            durations[int(key)] = ((value["turn_end_ns"] - value["turn_start_ns"]) / 1e9, llm_time)
+    return entries, timestamps, durations
+
+
+def get_turn_timestamp(turn: dict) -> float:
+    """Get the time (in seconds) when a turn was created.
+
+    Turns recorded with a monotonic timestamp (created_ns) have sub-second resolution; for older
+    turns, the date (with a resolution of one second) is parsed.
+
+    Args:
+        turn: Turn dictionary
+
+    Returns:
+        Timestamp in seconds as float (only comparable with the timestamps of the same playthrough)
+    """
+    if "created_ns" in turn:
+        return turn["created_ns"] / 1e9
+    return time.mktime(time.strptime(turn["date"], DATE_FORMAT))
+
 def _parse_turn_timestamp(turn_key: str, playthrough: Dict) -> float:
-    """Parse turn timestamp and return Unix timestamp.
+    """Parse turn timestamp and return it in seconds.
     
     Args:
         turn_key: String key of the turn (e.g., "1", "2", "3")
         playthrough: Playthrough dictionary
         
     Returns:
-        Unix timestamp as float
+        Timestamp in seconds as float
     """
-    return time.mktime(time.strptime(playthrough[turn_key]["date"], DATE_FORMAT))
+    return get_turn_timestamp(playthrough[turn_key])
 
 def get_elapsed_time(starting_turn: str, ending_turn: str, playthrough: dict) -> float:
     """Calculate elapsed time between two turns.
@@ -48,24 +184,41 @@ def get_turns_to_complete_objective(playthrough: dict) -> int:
     return playthrough["objective_completed_turn"]
         
 
-def get_times_between_turns(playthrough: dict) -> list[float]:
+def get_times_between_turns(playthrough: 'dict | str') -> list[float]:
     """Calculate time elapsed between consecutive turns.
     
     Args:
-        playthrough: Playthrough dictionary
+        playthrough: Playthrough dictionary, or the path of the playthrough file (read one turn at a time)
         
     Returns:
         List of elapsed times (in seconds) between consecutive turns
     """
-    number_of_turns = get_turns_to_complete_objective(playthrough)
-    deltas = []
-    
-    for i in range(1, number_of_turns):
-        start_time = _parse_turn_timestamp(str(i), playthrough)
-        end_time = _parse_turn_timestamp(str(i + 1), playthrough)
-        deltas.append(end_time - start_time)
+    entries, timestamps, _ = _scan_playthrough(playthrough)
+    return _times_between_turns(timestamps, entries["objective_completed_turn"])
+
+def _times_between_turns(timestamps: dict, number_of_turns: int) -> list[float]:
+    return [timestamps[i + 1] - timestamps[i] for i in range(1, number_of_turns)]
 
-    return deltas 
+def get_processing_times(playthrough: 'dict | str') -> 'tuple[list[float], list[float]]':
+    """Calculate how long the turns took to be processed, and how much of it was spent in model calls.
+
+    Only the turns until the objective was completed (or all of them, if it was not) that were
+    recorded with monotonic timestamps (turn_start_ns and turn_end_ns) are considered.
+
+    Args:
+        playthrough: Playthrough dictionary, or the path of the playthrough file (read one turn at a time)
+
+    Returns:
+        A (turn times, model times) tuple of lists, with the time (in seconds) from the player input to
+        the answer of each turn, and from the start of its first model call to the end of its last one
+        (0.0 if the turn did not call a model)
+    """
+    entries, _, durations = _scan_playthrough(playthrough)
+    return _processing_times(durations, entries.get("objective_completed_turn"))
+
+def _processing_times(durations: dict, number_of_turns: 'int | None') -> 'tuple[list[float], list[float]]':
+    turns = [turn for turn in sorted(durations) if number_of_turns is None or turn <= number_of_turns]
+    return [durations[turn][0] for turn in turns], [durations[turn][1] for turn in turns]
 
 def statistic_summary(values: list[float]) -> dict:
     """Calculate min, max, and mean statistics from values.
@@ -90,94 +243,216 @@ def statistic_summary(values: list[float]) -> dict:
     }
 
 
-def get_narrations_length(playthrough: dict, include_starting_narration: bool = True) -> list[int]:
+def get_narrations_length(playthrough: 'dict | str', include_starting_narration: bool = True) -> list[int]:
     """Get the length of narrations for each turn.
     
     Args:
-        playthrough: Playthrough dictionary
+        playthrough: Playthrough dictionary, or the path of the playthrough file (read one turn at a time)
         include_starting_narration: If True, include narration from turn 1 (starting scene)
         
     Returns:
         List of narration lengths (in characters) for each turn
     """
-    number_of_turns = get_turns_to_complete_objective(playthrough)
-    narrations_length = []
+    lengths = {}
+    number_of_turns = None
+    for key, value in _playthrough_items(playthrough):
+        if key.isdigit():
+            lengths[int(key)] = len(value["narration"])
+        elif key == "objective_completed_turn":
+            number_of_turns = value
+    if number_of_turns is None:
+        raise KeyError("objective_completed_turn")
 
     # Turn 1 contains the starting narration
-    if include_starting_narration:
-        narrations_length.append(len(playthrough["1"]["narration"]))
+    first_turn = 1 if include_starting_narration else 2
+    return [lengths[i] for i in range(first_turn, number_of_turns + 1)]
 
-    # Include narrations from subsequent turns
-    for i in range(2, number_of_turns + 1):
-        narrations_length.append(len(playthrough[str(i)]["narration"]))
+class _NewlineCollapsingWriter:
+    """Write text to a file, replacing every run of three or more newlines with two, even across writes."""
+    def __init__(self, file: TextIO) -> None:
+        self.file = file
+        self.trailing_newlines = 0
 
-    return narrations_length
+    def write(self, text: str) -> None:
+        text = re.sub(r'\n{3,}', '\n\n', text)
+        body = text.lstrip('\n')
+        leading_newlines = min(len(text) - len(body), max(0, 2 - self.trailing_newlines))
+        self.file.write('\n' * leading_newlines + body)
+        if body:
+            self.trailing_newlines = len(body) - len(body.rstrip('\n'))
+        else:
+            self.trailing_newlines += leading_newlines
+
+
+def write_txt_from_playthrough(playthrough: 'dict | str', playthrough_filename: str, file: TextIO) -> None:
+    """Write a formatted text representation of a completed playthrough, one turn at a time.
 
-def generate_txt_from_playthrough(playthrough: dict, playthrough_filename: str) -> str:
-    """Generate a formatted text representation of a completed playthrough.
-    
     Args:
-        playthrough: Playthrough dictionary from JSON
+        playthrough: Playthrough dictionary from JSON, or the path of the playthrough file (read one
+            turn at a time, twice: once for the summary and once for the turns)
         playthrough_filename: Original JSON filename for reference
-        
-    Returns:
-        Formatted text string with turn-by-turn playthrough summary
+        file: Text file (or stream) where the playthrough is written
     """
-    # Discover all turns in the playthrough (numeric string keys)
-    turn_keys = sorted([int(k) for k in playthrough.keys() if k.isdigit()])
+    _write_txt(playthrough, playthrough_filename, file, _scan_playthrough(playthrough))
+
+
+def _write_txt(playthrough: 'dict | str', playthrough_filename: str, file: TextIO, scan: 'tuple[dict, dict, dict]') -> None:
+    """Write the text of a playthrough, given the values read by _scan_playthrough."""
+    entries, timestamps, durations = scan
+    turn_keys = sorted(timestamps)
     
     if not turn_keys:
-        return "No turns found in playthrough."
+        file.write("No turns found in playthrough.")
+        return
     
     number_of_turns = max(turn_keys)
-    turns_text = ""
-
-    for turn in turn_keys:
-        turns_text+= f'\n======= TURN {turn} ======='
-        turns_text+= f'\n\n🌐 World state 🌐\n{playthrough[str(turn)]["previous_rendered_world_state"]}'
-        turns_text+= f'\n\n📖 Automated GM 📖\n"{playthrough[str(turn)]["narration"].replace(chr(10), "")}"'
-        turns_text+= f'\n\n👉 Player utterance 👈\n"{playthrough[str(turn)]["user_input"]}"'
-        turns_text+= f'\n\n⚙️ Predicted transformations ⚙️\n' + (playthrough[str(turn)]["predicted_outcomes"] if isinstance(playthrough[str(turn)]["predicted_outcomes"], str) else json.dumps(playthrough[str(turn)]["predicted_outcomes"], indent=2))
-
-    elapsed_total = get_elapsed_time("1", str(number_of_turns), playthrough)
-    turn_times = get_times_between_turns(playthrough)
+    elapsed_total = timestamps[number_of_turns] - timestamps[1]
+    turn_times = _times_between_turns(timestamps, entries["objective_completed_turn"])
     stats = statistic_summary(turn_times)
+    processing_times, model_times = _processing_times(durations, entries.get("objective_completed_turn"))
+    minutes, seconds = divmod(round(elapsed_total), 60)
     
     # Use objective_completed_turn if available for the summary, otherwise use max turn
-    turns_to_complete = playthrough.get("objective_completed_turn", number_of_turns)
-
-    text = f"📄 Original file: '{playthrough_filename}'\n\n"
-    text += f"🙋‍♀️ Player: {playthrough['nickname']}\n"
-    text += f"🖼️ Scenario: {playthrough['world_id']}\n"
-    text += f"🌐 Language: {playthrough['language']}\n"
-    text += f"#️⃣ Number of turns to complete the scenario: {turns_to_complete}\n"
-    text += f"⏰ Elapsed time: {time.localtime(elapsed_total).tm_min} minutes and {time.localtime(elapsed_total).tm_sec} seconds\n"
+    turns_to_complete = entries.get("objective_completed_turn", number_of_turns)
+
+    writer = _NewlineCollapsingWriter(file)
+    writer.write(f"📄 Original file: '{playthrough_filename}'\n\n"
+                 f"🙋‍♀️ Player: {entries['nickname']}\n"
+                 f"🖼️ Scenario: {entries['world_id']}\n"
+                 f"🌐 Language: {entries['language']}\n"
+                 f"#️⃣ Number of turns to complete the scenario: {turns_to_complete}\n"
+                 f"⏰ Elapsed time: {minutes} minutes and {seconds} seconds\n")
     
     if stats['min'] is not None:
-        text += f"\t⏰ Shortest turn: {stats['min']:.2f} seconds\n"
-        text += f"\t⏰ Average turn: {stats['mean']:.2f} seconds\n"
-        text += f"\t⏰ Longest turn: {stats['max']:.2f} seconds\n"
+        writer.write(f"\t⏰ Shortest turn: {stats['min']:.2f} seconds\n"
+                     f"\t⏰ Average turn: {stats['mean']:.2f} seconds\n"
+                     f"\t⏰ Longest turn: {stats['max']:.2f} seconds\n")
+
+    if processing_times:
+        writer.write(f"\t⚙️ Average processing of a turn: {numpy.mean(processing_times):.2f} seconds "
+                     f"({numpy.mean(model_times):.2f} seconds in model calls)\n")
+
+    # Files are read in their order, which is the order the turns were played
+    turns = ((turn, playthrough[str(turn)]) for turn in turn_keys) if isinstance(playthrough, dict) else iter_turns(playthrough)
+    for turn, turn_entry in turns:
+        predicted_outcomes = turn_entry["predicted_outcomes"]
+        writer.write(f'\n======= TURN {turn} =======')
+        writer.write(f'\n\n🌐 World state 🌐\n{turn_entry["previous_rendered_world_state"]}')
+        writer.write(f'\n\n📖 Automated GM 📖\n"{turn_entry["narration"].replace(chr(10), "")}"')
+        writer.write(f'\n\n👉 Player utterance 👈\n"{turn_entry["user_input"]}"')
+        writer.write(f'\n\n⚙️ Predicted transformations ⚙️\n' + (predicted_outcomes if isinstance(predicted_outcomes, str) else json.dumps(predicted_outcomes, indent=2)))
+
+
+def generate_txt_from_playthrough(playthrough: dict, playthrough_filename: str) -> str:
+    """Generate a formatted text representation of a completed playthrough.
     
-    text += turns_text
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    Args:
+        playthrough: Playthrough dictionary from JSON
+        playthrough_filename: Original JSON filename for reference
+        
+    Returns:
+        Formatted text string with turn-by-turn playthrough summary
+    """
+    text = io.StringIO()
+    write_txt_from_playthrough(playthrough, playthrough_filename, text)
+    return text.getvalue()
 
-    return text
 
+def convert_playthrough(playthrough_path: str, output_directory: str = PATH_PLAYTHROUGHS, force: bool = False) -> 'tuple[str, str]':
+    """Convert a raw playthrough to a .txt file, unless the .txt file is already up to date.
 
+    The playthrough is read one turn at a time (see `iter_playthrough`), so the memory used does
+    not grow with its size. The text is written to a temporary file that replaces the .txt file
+    when it is complete, so an interrupted conversion never leaves a partial file that looks up to date.
 
-if __name__ == "__main__":
+    Args:
+        playthrough_path: Path of the raw playthrough (JSON file)
+        output_directory: Folder where the .txt file is written
+        force: If True, the .txt file is written even if it is newer than the playthrough
+
+    Returns:
+        A (status, message) tuple, with status 'done', 'up to date', 'incomplete' (the objective
+        was not completed) or 'skipped'
+    """
+    playthrough_filename = os.path.basename(playthrough_path)
+    output_path = os.path.join(output_directory, playthrough_filename[:-5] + '.txt')
+    if not force and os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(playthrough_path):
+        return 'up to date', ''
+
+    scan = _scan_playthrough(playthrough_path)
+
+    # Only process playthroughs where the objective was actually completed
+    if not scan[0].get("objective_completed", False):
+        return 'incomplete', "Objective was not completed."
+
+    temporary_path = output_path + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        _write_txt(playthrough_path, playthrough_filename, f, scan)
+    os.replace(temporary_path, output_path)
+    return 'done', scan[0]['nickname']
+
+
+def convert_playthroughs(input_directory: str = os.path.join(PATH_PLAYTHROUGHS, "raw"), output_directory: str = PATH_PLAYTHROUGHS,
+                         workers: int = None, force: bool = False) -> Dict[str, 'tuple[str, str]']:
+    """Convert the raw playthroughs of a folder to .txt files in parallel, skipping those already converted.
 
-    for playthrough_filename in os.listdir(os.path.join(PATH_PLAYTHROUGHS, "raw")):
-        if playthrough_filename.endswith(".json"):
-            with open(os.path.join(PATH_PLAYTHROUGHS,"raw", playthrough_filename), 'r', encoding='utf-8') as f:
-                playthrough = json.load(f)
+    The playthroughs where the objective was not completed are recorded in the output folder
+    (with their modification time and size), so they are not read again until they change.
 
-            # Only process playthroughs where the objective was actually completed
-            if not playthrough.get("objective_completed", False):
-                print(f"Skipping (file '{playthrough_filename}'): Objective was not completed.")
-            else:
-                playthrough_as_text = generate_txt_from_playthrough(playthrough, playthrough_filename)
+    Args:
+        input_directory: Folder with the raw playthroughs (JSON files)
+        output_directory: Folder where the .txt files are written
+        workers: Number of processes (the number of CPUs if None)
+        force: If True, every playthrough is converted again
+
+    Returns:
+        Dictionary with the filename of each playthrough as key and its (status, message) tuple as value
+    """
+    record_path = os.path.join(output_directory, INCOMPLETE_RECORD_FILENAME)
+    incomplete = {}
+    if not force and os.path.exists(record_path):
+        with open(record_path, 'r', encoding='utf-8') as f:
+            incomplete = json.load(f)
+
+    results, stats, playthrough_paths = {}, {}, []
+    for filename in sorted(os.listdir(input_directory)):
+        if not filename.endswith(".json"):
+            continue
+        stat = os.stat(os.path.join(input_directory, filename))
+        stats[filename] = [stat.st_mtime, stat.st_size]
+        if incomplete.get(filename) == stats[filename]:
+            results[filename] = ('incomplete', "Objective was not completed.")
+        else:
+            playthrough_paths.append(os.path.join(input_directory, filename))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(convert_playthrough, path, output_directory, force): os.path.basename(path)
+                   for path in playthrough_paths}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = ('skipped', f"Error: {e}")
+
+    incomplete = {filename: stats[filename] for filename, (status, _) in sorted(results.items()) if status == 'incomplete'}
+    os.makedirs(output_directory, exist_ok=True)
+    with open(record_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(incomplete, f, indent=2)
+    os.replace(record_path + '.tmp', record_path)
+    return results
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the completed playthroughs to .txt files.")
+    parser.add_argument('--workers', type=int, default=None, help="Number of processes (the number of CPUs by default)")
+    parser.add_argument('--force', action='store_true', help="Convert every playthrough, even if its .txt file is up to date")
+    args = parser.parse_args()
 
-                with open(os.path.join(PATH_PLAYTHROUGHS, playthrough_filename[:-5] + '.txt'), 'w', encoding='utf-8') as f:
-                    f.write(playthrough_as_text)
-                    print(f"{playthrough_filename} ({playthrough['nickname']}) ...done")
+    results = convert_playthroughs(workers=args.workers, force=args.force)
+    for playthrough_filename, (status, message) in sorted(results.items()):
+        if status == 'done':
+            print(f"{playthrough_filename} ({message}) ...done")
+        elif status in ('skipped', 'incomplete'):
+            print(f"Skipping (file '{playthrough_filename}'): {message}")
+    print(f"{sum(status == 'up to date' for status, _ in results.values())} playthroughs already up to date")
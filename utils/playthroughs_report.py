@@ -0,0 +1,246 @@
+"""Aggregate report of the playthroughs in the columnar store.
+
+The statistics are computed over the columns of `utils.playthroughs_store` with
+NumPy array operations (no loop over the turns or the playthroughs), so the
+report of every recorded session takes a few milliseconds. It is exported as
+JSON, as CSV and as a static HTML page, to compare the performance of releases.
+
+Usage:
+    python -m utils.playthroughs_report
+    python -m utils.playthroughs_report --ingest --output-dir data/playthroughs/report
+"""
+
+import argparse
+import csv
+import html
+import json
+import os
+import sqlite3
+from typing import Dict, List
+
+import numpy
+
+from utils.playthroughs_store import PATH_RAW_PLAYTHROUGHS, PATH_STORE, connect, get_turn_times, ingest, load_columns
+
+PATH_REPORT = 'data/playthroughs/report'
+PERCENTILES = [50, 90, 95, 99]
+
+
+def _group_codes(*columns: numpy.ndarray) -> 'tuple[numpy.ndarray, numpy.ndarray]':
+    """Number the distinct combinations of values of some columns.
+
+    Returns:
+        A (codes, groups) tuple: the group of each row, and the values of each group (one row per group)
+    """
+    codes = numpy.zeros(len(columns[0]), dtype=numpy.int64)
+    for column in columns:
+        values, inverse = numpy.unique(column.astype(str), return_inverse=True)
+        codes = codes * len(values) + inverse
+    _, first_rows, codes = numpy.unique(codes, return_index=True, return_inverse=True)
+    groups = numpy.stack([column.astype(str)[first_rows] for column in columns], axis=1)
+    return codes, groups
+
+
+def _turn_time_stats(turn_times: numpy.ndarray) -> Dict:
+    """Count, min, mean, max and percentiles of some turn times (None if there are none)."""
+    stats = {"count": int(len(turn_times))}
+    if not len(turn_times):
+        return dict(stats, min=None, mean=None, max=None, **{f"p{p}": None for p in PERCENTILES})
+    stats.update({"min": float(turn_times.min()), "mean": float(turn_times.mean()), "max": float(turn_times.max())})
+    stats.update({f"p{p}": float(value) for p, value in zip(PERCENTILES, numpy.percentile(turn_times, PERCENTILES))})
+    return stats
+
+
+def objective_by_world(playthroughs: Dict[str, numpy.ndarray]) -> List[Dict]:
+    """Completion of the objective for each world and language.
+
+    Args:
+        playthroughs: Columns of the playthroughs table (world_id, language, objective_completed, objective_completed_turn)
+
+    Returns:
+        One dictionary per world and language, with the number of playthroughs, the completion rate
+        and the min, mean and max turns to complete the objective (None if it was never completed)
+    """
+    if not len(playthroughs["world_id"]):
+        return []
+    codes, groups = _group_codes(playthroughs["world_id"], playthroughs["language"])
+    completed = playthroughs["objective_completed"].astype(bool)
+    turns = numpy.where(completed, playthroughs["objective_completed_turn"], 0).astype(numpy.float64)
+
+    count = numpy.bincount(codes, minlength=len(groups))
+    completions = numpy.bincount(codes, weights=completed, minlength=len(groups))
+    turns_sum = numpy.bincount(codes, weights=turns, minlength=len(groups))
+    turns_min = numpy.full(len(groups), numpy.inf)
+    turns_max = numpy.full(len(groups), -numpy.inf)
+    numpy.minimum.at(turns_min, codes[completed], turns[completed])
+    numpy.maximum.at(turns_max, codes[completed], turns[completed])
+
+    return [{
+        "world_id": world_id,
+        "language": language,
+        "playthroughs": int(count[i]),
+        "completion_rate": float(completions[i] / count[i]),
+        "min_turns": int(turns_min[i]) if completions[i] else None,
+        "mean_turns": float(turns_sum[i] / completions[i]) if completions[i] else None,
+        "max_turns": int(turns_max[i]) if completions[i] else None,
+    } for i, (world_id, language) in enumerate(groups)]
+
+
+def reasoning_by_model(playthroughs: Dict[str, numpy.ndarray], turns: Dict[str, numpy.ndarray]) -> List[Dict]:
+    """Share of the turn time spent waiting for the reasoning model, and rate of failed calls, for each model.
+
+    The time of a turn is the time until the next turn was created, so it includes the time the
+    player spent typing and the narration.
+
+    Args:
+        playthroughs: Columns of the playthroughs table (file, reasoning_model_name)
+        turns: Columns of the turns table (file, timestamp, reasoning_calls, reasoning_failures, reasoning_duration)
+
+    Returns:
+        One dictionary per reasoning model, with the number of calls, the failure rate, the mean
+        duration of the calls and the share of the turn time taken by the calls
+    """
+    if not len(turns["file"]):
+        return []
+    model_names = playthroughs["reasoning_model_name"].astype(str)[numpy.searchsorted(playthroughs["file"], turns["file"])]
+    codes, groups = _group_codes(model_names)
+
+    # Turns followed by another turn of the same playthrough have a known duration
+    has_next = numpy.append(turns["file"][1:] == turns["file"][:-1], False)
+    turn_time = numpy.append(numpy.diff(turns["timestamp"]), 0.0) * has_next
+    reasoning_duration = turns["reasoning_duration"].astype(numpy.float64)
+
+    calls = numpy.bincount(codes, weights=turns["reasoning_calls"], minlength=len(groups))
+    failures = numpy.bincount(codes, weights=turns["reasoning_failures"], minlength=len(groups))
+    duration = numpy.bincount(codes, weights=reasoning_duration, minlength=len(groups))
+    timed_duration = numpy.bincount(codes, weights=reasoning_duration * has_next, minlength=len(groups))
+    total_time = numpy.bincount(codes, weights=turn_time, minlength=len(groups))
+
+    return [{
+        "reasoning_model_name": model_name,
+        "calls": int(calls[i]),
+        "failure_rate": float(failures[i] / calls[i]) if calls[i] else None,
+        "mean_call_duration": float(duration[i] / calls[i]) if calls[i] else None,
+        "latency_share": float(timed_duration[i] / total_time[i]) if total_time[i] > 0 else None,
+    } for i, (model_name,) in enumerate(groups)]
+
+
+def build_report(connection: sqlite3.Connection) -> Dict:
+    """Compute the aggregate report of the playthroughs in the store.
+
+    Args:
+        connection: An open connection to the store
+
+    Returns:
+        Dictionary with the number of playthroughs and turns, the statistics of the times between
+        turns and of the processing times of the turns (percentiles included), the share of the
+        processing time spent in model calls, the completion of the objective per world and language, and
+        the latency share and failure rate of each reasoning model
+    """
+    playthroughs = load_columns(connection, 'playthroughs')
+    turns = load_columns(connection, 'turns', ["file", "timestamp", "reasoning_calls", "reasoning_failures", "reasoning_duration",
+                                               "turn_duration", "llm_duration"])
+    calls = turns["reasoning_calls"].sum() if len(turns["file"]) else 0
+
+    # Only the turns recorded with monotonic timestamps have their processing times
+    turn_duration = turns["turn_duration"].astype(numpy.float64)
+    llm_duration = turns["llm_duration"].astype(numpy.float64)
+    timed = ~numpy.isnan(turn_duration)
+    processing_time = turn_duration[timed].sum()
+
+    return {
+        "playthroughs": int(len(playthroughs["file"])),
+        "turns": int(len(turns["file"])),
+        "completion_rate": float(playthroughs["objective_completed"].mean()) if len(playthroughs["file"]) else None,
+        "turn_time": _turn_time_stats(get_turn_times(connection, completed_only=False)),
+        "processing_time": _turn_time_stats(turn_duration[timed]),
+        "llm_processing_share": float(llm_duration[timed].sum() / processing_time) if processing_time > 0 else None,
+        "reasoning_failure_rate": float(turns["reasoning_failures"].sum() / calls) if calls else None,
+        "objective_by_world": objective_by_world(playthroughs),
+        "reasoning_by_model": reasoning_by_model(playthroughs, turns),
+    }
+
+
+def _report_tables(report: Dict) -> Dict[str, List[Dict]]:
+    """Split the report into tables (lists of rows with the same keys)."""
+    summary = [{"metric": key, "value": value} for key, value in report.items() if not isinstance(value, (dict, list))]
+    for section in ("turn_time", "processing_time"):
+        summary += [{"metric": f"{section}_{key}", "value": value} for key, value in report[section].items()]
+    return {
+        "summary": summary,
+        "objective_by_world": report["objective_by_world"],
+        "reasoning_by_model": report["reasoning_by_model"],
+    }
+
+
+def write_csv(report: Dict, output_directory: str) -> List[str]:
+    """Write each table of the report as a CSV file (report_<table>.csv).
+
+    Returns:
+        List of the paths of the written files
+    """
+    paths = []
+    for table, rows in _report_tables(report).items():
+        path = os.path.join(output_directory, f"report_{table}.csv")
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            if rows:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        paths.append(path)
+    return paths
+
+
+def write_html(report: Dict, path: str) -> None:
+    """Write the report as a static HTML page, with one table per section."""
+    def cell(value) -> str:
+        if value is None:
+            return "—"
+        return html.escape(f"{value:.3f}" if isinstance(value, float) else str(value))
+
+    sections = []
+    for table, rows in _report_tables(report).items():
+        if not rows:
+            sections.append(f"<h2>{html.escape(table)}</h2><p>No data</p>")
+            continue
+        header = "".join(f"<th>{html.escape(column)}</th>" for column in rows[0])
+        body = "".join("<tr>" + "".join(f"<td>{cell(value)}</td>" for value in row.values()) + "</tr>" for row in rows)
+        sections.append(f"<h2>{html.escape(table)}</h2><table><tr>{header}</tr>{body}</table>")
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>PAYADOR playthroughs</title>"
+                "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin-bottom:2em}"
+                "th,td{border:1px solid #ccc;padding:4px 8px;text-align:right}th{background:#eee}</style></head>"
+                f"<body><h1>PAYADOR playthroughs</h1>{''.join(sections)}</body></html>\n")
+
+
+def export_report(report: Dict, output_directory: str = PATH_REPORT) -> List[str]:
+    """Save the report as report.json, one CSV file per table and report.html.
+
+    Returns:
+        List of the paths of the written files
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    json_path, html_path = os.path.join(output_directory, "report.json"), os.path.join(output_directory, "report.html")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    csv_paths = write_csv(report, output_directory)
+    write_html(report, html_path)
+    return [json_path] + csv_paths + [html_path]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the statistics of the playthroughs in the columnar store.")
+    parser.add_argument('--store', default=PATH_STORE, help="Path of the SQLite database")
+    parser.add_argument('--ingest', action='store_true', help="Ingest the new playthroughs before the report")
+    parser.add_argument('--directory', default=PATH_RAW_PLAYTHROUGHS, help="Folder with the raw playthroughs (with --ingest)")
+    parser.add_argument('--output-dir', default=PATH_REPORT)
+    args = parser.parse_args()
+
+    if args.ingest:
+        print(f"{len(ingest(args.directory, args.store))} playthroughs ingested")
+    connection = connect(args.store)
+    report = build_report(connection)
+    connection.close()
+    for path in export_report(report, args.output_dir):
+        print(f"{path} ...done")
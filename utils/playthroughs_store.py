@@ -0,0 +1,290 @@
+"""Columnar store of the per-turn scalars of the recorded playthroughs.
+
+The raw playthroughs keep a jsonpickle snapshot of the world in every turn, so
+loading them is slow. The ingest step extracts the values used by the analyses
+(timestamps, input and narration lengths, predicted changes, reasoning calls and
+objective completion) into an SQLite database, one row per turn. Files already
+ingested are skipped unless they changed, so re-running it only reads new logs.
+The columns are then loaded as NumPy arrays to compute cross-playthrough
+statistics without touching the raw files.
+
+Usage:
+    python -m utils.playthroughs_store
+    python -m utils.playthroughs_store --directory data/playthroughs/raw --store data/playthroughs/playthroughs.sqlite
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from typing import Dict, List
+
+import numpy
+
+from utils.playthroughs_processing import get_turn_timestamp, iter_playthrough, iter_turns
+
+PATH_RAW_PLAYTHROUGHS = 'data/playthroughs/raw'
+PATH_STORE = 'data/playthroughs/playthroughs.sqlite'
+
+PLAYTHROUGH_COLUMNS = {
+    "file": "TEXT PRIMARY KEY",
+    "mtime": "REAL",
+    "size": "INTEGER",
+    "nickname": "TEXT",
+    "world_id": "TEXT",
+    "language": "TEXT",
+    "narrative_model_name": "TEXT",
+    "reasoning_model_name": "TEXT",
+    "number_of_turns": "INTEGER",
+    "objective_completed": "INTEGER",
+    "objective_completed_turn": "INTEGER",
+}
+
+TURN_COLUMNS = {
+    "file": "TEXT",
+    "turn": "INTEGER",
+    "timestamp": "REAL",
+    "input_length": "INTEGER",
+    "narration_length": "INTEGER",
+    "moved_items": "INTEGER",
+    "unblocked_locations": "INTEGER",
+    "player_moved": "INTEGER",
+    "fast_command": "TEXT",
+    "reasoning_calls": "INTEGER",
+    "reasoning_failures": "INTEGER",
+    "reasoning_duration": "REAL",
+    "turn_duration": "REAL",
+    "llm_duration": "REAL",
+}
+
+
+def connect(store_path: str = PATH_STORE) -> sqlite3.Connection:
+    """Open the store, creating its tables if needed.
+
+    The store only holds values extracted from the raw playthroughs, so tables created with other
+    columns (by a previous version) are dropped and everything is ingested again.
+
+    Args:
+        store_path: Path of the SQLite database
+
+    Returns:
+        An open connection to the store
+    """
+    if os.path.dirname(store_path):
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    connection = sqlite3.connect(store_path)
+    for table, known_columns in (("playthroughs", PLAYTHROUGH_COLUMNS), ("turns", TURN_COLUMNS)):
+        columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+        if columns and columns != list(known_columns):
+            print(f"The columns of the '{table}' table in {store_path} changed, the store is emptied and the playthroughs will be ingested again")
+            connection.execute("DROP TABLE IF EXISTS turns")
+            connection.execute("DROP TABLE IF EXISTS playthroughs")
+            break
+    columns = ", ".join(f"{name} {type}" for name, type in PLAYTHROUGH_COLUMNS.items())
+    connection.execute(f"CREATE TABLE IF NOT EXISTS playthroughs ({columns})")
+    columns = ", ".join(f"{name} {type}" for name, type in TURN_COLUMNS.items())
+    connection.execute(f"CREATE TABLE IF NOT EXISTS turns ({columns}, PRIMARY KEY (file, turn))")
+    return connection
+
+
+def _count_changes(predicted_outcomes) -> 'tuple[int, int, int]':
+    """Count the moved items, unblocked locations and player movements of a prediction (including its steps)."""
+    if isinstance(predicted_outcomes, str):
+        try:
+            predicted_outcomes = json.loads(predicted_outcomes) if predicted_outcomes else {}
+        except json.JSONDecodeError:
+            predicted_outcomes = {}
+    if not isinstance(predicted_outcomes, dict):
+        predicted_outcomes = {}
+    steps = [predicted_outcomes] + list(predicted_outcomes.get("steps") or [])
+    return (sum(len(step.get("moved_items") or []) for step in steps),
+            sum(len(step.get("unblocked_locations") or []) for step in steps),
+            sum(step.get("player_movement") is not None for step in steps))
+
+
+def _turn_row(filename: str, turn_number: int, turn: Dict) -> tuple:
+    """Extract the scalars of a turn, as a row with the values of TURN_COLUMNS."""
+    attempts = turn.get("reasoning_attempts") or []
+    return (
+        filename,
+        turn_number,
+        get_turn_timestamp(turn),
+        len(turn.get("user_input") or ""),
+        len(turn.get("narration") or ""),
+        *_count_changes(turn.get("predicted_outcomes")),
+        turn.get("fast_command"),
+        len(attempts),
+        sum(attempt.get("status") != "ok" for attempt in attempts),
+        sum(attempt.get("duration") or 0.0 for attempt in attempts),
+        (turn["turn_end_ns"] - turn["turn_start_ns"]) / 1e9 if "turn_end_ns" in turn and "turn_start_ns" in turn else None,
+        (turn["llm_end_ns"] - turn["llm_start_ns"]) / 1e9 if "llm_start_ns" in turn else (0.0 if "turn_start_ns" in turn else None),
+    )
+
+
+def extract_turn_rows(playthrough: 'Dict | str', filename: str) -> List[tuple]:
+    """Extract the scalars of each turn of a playthrough.
+
+    The durations of the turn and of its model calls are None if the turn was recorded without
+    monotonic timestamps.
+
+    Args:
+        playthrough: Playthrough dictionary, or the path of the playthrough file (read one turn at a time)
+        filename: Name of the playthrough file, used as its key in the store
+
+    Returns:
+        List of rows with the values of TURN_COLUMNS, in order
+    """
+    return sorted((_turn_row(filename, turn_number, turn) for turn_number, turn in iter_turns(playthrough)), key=lambda row: row[1])
+
+
+def ingest(directory: str = PATH_RAW_PLAYTHROUGHS, store_path: str = PATH_STORE) -> List[str]:
+    """Add the new or changed playthroughs of a folder to the store.
+
+    A file is skipped if its modification time and size did not change since it was ingested.
+    Each file is read one turn at a time, so only the scalars of its turns are kept in memory.
+
+    Args:
+        directory: Folder with the raw playthroughs (JSON files)
+        store_path: Path of the SQLite database
+
+    Returns:
+        List of the files that were ingested
+    """
+    connection = connect(store_path)
+    ingested_files = {file: (mtime, size) for file, mtime, size in connection.execute("SELECT file, mtime, size FROM playthroughs")}
+    ingested = []
+
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(directory, filename)
+        stat = os.stat(path)
+        if ingested_files.get(filename) == (stat.st_mtime, stat.st_size):
+            continue
+
+        try:
+            playthrough, rows = {}, []
+            for key, value in iter_playthrough(path):
+                if key.isdigit():
+                    rows.append(_turn_row(filename, int(key), value))
+                else:
+                    playthrough[key] = value
+            rows.sort(key=lambda row: row[1])
+        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            print(f"Skipping (file '{filename}'): {e}")
+            continue
+
+        with connection:
+            connection.execute("DELETE FROM turns WHERE file = ?", (filename,))
+            connection.execute("DELETE FROM playthroughs WHERE file = ?", (filename,))
+            connection.execute(f"INSERT INTO playthroughs VALUES ({', '.join('?' * len(PLAYTHROUGH_COLUMNS))})", (
+                filename,
+                stat.st_mtime,
+                stat.st_size,
+                playthrough.get("nickname"),
+                playthrough.get("world_id"),
+                playthrough.get("language"),
+                playthrough.get("narrative_model_name"),
+                playthrough.get("reasoning_model_name"),
+                len(rows),
+                int(bool(playthrough.get("objective_completed", False))),
+                playthrough.get("objective_completed_turn"),
+            ))
+            connection.executemany(f"INSERT INTO turns VALUES ({', '.join('?' * len(TURN_COLUMNS))})", rows)
+        ingested.append(filename)
+
+    connection.close()
+    return ingested
+
+
+def load_columns(connection: sqlite3.Connection, table: str = 'turns', columns: List[str] = None) -> Dict[str, numpy.ndarray]:
+    """Load columns of the store as NumPy arrays, ordered by file (and turn, for the turns).
+
+    Args:
+        connection: An open connection to the store
+        table: 'turns' or 'playthroughs'
+        columns: The columns to load (all of them if None)
+
+    Returns:
+        Dictionary with the name of each column as key and its values as an array
+    """
+    known_columns = TURN_COLUMNS if table == 'turns' else PLAYTHROUGH_COLUMNS
+    columns = columns or list(known_columns)
+    unknown = [column for column in columns if column not in known_columns]
+    if unknown:
+        raise ValueError(f"Unknown columns for table '{table}': {', '.join(unknown)}")
+
+    order = "file, turn" if table == 'turns' else "file"
+    rows = connection.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {order}").fetchall()
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {column: numpy.array(column_values) for column, column_values in zip(columns, values)}
+
+
+def get_turn_times(connection: sqlite3.Connection, completed_only: bool = True) -> numpy.ndarray:
+    """Calculate the time between consecutive turns of every playthrough, with vectorized operations.
+
+    As in `playthroughs_processing.get_times_between_turns`, only the turns until the objective
+    was completed are considered.
+
+    Args:
+        connection: An open connection to the store
+        completed_only: If True, only the playthroughs where the objective was completed are included
+
+    Returns:
+        Array of elapsed times (in seconds) between consecutive turns
+    """
+    turns = load_columns(connection, 'turns', ["file", "turn", "timestamp"])
+    playthroughs = load_columns(connection, 'playthroughs', ["file", "objective_completed", "objective_completed_turn"])
+    if len(turns["file"]) < 2:
+        return numpy.array([])
+
+    # The last turn of each playthrough: the one where the objective was completed, if any
+    completed = playthroughs["objective_completed"].astype(bool)
+    last_turn = numpy.where(completed, playthroughs["objective_completed_turn"], numpy.iinfo(numpy.int64).max).astype(numpy.int64)
+    playthrough_index = numpy.searchsorted(playthroughs["file"], turns["file"])
+    keep = turns["turn"] <= last_turn[playthrough_index]
+    if completed_only:
+        keep &= completed[playthrough_index]
+
+    files, timestamps = turns["file"][keep], turns["timestamp"][keep]
+    same_playthrough = files[1:] == files[:-1]
+    return numpy.diff(timestamps)[same_playthrough]
+
+
+def summarize_store(store_path: str = PATH_STORE) -> Dict:
+    """Calculate statistics of all the ingested playthroughs.
+
+    Args:
+        store_path: Path of the SQLite database
+
+    Returns:
+        Dictionary with the number of playthroughs and turns, the completion rate, and the
+        min, mean and max time between turns (None if there are no turns)
+    """
+    connection = connect(store_path)
+    playthroughs = load_columns(connection, 'playthroughs', ["objective_completed"])
+    turns = load_columns(connection, 'turns', ["narration_length"])
+    turn_times = get_turn_times(connection)
+    connection.close()
+
+    return {
+        "playthroughs": len(playthroughs["objective_completed"]),
+        "turns": len(turns["narration_length"]),
+        "completion_rate": float(playthroughs["objective_completed"].mean()) if len(playthroughs["objective_completed"]) else None,
+        "turn_time": {
+            "min": float(turn_times.min()) if len(turn_times) else None,
+            "mean": float(turn_times.mean()) if len(turn_times) else None,
+            "max": float(turn_times.max()) if len(turn_times) else None,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the raw playthroughs into the columnar store and summarize them.")
+    parser.add_argument('--directory', default=PATH_RAW_PLAYTHROUGHS, help="Folder with the raw playthroughs")
+    parser.add_argument('--store', default=PATH_STORE, help="Path of the SQLite database")
+    args = parser.parse_args()
+
+    for filename in ingest(args.directory, args.store):
+        print(f"{filename} ...ingested")
+    print(json.dumps(summarize_store(args.store), indent=2))
@@ -0,0 +1,156 @@
+"""A/B comparison of the text and JSON world states given to the reasoning model.
+
+The recorded playthroughs keep the symbolic world state and the player input of
+each turn. Every turn is replayed with the world rendered in each format (see
+`World.render_world`): the size of the prompt is always measured, and if a model
+is given, it is prompted with both states to compare how often its answer is
+valid JSON and how often the world can apply the predicted changes.
+
+Usage:
+    python -m utils.render_ab
+    python -m utils.render_ab --model gemini-2.5-flash --max-turns 50 --output data/playthroughs/render_ab.json
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+import jsonpickle
+from pydantic import ValidationError
+
+from models import WorldUpdatePrediction, get_llm
+from prompts import prompt_world_update
+from reasoning import clean_json_response
+from world import estimate_tokens
+
+PATH_RAW_PLAYTHROUGHS = 'data/playthroughs/raw'
+FORMATS = ['text', 'json']
+
+
+def load_recorded_turns(directory: str = PATH_RAW_PLAYTHROUGHS, max_turns: int = None) -> List[Dict]:
+    """Load the turns of the recorded playthroughs that have a player input and a symbolic world state.
+
+    Args:
+        directory: Folder with the raw playthroughs (JSON files)
+        max_turns: Maximum number of turns to load (all of them if None)
+
+    Returns:
+        List of dictionaries with the playthrough file, the turn number, the language,
+        the player input and the symbolic world state before the input
+    """
+    turns = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+            playthrough = json.load(f)
+
+        for turn_key in sorted((k for k in playthrough if k.isdigit()), key=int):
+            turn = playthrough[turn_key]
+            if turn.get("user_input") and turn.get("previous_symbolic_world_state"):
+                turns.append({
+                    "file": filename,
+                    "turn": int(turn_key),
+                    "language": playthrough.get("language", "en"),
+                    "input": turn["user_input"],
+                    "symbolic_state": turn["previous_symbolic_world_state"],
+                })
+                if max_turns is not None and len(turns) >= max_turns:
+                    return turns
+    return turns
+
+
+def compare_turn(turn: Dict, model=None, timeout: float = 30.0, formats: List[str] = FORMATS) -> Dict[str, Dict]:
+    """Replay a recorded turn with the world state rendered in each format.
+
+    Args:
+        turn: A recorded turn (see load_recorded_turns)
+        model: The reasoning model to prompt (only the prompts are measured if None)
+        timeout: The deadline for each call to the model, in seconds
+        formats: The formats of the world state to compare
+
+    Returns:
+        Dictionary with the results of each format: the estimated tokens of the world state and of
+        the prompt and, if a model was given, the status of the answer ('ok', 'invalid' or 'error'),
+        whether the world accepted the predicted changes and the duration of the call in seconds
+    """
+    results = {}
+    # The order of the calls alternates between turns, so no format always runs with a warmer model
+    ordered_formats = formats if turn["turn"] % 2 else list(reversed(formats))
+    for format in ordered_formats:
+        world = jsonpickle.decode(turn["symbolic_state"])
+        world_state = world.render_world(language=turn["language"], input=turn["input"], format=format)
+        system_msg, user_msg = prompt_world_update(world_state, turn["input"], language=turn["language"])
+        result = {"state_tokens": estimate_tokens(world_state), "prompt_tokens": estimate_tokens(system_msg) + estimate_tokens(user_msg)}
+
+        if model is not None:
+            start = time.perf_counter()
+            result.update({"status": "ok", "accepted": False})
+            try:
+                response = model.prompt_model(system_msg=system_msg, user_msg=user_msg, timeout=timeout)
+                prediction = WorldUpdatePrediction.model_validate_json(clean_json_response(response or ''))
+                result["accepted"] = world.validate_update(prediction).ok
+            except (ValidationError, ValueError):
+                result["status"] = "invalid"
+            except Exception as e:
+                print(f"Error in turn {turn['turn']} of {turn['file']} ({format}): {e}")
+                result["status"] = "error"
+            result["duration"] = time.perf_counter() - start
+
+        results[format] = result
+    return results
+
+
+def summarize(results: List[Dict[str, Dict]], formats: List[str] = FORMATS) -> Dict[str, Dict]:
+    """Aggregate the results of the replayed turns for each format.
+
+    Returns:
+        Dictionary with, for each format, the number of turns, the mean tokens of the world states and
+        of the prompts and, if a model was prompted, the rate of valid answers, the rate of accepted
+        changes and the mean duration
+    """
+    summary = {}
+    for format in formats:
+        format_results = [result[format] for result in results]
+        summary[format] = {
+            "turns": len(format_results),
+            "mean_state_tokens": sum(r["state_tokens"] for r in format_results) / len(format_results) if format_results else None,
+            "mean_prompt_tokens": sum(r["prompt_tokens"] for r in format_results) / len(format_results) if format_results else None,
+        }
+        prompted = [r for r in format_results if "status" in r]
+        if prompted:
+            summary[format]["valid_rate"] = sum(r["status"] == "ok" for r in prompted) / len(prompted)
+            summary[format]["accepted_rate"] = sum(r["accepted"] for r in prompted) / len(prompted)
+            summary[format]["mean_duration"] = sum(r["duration"] for r in prompted) / len(prompted)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the text and JSON world states over the recorded playthroughs.")
+    parser.add_argument('--directory', default=PATH_RAW_PLAYTHROUGHS, help="Folder with the raw playthroughs")
+    parser.add_argument('--model', default=None, help="Reasoning model to prompt (only the prompts are measured if not given)")
+    parser.add_argument('--max-turns', type=int, default=None)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--output', default=None, help="JSON file to save the results of every turn")
+    args = parser.parse_args()
+
+    model = get_llm(args.model) if args.model else None
+    results, skipped = [], 0
+    for turn in load_recorded_turns(args.directory, args.max_turns):
+        try:
+            results.append(dict(compare_turn(turn, model, args.timeout), file=turn["file"], turn=turn["turn"]))
+        except Exception as e:
+            # States recorded by older versions may not be loadable anymore
+            print(f"Skipping turn {turn['turn']} of {turn['file']}: {e}")
+            skipped += 1
+
+    print(f"{len(results)} turns compared, {skipped} skipped")
+    for format, stats in summarize(results).items():
+        print(f"{format:>5}: " + ", ".join(f"{name} {value:.3f}" if isinstance(value, float) else f"{name} {value}"
+                                            for name, value in stats.items()))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"summary": summarize(results), "turns": results}, f, ensure_ascii=False, indent=2)
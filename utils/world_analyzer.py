@@ -0,0 +1,418 @@
+"""Static analysis of worlds: can the objective be completed, and in how many actions?
+
+The analysis searches an abstract state space made of the player location, the
+relevant items the player carries (keys and the item of the objective) and the
+blocked passages that were opened. Actions are moving to an adjacent location,
+taking an item (from a location or from a character in the same location),
+opening a blocked passage and leaving or giving the item of the objective.
+
+A blocked passage is opened by carrying its key item when it has one (see
+`Location.passage_keys`). Puzzles and obstacles without a key are assumed to be
+overcome in one action, as the language model decides on them during the game.
+Characters other than the player do not move.
+
+Usage:
+    python -m utils.world_analyzer data/premade_worlds/2_en.json
+"""
+
+import heapq
+import math
+import sys
+import time
+from collections import deque, OrderedDict
+from typing import Dict, Any, Optional
+
+from utils.world_serializer import load_world_from_json
+from world import World, Item, Location, ComponentKind
+
+DEFAULT_MAX_STATES = 5000
+DEFAULT_MAX_SECONDS = 2.0
+DISTANCES_CACHE_SIZE = 256
+
+
+class _Goal:
+    """What the player must achieve to complete the objective."""
+    def __init__(self, locations: 'set[Location]', item: Item = None, final_actions: int = 0, reason: str = ''):
+        self.locations = locations
+        """the locations where the objective can be completed (empty if it cannot be completed)"""
+        self.item = item
+        """an item the player must carry there, if any"""
+        self.final_actions = final_actions
+        """the number of actions needed once there (e.g. leaving or giving the item)"""
+        self.reason = reason
+        """why the objective cannot be completed, if that is the case"""
+
+
+def _item_places(world: World) -> 'dict[Item, Location | None]':
+    """Return where each item can be taken: its location, the location of the character holding it, or None for the player."""
+    places = {}
+    for location in world.locations.values():
+        for item in location.items:
+            places[item] = location
+    for character in world.characters.values():
+        for item in character.inventory:
+            places[item] = character.location
+    for item in world.player.inventory:
+        places[item] = None
+    return places
+
+
+def _build_goal(world: World) -> Optional[_Goal]:
+    """Translate the objective of the world into a goal for the search (None if there is no objective)."""
+    if world.objective is None:
+        return None
+
+    first, second = world.objective
+    player = world.player
+
+    if world.check_objective():
+        return _Goal({player.location})
+
+    if ComponentKind.CHARACTER in first.kinds and first is player:
+        if ComponentKind.LOCATION in second.kinds:
+            return _Goal({second})
+        if ComponentKind.CHARACTER in second.kinds:
+            return _Goal({second.location})
+        if ComponentKind.ITEM in second.kinds:
+            return _Goal(set(world.locations.values()), item=second)
+
+    if ComponentKind.CHARACTER in first.kinds and ComponentKind.ITEM in second.kinds:
+        # Another character has to get the item: the player gives it
+        return _Goal({first.location}, item=second, final_actions=1)
+
+    if ComponentKind.ITEM in first.kinds:
+        if ComponentKind.LOCATION in second.kinds:
+            return _Goal({second}, item=first, final_actions=1)
+        if ComponentKind.CHARACTER in second.kinds and second is player:
+            return _Goal(set(world.locations.values()), item=first)
+        if ComponentKind.CHARACTER in second.kinds:
+            return _Goal({second.location}, item=first, final_actions=1)
+
+    if ComponentKind.CHARACTER in first.kinds and ComponentKind.CHARACTER in second.kinds and second is player:
+        return _Goal({first.location})
+
+    return _Goal(set(), reason=f"the objective ({first.kind.value}, {second.kind.value}) cannot change through the player actions")
+
+
+class _Search:
+    """The abstract state space of a world, with memoized distances."""
+    def __init__(self, world: World, goal: _Goal):
+        self.world = world
+        self.goal = goal
+        self.places = _item_places(world)
+
+        # Blocked passages as (origin, destination, symmetric, key)
+        self.passages = []
+        for location in world.locations.values():
+            for name, (destination, _, symmetric) in location.blocked_locations.items():
+                self.passages.append((location, destination, symmetric, location.passage_keys.get(name)))
+
+        # Only the items that open passages or complete the objective matter
+        self.relevant_items = {key for (_, _, _, key) in self.passages if key is not None and key.gettable}
+        if goal.item is not None and goal.item.gettable:
+            self.relevant_items.add(goal.item)
+        self.relevant_items = sorted(self.relevant_items, key=lambda item: item.name)
+        self.initial_held = frozenset(item for item in world.player.inventory)
+
+        self.passages_by_key = {}
+        for index, (_, _, _, key) in enumerate(self.passages):
+            if key is not None:
+                self.passages_by_key.setdefault(key, []).append(index)
+
+        # Memoized distances, bounded since each entry has one value per reachable location
+        self.distances = OrderedDict()
+
+        # Distances with every passage open, which never overestimate the real ones
+        self.distances_to_goal = self._optimistic_distances_to(goal.locations)
+        item_place = self.places.get(goal.item) if goal.item is not None else None
+        self.distances_to_item = self._optimistic_distances_to({item_place}) if item_place is not None else {}
+
+    def _optimistic_distances_to(self, targets: 'set[Location]') -> 'dict[Location, int]':
+        """Return the number of moves from every location to the closest target, as if no passage was blocked."""
+        reversed_adjacency = {}
+        for location in self.world.locations.values():
+            for neighbor in location.connecting_locations:
+                reversed_adjacency.setdefault(neighbor, []).append(location)
+        for origin, destination, symmetric, _ in self.passages:
+            reversed_adjacency.setdefault(destination, []).append(origin)
+            if symmetric:
+                reversed_adjacency.setdefault(origin, []).append(destination)
+
+        distances = {target: 0 for target in targets}
+        queue = deque(targets)
+        while queue:
+            current = queue.popleft()
+            for neighbor in reversed_adjacency.get(current, []):
+                if neighbor not in distances:
+                    distances[neighbor] = distances[current] + 1
+                    queue.append(neighbor)
+        return distances
+
+    def heuristic(self, location: Location, held: frozenset) -> Optional[int]:
+        """Return a lower bound of the actions left to complete the objective (None if it cannot be completed)."""
+        if self.goal.item is not None and self.goal.item not in held:
+            place = self.places.get(self.goal.item)
+            if location not in self.distances_to_item or place not in self.distances_to_goal:
+                return None
+            return self.distances_to_item[location] + 1 + self.distances_to_goal[place] + self.goal.final_actions
+        if location not in self.distances_to_goal:
+            return None
+        return self.distances_to_goal[location] + self.goal.final_actions
+
+    def distances_from(self, source: Location, opened: frozenset) -> 'dict[Location, int]':
+        """Return the number of moves from source to every reachable location, given the opened passages."""
+        memo_key = (source, opened)
+        if memo_key in self.distances:
+            self.distances.move_to_end(memo_key)
+        else:
+            extra = {}
+            for index in opened:
+                origin, destination, symmetric, _ = self.passages[index]
+                extra.setdefault(origin, []).append(destination)
+                if symmetric:
+                    extra.setdefault(destination, []).append(origin)
+
+            distances = {source: 0}
+            queue = deque([source])
+            while queue:
+                current = queue.popleft()
+                for neighbor in current.connecting_locations + extra.get(current, []):
+                    if neighbor not in distances:
+                        distances[neighbor] = distances[current] + 1
+                        queue.append(neighbor)
+            self.distances[memo_key] = distances
+            if len(self.distances) > DISTANCES_CACHE_SIZE:
+                self.distances.popitem(last=False)
+        return self.distances[memo_key]
+
+    def successors(self, location: Location, held: frozenset, opened: frozenset, new_areas_only: bool = False):
+        """Yield (cost, location, held, opened) for the macro actions from a state.
+
+        Opening a passage to a location that is already reachable can still make a
+        path shorter, so every relevant item and every passage are considered. With
+        new_areas_only, taking an item is only considered if it is the item of the
+        objective or opens a passage to a location not reachable yet, and opening a
+        passage only if it leads to such a location (used by the greedy plan).
+        """
+        distances = self.distances_from(location, opened)
+
+        for item in self.relevant_items:
+            if item in held:
+                continue
+            place = self.places.get(item)
+            if place is None or place not in distances:
+                continue
+            if new_areas_only and item is not self.goal.item and not any(
+                    index not in opened and self.passages[index][1] not in distances
+                    for index in self.passages_by_key.get(item, [])):
+                continue
+            yield distances[place] + 1, place, held | {item}, opened
+
+        for index, (origin, destination, _, key) in enumerate(self.passages):
+            if index in opened or origin not in distances or (new_areas_only and destination in distances):
+                continue
+            if key is not None and key not in held:
+                continue
+            yield distances[origin] + 1, origin, held, opened | {index}
+
+    def goal_cost(self, location: Location, held: frozenset, opened: frozenset) -> Optional[int]:
+        """Return the number of actions to complete the objective from a state, or None if not possible yet."""
+        if self.goal.item is not None and self.goal.item not in held:
+            return None
+        distances = self.distances_from(location, opened)
+        reachable = [distances[target] for target in self.goal.locations if target in distances]
+        if not reachable:
+            return None
+        return min(reachable) + self.goal.final_actions
+
+
+def _is_solvable(search: _Search, start: Location) -> bool:
+    """Check if the objective might be completed, growing the reachable area until it stops changing.
+
+    Keys are never consumed and opened passages stay open, so taking every reachable
+    item and opening every reachable passage, in linear time on the size of the world,
+    finds everything the player could get. It is a necessary condition only: a one-way
+    passage can leave the player unable to come back, which the exact search detects.
+    """
+    held = set(search.initial_held)
+    opened = set()
+    reachable = {start}
+    queue = deque([start])
+    extra = {}
+    waiting_items = {}
+    for item in search.relevant_items:
+        if item not in held and search.places.get(item) is not None:
+            waiting_items.setdefault(search.places[item], []).append(item)
+    passages_from = {}
+    for index, (origin, _, _, _) in enumerate(search.passages):
+        passages_from.setdefault(origin, []).append(index)
+    locked = {}
+
+    def open_passage(index):
+        origin, destination, symmetric, _ = search.passages[index]
+        opened.add(index)
+        extra.setdefault(origin, []).append(destination)
+        if symmetric:
+            extra.setdefault(destination, []).append(origin)
+        if destination not in reachable:
+            reachable.add(destination)
+            queue.append(destination)
+
+    while queue:
+        current = queue.popleft()
+        for item in waiting_items.pop(current, []):
+            held.add(item)
+            for index in locked.pop(item, []):
+                open_passage(index)
+        for index in passages_from.get(current, []):
+            key = search.passages[index][3]
+            if key is None or key in held:
+                open_passage(index)
+            elif key.gettable:
+                locked.setdefault(key, []).append(index)
+        for neighbor in current.connecting_locations + extra.get(current, []):
+            if neighbor not in reachable:
+                reachable.add(neighbor)
+                queue.append(neighbor)
+
+    if search.goal.item is not None and search.goal.item not in held:
+        return False
+    return any(target in reachable for target in search.goal.locations)
+
+
+def _search_min_actions(search: _Search, start: Location, max_states: int, deadline: float, upper_bound: float) -> 'tuple[Optional[int], int, bool]':
+    """A* search for the minimum number of actions, with memoized state hashing.
+
+    The heuristic is the number of actions left if every passage was open, so it
+    never overestimates and the first completed objective taken from the queue is optimal.
+    States that cannot improve the upper bound (from a known plan, or math.inf) are discarded.
+
+    Returns (min_actions, states_explored, exhausted), where exhausted is False
+    if the search stopped because it reached max_states or the deadline (a time.perf_counter() value).
+    """
+    initial = (start, search.initial_held, frozenset())
+    best = {initial: 0}
+    counter = 0
+    queue = [(search.heuristic(start, search.initial_held) or 0, counter, False, 0, initial)]
+    explored = 0
+
+    while queue:
+        estimate, _, is_goal, cost, state = heapq.heappop(queue)
+        if is_goal:
+            return cost, explored, True
+        if estimate >= upper_bound:
+            return _finite(upper_bound), explored, True
+        if cost > best.get(state, cost):
+            continue
+        explored += 1
+        if explored > max_states or time.perf_counter() > deadline:
+            return None, explored, False
+
+        finish = search.goal_cost(*state)
+        if finish is not None:
+            counter += 1
+            heapq.heappush(queue, (cost + finish, counter, True, cost + finish, state))
+
+        for step_cost, location, held, opened in search.successors(*state):
+            next_state = (location, held, opened)
+            next_cost = cost + step_cost
+            estimate = search.heuristic(location, held)
+            if estimate is not None and next_cost + estimate <= upper_bound and next_cost < best.get(next_state, next_cost + 1):
+                best[next_state] = next_cost
+                counter += 1
+                heapq.heappush(queue, (next_cost + estimate, counter, False, next_cost, next_state))
+
+    return _finite(upper_bound), explored, True
+
+
+def _finite(bound: float) -> Optional[int]:
+    """Return an upper bound as a number of actions, or None if there is no known plan."""
+    return None if bound == math.inf else bound
+
+
+def _greedy_actions(search: _Search, start: Location, deadline: float) -> Optional[int]:
+    """Complete the objective always taking the useful action that gets closest to it (an upper bound of the minimum).
+
+    Returns None if no plan was found before the deadline (a time.perf_counter() value).
+    """
+    state, total = (start, search.initial_held, frozenset()), 0
+    while time.perf_counter() <= deadline:
+        finish = search.goal_cost(*state)
+        if finish is not None:
+            return total + finish
+        options = []
+        for step_cost, location, held, opened in search.successors(*state, new_areas_only=True):
+            estimate = search.heuristic(location, held)
+            # A key is as promising as the passages it opens
+            for item in held - state[1]:
+                for index in search.passages_by_key.get(item, []):
+                    origin_estimate = search.heuristic(search.passages[index][0], held)
+                    if origin_estimate is not None and (estimate is None or origin_estimate < estimate):
+                        estimate = origin_estimate
+            if estimate is not None:
+                options.append((estimate, step_cost, location, held, opened))
+        if not options:
+            return None
+        _, step_cost, location, held, opened = min(options, key=lambda option: option[:2])
+        state, total = (location, held, opened), total + step_cost
+    return None
+
+
+def analyze_world(world: World, max_states: int = DEFAULT_MAX_STATES, max_seconds: float = DEFAULT_MAX_SECONDS) -> Dict[str, Any]:
+    """Check if the objective of a world can be completed and the minimum number of actions.
+
+    Args:
+        world: The world to analyze (it is not modified)
+        max_states: Maximum number of abstract states explored in the exact search
+        max_seconds: Maximum time for the greedy plan and the exact search (the solvability check is always complete)
+
+    Returns:
+        Dictionary with:
+            - solvable: True if the objective can be completed (also True if there is no objective, and
+              if exact is False and min_actions is None, as only a necessary condition was checked)
+            - min_actions: Minimum number of actions, or an upper bound if exact is False (None if not solvable,
+              or if a search limit was reached before any plan was found)
+            - exact: False if a search limit was reached and min_actions comes from a greedy plan
+            - states_explored: Number of abstract states explored
+            - reason: Explanation when the objective cannot be completed
+    """
+    goal = _build_goal(world)
+    if goal is None:
+        return {"solvable": True, "min_actions": 0, "exact": True, "states_explored": 0, "reason": "The world has no objective"}
+    if not goal.locations:
+        return {"solvable": False, "min_actions": None, "exact": True, "states_explored": 0, "reason": goal.reason}
+    if goal.item is not None and not goal.item.gettable and goal.item not in world.player.inventory:
+        return {"solvable": False, "min_actions": None, "exact": True, "states_explored": 0,
+                "reason": f"the item '{goal.item.name}' cannot be taken"}
+
+    search = _Search(world, goal)
+    start = world.player.location
+
+    if not _is_solvable(search, start):
+        return {"solvable": False, "min_actions": None, "exact": True, "states_explored": 0,
+                "reason": "the objective cannot be reached from the starting state"}
+
+    deadline = time.perf_counter() + max_seconds
+    upper_bound = _greedy_actions(search, start, deadline)
+    if upper_bound is None:
+        upper_bound = math.inf
+    min_actions, explored, exhausted = _search_min_actions(search, start, max_states, deadline, upper_bound)
+    if not exhausted:
+        return {"solvable": True, "min_actions": _finite(upper_bound), "exact": False, "states_explored": explored, "reason": ""}
+    if min_actions is None:
+        return {"solvable": False, "min_actions": None, "exact": True, "states_explored": explored,
+                "reason": "the objective cannot be reached from the starting state without getting stuck"}
+    return {"solvable": True, "min_actions": min_actions, "exact": True, "states_explored": explored, "reason": ""}
+
+
+if __name__ == "__main__":
+    for world_path in sys.argv[1:]:
+        result = analyze_world(load_world_from_json(world_path))
+        if result["solvable"]:
+            if result["min_actions"] is None:
+                print(f"{world_path}: solvable, no plan found within the limits, {result['states_explored']} states explored")
+                continue
+            bound = "" if result["exact"] else " (upper bound)"
+            print(f"{world_path}: solvable in {result['min_actions']} actions{bound}, {result['states_explored']} states explored")
+        else:
+            print(f"{world_path}: NOT solvable, {result['reason']}")
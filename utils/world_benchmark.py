@@ -0,0 +1,180 @@
+"""Benchmarks the world operations against the size of the world.
+
+Synthetic worlds are built with `utils.world_generator` and the time of the
+main operations of the pipeline is measured for each size, so the linear
+scans in `world.py` and `world_serializer.py` become visible.
+
+Usage:
+    python -m utils.world_benchmark --sizes 10 100 1000 10000 --topology grid
+    python -m utils.world_benchmark --dispatch
+    python -m utils.world_benchmark --render --sizes 10 1000
+"""
+
+import argparse
+import math
+import time
+from typing import Callable, Dict, List
+
+from utils.world_generator import generate_world_dict, TOPOLOGIES
+from utils.world_serializer import dict_to_world, world_to_dict
+from world import Character, Item, Location, OBJECTIVE_TYPES, RENDER_PHRASES, lookup_kind
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+BAR_WIDTH = 40
+
+
+def _time_call(function: Callable, repetitions: int) -> float:
+    """Return the mean time (in seconds) of calling function."""
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        function()
+    return (time.perf_counter() - start) / repetitions
+
+
+def benchmark_world_size(num_locations: int, topology: str = 'grid', repetitions: int = 5, seed: int = 0) -> Dict[str, float]:
+    """Measure the main world operations on a generated world of the given size.
+
+    Items and characters grow proportionally to the number of locations.
+
+    Args:
+        num_locations: Number of locations of the generated world
+        topology: Shape of the location graph
+        repetitions: Number of times each operation is repeated
+        seed: Seed for the world generator
+
+    Returns:
+        Dictionary with the mean time in seconds of each operation
+    """
+    world_dict = generate_world_dict(num_locations=num_locations,
+                                     num_items=num_locations,
+                                     num_characters=max(1, num_locations // 10),
+                                     num_blocked_passages=max(1, num_locations // 20),
+                                     num_puzzles=max(1, num_locations // 20),
+                                     topology=topology,
+                                     seed=seed)
+    world = dict_to_world(world_dict)
+
+    # The item stored in the last location is the worst case for the holder lookup
+    last_location = next((location for location in reversed(list(world.locations.values())) if location.items), None)
+    moved_item = last_location.items[-1] if last_location else None
+
+    def move_item_back_and_forth():
+        world._process_moved_object(moved_item.name, 'Inventory')
+        world._process_moved_object(moved_item.name, last_location.name)
+
+    results = {
+        'dict_to_world': _time_call(lambda: dict_to_world(world_dict), repetitions),
+        'render_world': _time_call(lambda: world.render_world(), repetitions),
+        'world_to_dict': _time_call(lambda: world_to_dict(world), repetitions),
+    }
+    if moved_item is not None:
+        results['_process_moved_object'] = _time_call(move_item_back_and_forth, repetitions) / 2
+
+    return results
+
+
+def benchmark_render(num_locations: int, repetitions: int = 200, seed: int = 0) -> Dict[str, float]:
+    """Measure render_world in each registered language, with and without the details of the components.
+
+    The player is placed in the location with the most items, so the scene is as rich as possible.
+
+    Returns:
+        Dictionary with the mean time in seconds of each rendering
+    """
+    world = dict_to_world(generate_world_dict(num_locations=num_locations,
+                                              num_items=num_locations * 2,
+                                              num_characters=max(1, num_locations // 10),
+                                              seed=seed))
+    world.player.location = max(world.locations.values(), key=lambda location: len(location.items))
+
+    results = {}
+    for language in RENDER_PHRASES:
+        results[f'{language} details'] = _time_call(lambda: world.render_world(language=language), repetitions)
+        results[f'{language} summary'] = _time_call(lambda: world.render_world(language=language, detail_components=False), repetitions)
+    return results
+
+
+def benchmark_dispatch(repetitions: int = 100000) -> Dict[str, float]:
+    """Compare dispatching on the class name of the components with dispatching on their kind.
+
+    The dispatch chooses what to do for each combination of components of an objective,
+    as done when setting and describing objectives and when serializing them.
+
+    Returns:
+        Dictionary with the mean time in seconds of dispatching on all the combinations
+    """
+    location = Location('location', [''])
+    item = Item('item', [''])
+    character = Character('character', [''], location)
+    pairs = [(character, character), (character, location), (character, item), (item, character), (item, location)]
+    builders = [OBJECTIVE_TYPES[first.kind, second.kind] for first, second in pairs]
+
+    def dispatch_on_class_name():
+        for first, second in pairs:
+            first_class, second_class = first.__class__.__name__, second.__class__.__name__
+            build = None
+            if first_class == "Character":
+                if second_class == "Character":
+                    build = builders[0]
+                elif second_class == "Location":
+                    build = builders[1]
+                elif second_class == "Item":
+                    build = builders[2]
+            elif first_class == "Item":
+                if second_class == "Location":
+                    build = builders[4]
+                elif second_class == "Character":
+                    build = builders[3]
+
+    def dispatch_on_kind():
+        for first, second in pairs:
+            build = lookup_kind(OBJECTIVE_TYPES, first, second)
+
+    return {
+        'class name': _time_call(dispatch_on_class_name, repetitions),
+        'kind table': _time_call(dispatch_on_kind, repetitions),
+    }
+
+
+def print_chart(sizes: List[int], results: List[Dict[str, float]]) -> None:
+    """Print a table and a logarithmic bar chart of the results."""
+    operations = list(results[0].keys())
+
+    print(f"{'locations':>10} " + " ".join(f"{op:>22}" for op in operations))
+    for size, result in zip(sizes, results):
+        print(f"{size:>10} " + " ".join(f"{result.get(op, float('nan')) * 1000:>19.3f} ms" for op in operations))
+
+    all_times = [t for result in results for t in result.values() if t > 0]
+    if not all_times:
+        return
+    low, high = math.log10(min(all_times)), math.log10(max(all_times))
+    span = (high - low) or 1.0
+
+    for op in operations:
+        print(f"\n{op} (log scale)")
+        for size, result in zip(sizes, results):
+            elapsed = result.get(op, 0)
+            length = 1 + int((math.log10(elapsed) - low) / span * (BAR_WIDTH - 1)) if elapsed > 0 else 0
+            print(f"{size:>10} {'#' * length} {elapsed * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark world operations against the size of the world.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='grid')
+    parser.add_argument('--repetitions', type=int, default=5)
+    parser.add_argument('--dispatch', action='store_true', help="Benchmark the dispatch on the kind of the components instead")
+    parser.add_argument('--render', action='store_true', help="Benchmark the rendering of the world in each language instead")
+    args = parser.parse_args()
+
+    if args.render:
+        print_chart(args.sizes, [benchmark_render(size) for size in args.sizes])
+        raise SystemExit
+
+    if args.dispatch:
+        for name, elapsed in benchmark_dispatch().items():
+            print(f"{name:>12} {elapsed * 1e9:.0f} ns")
+        raise SystemExit
+
+    all_results = [benchmark_world_size(size, topology=args.topology, repetitions=args.repetitions) for size in args.sizes]
+    print_chart(args.sizes, all_results)
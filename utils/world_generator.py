@@ -0,0 +1,280 @@
+"""Generates synthetic worlds of arbitrary size for scaling tests.
+
+The premade worlds only have a handful of locations, so this module builds
+dictionaries in the `world_serializer` format with a configurable number of
+locations, items, characters, blocked passages and puzzles, connected with a
+grid, tree or random graph topology. The output can be saved to disk and loaded
+back with `load_world_from_json`.
+
+Usage:
+    python -m utils.world_generator --locations 1000 --topology grid -o data/generated/1000_en.json
+"""
+
+import argparse
+import json
+import os
+import random
+from collections import deque
+from typing import Dict, Any, List, Set, Tuple
+
+TOPOLOGIES = ('grid', 'tree', 'random')
+
+NAMES = {
+    'en': {'location': 'Room', 'item': 'Object', 'character': 'Character', 'player': 'Traveler',
+           'door': 'Locked door', 'key': 'Key', 'puzzle': 'Riddle'},
+    'es': {'location': 'Sala', 'item': 'Objeto', 'character': 'Personaje', 'player': 'Viajero',
+           'door': 'Puerta cerrada', 'key': 'Llave', 'puzzle': 'Acertijo'},
+}
+
+DESCRIPTIONS = {
+    'en': {'numbered': '{} number {}', 'player': '{} exploring a generated world',
+           'door': 'It blocks the way to {}', 'key': 'It opens the {}', 'puzzle': 'A riddle guarding the way to {}',
+           'problem': 'What is {} plus {}?'},
+    'es': {'numbered': '{} número {}', 'player': '{} explorando un mundo generado',
+           'door': 'Bloquea el camino a {}', 'key': 'Abre la {}', 'puzzle': 'Un acertijo que custodia el camino a {}',
+           'problem': '¿Cuánto es {} más {}?'},
+}
+
+
+def _build_edges(num_locations: int, topology: str, rng: random.Random) -> List[Tuple[int, int]]:
+    """Build the undirected edges between locations for the given topology.
+
+    Every topology produces a connected graph, so all locations are reachable
+    from any starting location when no passage is blocked.
+    """
+    edges = []
+
+    if topology == 'grid':
+        width = max(1, int(num_locations ** 0.5))
+        for i in range(num_locations):
+            if (i + 1) % width != 0 and i + 1 < num_locations:
+                edges.append((i, i + 1))
+            if i + width < num_locations:
+                edges.append((i, i + width))
+
+    elif topology == 'tree':
+        for i in range(1, num_locations):
+            edges.append((rng.randrange(i), i))
+
+    elif topology == 'random':
+        # A random spanning tree guarantees connectivity, extra edges add cycles
+        for i in range(1, num_locations):
+            edges.append((rng.randrange(i), i))
+        existing = set(edges)
+        for _ in range(num_locations // 2):
+            a, b = rng.randrange(num_locations), rng.randrange(num_locations)
+            if a != b and (a, b) not in existing and (b, a) not in existing:
+                existing.add((a, b))
+                edges.append((a, b))
+
+    else:
+        raise ValueError(f"Unknown topology: {topology}. Valid options are {', '.join(TOPOLOGIES)}")
+
+    return edges
+
+
+def _distances_from(start: int, adjacency: 'list[Set[int]]') -> 'list[int]':
+    """Return the BFS distance from start to every location (-1 if unreachable)."""
+    distances = [-1] * len(adjacency)
+    distances[start] = 0
+    queue = deque([start])
+    while queue:
+        current = queue.popleft()
+        for neighbor in adjacency[current]:
+            if distances[neighbor] == -1:
+                distances[neighbor] = distances[current] + 1
+                queue.append(neighbor)
+    return distances
+
+
+def generate_world_dict(num_locations: int = 100,
+                        num_items: int = 100,
+                        num_characters: int = 10,
+                        num_blocked_passages: int = 5,
+                        num_puzzles: int = 5,
+                        topology: str = 'grid',
+                        language: str = 'en',
+                        seed: int = None) -> Dict[str, Any]:
+    """Generate a world dictionary in the `world_serializer` format.
+
+    Args:
+        num_locations: Number of locations in the world
+        num_items: Number of regular items, spread over locations and character inventories
+        num_characters: Number of non-player characters
+        num_blocked_passages: Number of passages blocked by an item (each one adds an obstacle and a key item)
+        num_puzzles: Number of passages blocked by a puzzle
+        topology: Shape of the location graph ('grid', 'tree' or 'random')
+        language: Language used for the component names and descriptions ('en' or 'es')
+        seed: Seed for the random generator, for reproducible worlds
+
+    Returns:
+        Dictionary that can be saved as JSON and loaded with `load_world_from_json`.
+        The keys needed to open blocked passages are always placed where the
+        player can reach them, so the objective can be completed.
+    """
+    if num_locations < 1:
+        raise ValueError("A world needs at least one location")
+
+    rng = random.Random(seed)
+    names = NAMES.get(language, NAMES['en'])
+    descriptions = DESCRIPTIONS.get(language, DESCRIPTIONS['en'])
+    edges = _build_edges(num_locations, topology, rng)
+
+    adjacency = [set() for _ in range(num_locations)]
+    for a, b in edges:
+        adjacency[a].add(b)
+        adjacency[b].add(a)
+
+    start = 0
+
+    # Choose the blocked passages (they are oriented when they are opened, see below)
+    num_blocked_total = min(num_blocked_passages + num_puzzles, len(edges))
+    blocked_edges = rng.sample(edges, num_blocked_total)
+    rng.shuffle(blocked_edges)
+    puzzle_edges = set(blocked_edges[:min(num_puzzles, num_blocked_total)])
+
+    open_adjacency = [set(neighbors) for neighbors in adjacency]
+    for a, b in blocked_edges:
+        open_adjacency[a].discard(b)
+        open_adjacency[b].discard(a)
+
+    locations = [{
+        "id": f"loc_{i}",
+        "name": f"{names['location']} {i}",
+        "descriptions": [descriptions['numbered'].format(names['location'], i)],
+        "connecting_locations": [],
+        "blocked_locations": {},
+        "items": []
+    } for i in range(num_locations)]
+
+    for i, neighbors in enumerate(open_adjacency):
+        locations[i]["connecting_locations"] = [f"loc_{n}" for n in sorted(neighbors)]
+
+    items = []
+    characters = [{
+        "id": f"char_{i + 1}",
+        "name": f"{names['character']} {i + 1}",
+        "descriptions": [descriptions['numbered'].format(names['character'], i + 1)],
+        "location": f"loc_{rng.randrange(num_locations)}",
+        "inventory": []
+    } for i in range(num_characters)]
+
+    def new_item(name: str, description: str, gettable: bool = True) -> str:
+        item_id = f"item_{len(items)}"
+        items.append({"id": item_id, "name": name, "descriptions": [description], "gettable": gettable})
+        return item_id
+
+    # Open the blocked passages in the order the player can reach them, from the reachable side,
+    # placing each key in a location that is already reachable at that point. The location graph
+    # is connected, so while a location is not reachable, a pending passage leads to it from the
+    # reachable area.
+    reachable = set()
+    frontier = deque([start])
+    reachable.add(start)
+    pending = list(blocked_edges)
+
+    def expand():
+        while frontier:
+            current = frontier.popleft()
+            for neighbor in open_adjacency[current]:
+                if neighbor not in reachable:
+                    reachable.add(neighbor)
+                    frontier.append(neighbor)
+
+    expand()
+    reachable_order = sorted(reachable)
+    while pending:
+        opened = pending.pop(next(index for index, (a, b) in enumerate(pending) if a in reachable or b in reachable))
+        a, b = opened if opened[0] in reachable else opened[::-1]
+
+        if opened in puzzle_edges:
+            obstacle = {
+                "type": "Puzzle",
+                "name": f"{names['puzzle']} {a}-{b}",
+                "descriptions": [descriptions['puzzle'].format(locations[b]['name'])],
+                "problem": descriptions['problem'].format(a, b),
+                "answer": str(a + b)
+            }
+        else:
+            door_name = f"{names['door']} {a}-{b}"
+            door_id = new_item(door_name, descriptions['door'].format(locations[b]['name']), gettable=False)
+            key_id = new_item(f"{names['key']} {a}-{b}", descriptions['key'].format(door_name.lower()))
+            locations[rng.choice(reachable_order)]["items"].append(key_id)
+            obstacle = {"type": "Item", "id": door_id}
+
+        locations[a]["blocked_locations"][f"loc_{b}"] = {"obstacle": obstacle, "symmetric": True}
+        if obstacle["type"] == "Item":
+            locations[a]["blocked_locations"][f"loc_{b}"]["key"] = key_id
+
+        if b not in reachable:
+            reachable.add(b)
+            frontier.append(b)
+            expand()
+            reachable_order = sorted(reachable)
+
+    # Regular items, spread over locations and character inventories
+    for i in range(num_items):
+        item_id = new_item(f"{names['item']} {i}", descriptions['numbered'].format(names['item'], i), gettable=rng.random() > 0.1)
+        if characters and rng.random() < 0.2:
+            rng.choice(characters)["inventory"].append(item_id)
+        else:
+            locations[rng.randrange(num_locations)]["items"].append(item_id)
+
+    # The objective is to reach the farthest location the player can get to
+    final_adjacency = [set(neighbors) for neighbors in open_adjacency]
+    for a, b in blocked_edges:
+        final_adjacency[a].add(b)
+        final_adjacency[b].add(a)
+    final_distances = _distances_from(start, final_adjacency)
+    target = max(range(num_locations), key=lambda i: final_distances[i])
+
+    return {
+        "locations": locations,
+        "items": items,
+        "characters": characters,
+        "player": {
+            "id": "char_0",
+            "name": names['player'],
+            "descriptions": [descriptions['player'].format(names['player'])],
+            "location": f"loc_{start}",
+            "inventory": []
+        },
+        "objective": {
+            "first": {"type": "Character", "id": "char_0"},
+            "second": {"type": "Location", "id": f"loc_{target}"}
+        }
+    }
+
+
+def save_generated_world(world_dict: Dict[str, Any], filepath: str) -> None:
+    """Save a generated world dictionary to a JSON file."""
+    directory = os.path.dirname(filepath)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(world_dict, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic world in the world_serializer JSON format.")
+    parser.add_argument('--locations', type=int, default=100)
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--characters', type=int, default=10)
+    parser.add_argument('--blocked', type=int, default=5, help="Passages blocked by an item")
+    parser.add_argument('--puzzles', type=int, default=5, help="Passages blocked by a puzzle")
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='grid')
+    parser.add_argument('--language', choices=['en', 'es'], default='en')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('-o', '--output', required=True, help="Path of the JSON file to write")
+    args = parser.parse_args()
+
+    generated = generate_world_dict(num_locations=args.locations,
+                                    num_items=args.items,
+                                    num_characters=args.characters,
+                                    num_blocked_passages=args.blocked,
+                                    num_puzzles=args.puzzles,
+                                    topology=args.topology,
+                                    language=args.language,
+                                    seed=args.seed)
+    save_generated_world(generated, args.output)
+    print(f"{args.output} ...done ({len(generated['locations'])} locations, {len(generated['items'])} items)")
@@ -3,54 +3,37 @@
 import json
 import os
 from typing import Dict, Any
-from world import World, Character, Item, Location, Puzzle, Component
+from world import World, Character, Item, Location, Puzzle, Component, ComponentKind
 
 
 def world_to_dict(world: World) -> Dict[str, Any]:
     """Convert a World object to a dictionary suitable for JSON serialization."""
     
-    # Collect all items from everywhere (world dict, locations, character inventories)
-    all_items_set = set(world.items.values())
-    for location in world.locations.values():
-        all_items_set.update(location.items)
-    for character in world.characters.values():
-        all_items_set.update(character.inventory)
-    all_items_set.update(world.player.inventory)
-    
-    # Also collect items that might be obstacles in locked locations
-    for location in world.locations.values():
-        for blocked_loc, obstacle, _ in location.blocked_locations.values():
-            if isinstance(obstacle, Item):
-                all_items_set.add(obstacle)
-    
-    # Sort items by name for consistent ordering
-    all_items = sorted(all_items_set, key=lambda x: x.name)
-    
-    # Build ID mappings
-    location_id_map = {loc: f"loc_{i}" for i, loc in enumerate(world.locations.values())}
-    item_id_map = {item: f"item_{i}" for i, item in enumerate(all_items)}
-    # Include player + all NPCs in character ID map
-    all_characters = [world.player] + [char for char in world.characters.values()]
-    character_id_map = {char: f"char_{i}" for i, char in enumerate(all_characters)}
+    # The IDs of the locations, items and characters (see World.component_ids)
+    ids = world.component_ids()
+    all_items = [component for component in ids if ComponentKind.ITEM in component.kinds]
     
     # Serialize locations
     locations_data = []
     for location_name, location in world.locations.items():
-        connecting_location_ids = [location_id_map[loc] for loc in location.connecting_locations]
+        connecting_location_ids = [ids[loc] for loc in location.connecting_locations]
         
         blocked_locations_data = {}
         for blocked_name, (blocked_loc, obstacle, symmetric) in location.blocked_locations.items():
-            blocked_location_id = location_id_map[blocked_loc]
-            obstacle_data = _serialize_component(obstacle, location_id_map, item_id_map, character_id_map)
+            blocked_location_id = ids[blocked_loc]
+            obstacle_data = _serialize_component(obstacle, ids)
             blocked_locations_data[blocked_location_id] = {
                 "obstacle": obstacle_data,
                 "symmetric": symmetric
             }
+            key = location.passage_keys.get(blocked_name)
+            if key is not None:
+                blocked_locations_data[blocked_location_id]["key"] = ids[key]
         
-        items_ids = [item_id_map[item] for item in location.items]
+        items_ids = [ids[item] for item in location.items]
         
         location_dict = {
-            "id": location_id_map[location],
+            "id": ids[location],
             "name": location.name,
             "descriptions": location.descriptions,
             "connecting_locations": connecting_location_ids,
@@ -63,7 +46,7 @@ def world_to_dict(world: World) -> Dict[str, Any]:
     items_data = []
     for item in all_items:
         item_dict = {
-            "id": item_id_map[item],
+            "id": ids[item],
             "name": item.name,
             "descriptions": item.descriptions,
             "gettable": item.gettable
@@ -73,23 +56,23 @@ def world_to_dict(world: World) -> Dict[str, Any]:
     # Serialize characters
     characters_data = []
     for char_name, character in world.characters.items():
-        inventory_ids = [item_id_map[item] for item in character.inventory]
+        inventory_ids = [ids[item] for item in character.inventory]
         character_dict = {
-            "id": character_id_map[character],
+            "id": ids[character],
             "name": character.name,
             "descriptions": character.descriptions,
-            "location": location_id_map[character.location],
+            "location": ids[character.location],
             "inventory": inventory_ids
         }
         characters_data.append(character_dict)
     
     # Serialize player
-    player_inventory_ids = [item_id_map[item] for item in world.player.inventory]
+    player_inventory_ids = [ids[item] for item in world.player.inventory]
     player_dict = {
-        "id": character_id_map[world.player],
+        "id": ids[world.player],
         "name": world.player.name,
         "descriptions": world.player.descriptions,
-        "location": location_id_map[world.player.location],
+        "location": ids[world.player.location],
         "inventory": player_inventory_ids
     }
     
@@ -97,28 +80,9 @@ def world_to_dict(world: World) -> Dict[str, Any]:
     objective_data = None
     if world.objective:
         obj_first, obj_second = world.objective
-        first_type = obj_first.__class__.__name__
-        second_type = obj_second.__class__.__name__
-        
-        first_id = None
-        if first_type == "Location":
-            first_id = location_id_map[obj_first]
-        elif first_type == "Item":
-            first_id = item_id_map[obj_first]
-        elif first_type == "Character":
-            first_id = character_id_map[obj_first]
-        
-        second_id = None
-        if second_type == "Location":
-            second_id = location_id_map[obj_second]
-        elif second_type == "Item":
-            second_id = item_id_map[obj_second]
-        elif second_type == "Character":
-            second_id = character_id_map[obj_second]
-        
         objective_data = {
-            "first": {"type": first_type, "id": first_id},
-            "second": {"type": second_type, "id": second_id}
+            "first": {"type": obj_first.kind.value, "id": ids.get(obj_first)},
+            "second": {"type": obj_second.kind.value, "id": ids.get(obj_second)}
         }
     
     return {
@@ -184,8 +148,11 @@ def dict_to_world(data: Dict[str, Any]) -> World:
             # Reconstruct obstacle
             obstacle = _deserialize_component(obstacle_data, location_map, item_map, character_map)
             
+            # Optional item needed to overcome the obstacle
+            key = item_map[blocked_data["key"]] if blocked_data.get("key") else None
+            
             # Block the passage
-            location.block_passage(blocked_location, obstacle, symmetric=symmetric)
+            location.block_passage(blocked_location, obstacle, symmetric=symmetric, key=key)
     
     # First pass: Create all characters without setting inventory
     for char_data in data["characters"]:
@@ -235,60 +202,47 @@ def dict_to_world(data: Dict[str, Any]) -> World:
     # Set objective if it exists
     if data.get("objective"):
         obj_data = data["objective"]
-        first_type = obj_data["first"]["type"]
-        first_id = obj_data["first"]["id"]
-        second_type = obj_data["second"]["type"]
-        second_id = obj_data["second"]["id"]
-        
-        first_obj = None
-        if first_type == "Location":
-            first_obj = location_map[first_id]
-        elif first_type == "Item":
-            first_obj = item_map[first_id]
-        elif first_type == "Character":
-            first_obj = character_map[first_id]
+        component_maps = {
+            ComponentKind.LOCATION.value: location_map,
+            ComponentKind.ITEM.value: item_map,
+            ComponentKind.CHARACTER.value: character_map
+        }
         
-        second_obj = None
-        if second_type == "Location":
-            second_obj = location_map[second_id]
-        elif second_type == "Item":
-            second_obj = item_map[second_id]
-        elif second_type == "Character":
-            second_obj = character_map[second_id]
+        first_type, second_type = obj_data["first"]["type"], obj_data["second"]["type"]
+        first_obj = component_maps[first_type][obj_data["first"]["id"]] if first_type in component_maps else None
+        second_obj = component_maps[second_type][obj_data["second"]["id"]] if second_type in component_maps else None
         
         world.set_objective(first_obj, second_obj)
     
     return world
 
 
-def _serialize_component(component: Component, location_map, item_map, character_map) -> Dict[str, Any]:
+def _serialize_component(component: Component, ids) -> Dict[str, Any]:
     """Serialize a component (Item or Puzzle) to a dictionary."""
-    comp_type = component.__class__.__name__
-    
-    if comp_type == "Item":
+    if ComponentKind.ITEM in component.kinds:
         return {
-            "type": "Item",
-            "id": item_map[component]
+            "type": ComponentKind.ITEM.value,
+            "id": ids[component]
         }
-    elif comp_type == "Puzzle":
+    elif ComponentKind.PUZZLE in component.kinds:
         return {
-            "type": "Puzzle",
+            "type": ComponentKind.PUZZLE.value,
             "name": component.name,
             "descriptions": component.descriptions,
             "problem": component.problem,
             "answer": component.answer
         }
     else:
-        raise ValueError(f"Unknown component type: {comp_type}")
+        raise ValueError(f"Unknown component type: {component.kind.value}")
 
 
 def _deserialize_component(data: Dict[str, Any], location_map, item_map, character_map) -> Component:
     """Deserialize a component from a dictionary."""
     comp_type = data["type"]
     
-    if comp_type == "Item":
+    if comp_type == ComponentKind.ITEM.value:
         return item_map[data["id"]]
-    elif comp_type == "Puzzle":
+    elif comp_type == ComponentKind.PUZZLE.value:
         return Puzzle(
             name=data["name"],
             descriptions=data["descriptions"],
@@ -4,16 +4,46 @@ The world class includes references to the several components (Items, Locations,
 and methods to update according to the detected changes by a language model.
 """
 
+import json
+import os
 import re
+import string
+import unicodedata
+from collections import deque
+from enum import Enum
 from typing import Type
-from models import WorldUpdatePrediction
+from models import WorldUpdatePrediction, WorldUpdateStep
 
 
+class ComponentKind(str, Enum):
+  """The kinds of components, used to dispatch on the kind of a component instead of on the name of its class.
+
+  The values are the type names used in the world JSON files. Being a str enum, the kinds
+  are hashed as strings, which keeps the lookups in the dispatch tables fast.
+  A component has the kinds of all its classes (see Component.kinds), so checking for a kind
+  with `kind in component.kinds` behaves like isinstance, also with multiple inheritance.
+  """
+  COMPONENT = 'Component'
+  PUZZLE = 'Puzzle'
+  ITEM = 'Item'
+  LOCATION = 'Location'
+  CHARACTER = 'Character'
+
 class Component:
   """A class to represent a component of the world.
 
   The components considered in the PAYADOR approach are Items, Locations and Characters.
   """
+  kind = ComponentKind.COMPONENT
+  """the most specific kind of the component, inherited by subclasses"""
+
+  kinds = (ComponentKind.COMPONENT,)
+  """the kinds of the classes of the component, in method resolution order (the most specific first)"""
+
+  def __init_subclass__(cls, **kwargs):
+    super().__init_subclass__(**kwargs)
+    cls.kinds = tuple(dict.fromkeys(klass.__dict__['kind'] for klass in cls.__mro__ if 'kind' in klass.__dict__))
+
   def __init__ (self, name:str, descriptions: 'list[str]'):
 
     self.name = name
@@ -21,9 +51,35 @@ class Component:
 
     self.descriptions = descriptions
     """a set of natural language descriptions for the component"""
+
+  listeners = ()
+  """the callbacks called as callback(component, event, **details) after each change of the component"""
+
+  def subscribe(self, callback) -> None:
+    """Register a callback to be called after each change of the component."""
+    self.listeners = [*self.listeners, callback]
+
+  def unsubscribe(self, callback) -> None:
+    """Remove a callback registered with subscribe."""
+    self.listeners = [c for c in self.listeners if c != callback]
+
+  def notify(self, event: str, **details) -> None:
+    """Call the registered callbacks with the event and its details."""
+    for callback in self.listeners:
+      callback(self, event, **details)
+
+  def __getstate__(self):
+    """The callbacks are not part of the state of the component, so they are not serialized."""
+    state = self.__dict__.copy()
+    state.pop('listeners', None)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
   
 class Puzzle (Component):
   """A class to represent a Puzzle"""
+  kind = ComponentKind.PUZZLE
 
   def __init__(self, name:str, descriptions: 'list[str]', problem: str, answer: str):
     
@@ -38,6 +94,7 @@ class Puzzle (Component):
 
 class Item (Component):
   """A class to represent an Item."""
+  kind = ComponentKind.ITEM
   def __init__ (self, name:str, descriptions: 'list[str]', gettable: bool = True):
 
     super().__init__(name, descriptions)
@@ -48,6 +105,7 @@ class Item (Component):
 
 class Location (Component):
   """A class to represent a Location in the world."""
+  kind = ComponentKind.LOCATION
   def __init__ (self, name:str, descriptions: 'list[str]', items: 'list[Item]' = None, connecting_locations: 'list[Location]' = None):
 
     super().__init__(name, descriptions)
@@ -67,12 +125,20 @@ class Location (Component):
     [self] will also be reachable from [location].
     """
 
-  def block_passage(self, location: 'Location', obstacle, symmetric: bool = True):
-    """Block a passage between self and location using an obstacle."""
+    self.passage_keys = {}
+    """a dictionary with the name of a blocked location as key and the Item needed to overcome its obstacle as value.
+    It is optional: passages without a key are unblocked when the language model decides so.
+    """
+
+  def block_passage(self, location: 'Location', obstacle, symmetric: bool = True, key: 'Item' = None):
+    """Block a passage between self and location using an obstacle, optionally overcome by carrying a key item."""
     if location in self.connecting_locations:
       if location.name not in self.blocked_locations:
         self.blocked_locations[location.name] = (location, obstacle, symmetric)
+        if key is not None:
+          self.passage_keys[location.name] = key
         self.connecting_locations = [x for x in self.connecting_locations if x is not location]
+        self.notify('passage', location=location)
       else:
         raise Exception(f"Error: A blocked passage to {location.name} already exists")
     else:
@@ -88,11 +154,14 @@ class Location (Component):
       if self.blocked_locations[location.name][2] and self not in location.connecting_locations:
         location.connecting_locations += [self]
       del self.blocked_locations[location.name]
+      self.passage_keys.pop(location.name, None)
+      self.notify('passage', location=location)
     else:
       raise Exception("Error: That is not a blocked passage")
 
 class Character (Component):
   """A class to represent a character."""
+  kind = ComponentKind.CHARACTER
   def __init__ (self, name:str, descriptions: 'list[str]', location:Location, inventory: 'list[Item]' = None):
 
     super().__init__(name, descriptions)
@@ -113,6 +182,7 @@ class Character (Component):
       self.location = new_location
       if self.location.name not in self.visited_locations:
         self.visited_locations[self.location.name] = []
+      self.notify('moved', destination=new_location)
     else:
       raise Exception(f"Error: {new_location.name} is not reachable")
 
@@ -121,10 +191,10 @@ class Character (Component):
     if item.gettable:
       if item not in self.inventory:
         self.inventory += [item]
-        if item_location_or_owner.__class__.__name__ == 'Character':
-          item_location_or_owner.inventory = [i for i in item_location_or_owner.inventory if i != item]
-        elif item_location_or_owner.__class__.__name__ == 'Location':
-          item_location_or_owner.items = [i for i in item_location_or_owner.items if i != item]
+        held_items = lookup_kind(HELD_ITEMS_ATTRIBUTE, item_location_or_owner)
+        if held_items is not None:
+          setattr(item_location_or_owner, held_items, [i for i in getattr(item_location_or_owner, held_items) if i != item])
+        item.notify('moved', holder=self)
       else:
         raise Exception(f"Error: {item.name} is already in your inventory")
     else:
@@ -134,6 +204,7 @@ class Character (Component):
     """Leave an item in the current location."""
     self.inventory = [i for i in self.inventory if i != item]
     self.location.items += [item]
+    item.notify('moved', holder=self.location)
 
   def give_item (self, character: 'Character', item: Item):
     """Give an item to another character."""
@@ -142,6 +213,774 @@ class Character (Component):
     except Exception as e:
       print(e)
 
+HELD_ITEMS_ATTRIBUTE = {
+  ComponentKind.CHARACTER: 'inventory',
+  ComponentKind.LOCATION: 'items',
+}
+"""the attribute with the list of items held by each kind of component"""
+
+def lookup_kind(table: dict, first: Component, second: Component = None, default=None):
+  """Return the entry of a dispatch table for the kinds of one or two components.
+
+  The table has a kind as key (for one component) or a pair of kinds (for two), and is indexed
+  directly with the kind of the components. Only if it has no entry for them, each component is
+  tried with each of its kinds in method resolution order, so a component that is both a Puzzle
+  and an Item is dispatched like an Item when the table has no entry for Puzzles, as isinstance would.
+  """
+  if second is None:
+    entry = table.get(getattr(first, 'kind', None))
+  else:
+    entry = table.get((getattr(first, 'kind', None), getattr(second, 'kind', None)))
+  if entry is not None:
+    return entry
+  return _lookup_inherited_kinds(table, first, second, default)
+
+def _lookup_inherited_kinds(table: dict, first: Component, second: Component, default):
+  """Return the entry of a dispatch table for any of the kinds of the components, in method resolution order."""
+  if second is None:
+    for kind in getattr(first, 'kinds', ()):
+      entry = table.get(kind)
+      if entry is not None:
+        return entry
+    return default
+  for first_kind in getattr(first, 'kinds', ()):
+    for second_kind in getattr(second, 'kinds', ()):
+      entry = table.get((first_kind, second_kind))
+      if entry is not None:
+        return entry
+  return default
+
+
+class Objective:
+  """A predicate over the world that is kept up to date by the events of the components it depends on.
+
+  The truth value is only re-evaluated when one of those components notifies a change,
+  so checking an objective does not scan the world.
+  """
+  def __init__ (self) -> None:
+
+    self.completed = False
+    """indicates if the objective is currently completed"""
+
+    self.listeners = []
+    """the callbacks called as callback(objective) each time the objective becomes completed or not completed"""
+
+  def components(self) -> 'list[Component]':
+    """Return the components whose events can change the truth value of the objective."""
+    return []
+
+  def evaluate(self) -> bool:
+    """Compute the truth value of the objective from the current state of its components."""
+    return False
+
+  def attach(self) -> None:
+    """Subscribe to the events of the components and compute the initial truth value."""
+    for component in self.components():
+      component.subscribe(self.on_event)
+    self.completed = self.evaluate()
+
+  def detach(self) -> None:
+    """Stop listening to the events of the components."""
+    for component in self.components():
+      component.unsubscribe(self.on_event)
+
+  def on_event(self, component: Component, event: str, **details) -> None:
+    """Callback for the events of the components."""
+    self._set_completed(self.update(component, event, **details))
+
+  def update(self, component: Component, event: str, **details) -> bool:
+    """Compute the new truth value after an event (by default, evaluating the objective again)."""
+    return self.evaluate()
+
+  def progress(self):
+    """Return the progress that cannot be computed again from the components (the completed steps of InOrder objectives)."""
+    return None
+
+  def set_progress(self, progress) -> None:
+    """Set the progress returned by progress, while the objective is detached."""
+
+  def __getstate__(self):
+    """The callbacks are not part of the state of the objective, so they are not serialized."""
+    state = self.__dict__.copy()
+    state['listeners'] = []
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+
+  def _set_completed(self, completed: bool) -> None:
+    if completed != self.completed:
+      self.completed = completed
+      for callback in self.listeners:
+        callback(self)
+
+class CharacterAtLocation (Objective):
+  """The character has to be at the location."""
+  def __init__ (self, character: Character, location: Location) -> None:
+    super().__init__()
+    self.character = character
+    """the character that has to reach the location"""
+
+    self.location = location
+    """the location to reach"""
+
+  def components(self):
+    return [self.character]
+
+  def evaluate(self):
+    return self.character.location is self.location
+
+class CharactersTogether (Objective):
+  """Both characters have to be at the same location."""
+  def __init__ (self, first: Character, second: Character) -> None:
+    super().__init__()
+    self.first = first
+    """the character that has to meet the second one"""
+
+    self.second = second
+    """the character to meet"""
+
+  def components(self):
+    return [self.first, self.second]
+
+  def evaluate(self):
+    return self.first.location is self.second.location
+
+class ItemHeldBy (Objective):
+  """The item has to be in the inventory of the character, or at the location."""
+  def __init__ (self, item: Item, holder: 'Character | Location') -> None:
+    super().__init__()
+    self.item = item
+    """the item to be placed"""
+
+    self.holder = holder
+    """the character or location that has to hold the item"""
+
+  def components(self):
+    return [self.item]
+
+  def evaluate(self):
+    return self.item in getattr(self.holder, lookup_kind(HELD_ITEMS_ATTRIBUTE, self.holder))
+
+  def update(self, component, event, **details):
+    # Moved items report their new holder, so there is no need to look for them
+    if 'holder' in details:
+      return details['holder'] is self.holder
+    return self.evaluate()
+
+class AllOf (Objective):
+  """All the objectives have to be completed at the same time."""
+  def __init__ (self, *objectives: Objective) -> None:
+    super().__init__()
+    self.objectives = list(objectives)
+    """the objectives to complete"""
+
+  def attach(self):
+    for objective in self.objectives:
+      objective.attach()
+      objective.listeners.append(self.on_objective_change)
+    self.completed = self.evaluate()
+
+  def detach(self):
+    for objective in self.objectives:
+      objective.detach()
+      objective.listeners.remove(self.on_objective_change)
+
+  def evaluate(self):
+    return all(objective.completed for objective in self.objectives)
+
+  def progress(self):
+    return tuple(objective.progress() for objective in self.objectives)
+
+  def set_progress(self, progress):
+    for objective, objective_progress in zip(self.objectives, progress):
+      objective.set_progress(objective_progress)
+
+  def on_objective_change(self, objective: Objective) -> None:
+    self._set_completed(self.evaluate())
+
+class InOrder (Objective):
+  """The objectives have to be completed one after the other.
+
+  Only the current step is listened to. Once a step is completed it stays completed,
+  and the whole objective is completed when the last step is.
+  """
+  def __init__ (self, *objectives: Objective) -> None:
+    super().__init__()
+    self.objectives = list(objectives)
+    """the objectives to complete, in order"""
+
+    self.current_step = 0
+    """the index of the first objective that has not been completed yet"""
+
+  def attach(self):
+    self._listen_current_step()
+
+  def detach(self):
+    if self.current_step < len(self.objectives):
+      objective = self.objectives[self.current_step]
+      objective.detach()
+      objective.listeners.remove(self.on_objective_change)
+
+  def evaluate(self):
+    return self.current_step >= len(self.objectives)
+
+  def _listen_current_step(self) -> None:
+    # Skip the steps that are already completed
+    while self.current_step < len(self.objectives):
+      objective = self.objectives[self.current_step]
+      objective.attach()
+      if not objective.completed:
+        objective.listeners.append(self.on_objective_change)
+        break
+      objective.detach()
+      self.current_step += 1
+    self._set_completed(self.evaluate())
+
+  def progress(self):
+    return (self.current_step, tuple(objective.progress() for objective in self.objectives))
+
+  def set_progress(self, progress):
+    self.current_step, steps_progress = progress
+    for objective, objective_progress in zip(self.objectives, steps_progress):
+      objective.set_progress(objective_progress)
+
+  def on_objective_change(self, objective: Objective) -> None:
+    if objective.completed:
+      objective.detach()
+      objective.listeners.remove(self.on_objective_change)
+      self.current_step += 1
+      self._listen_current_step()
+
+def compile_objective(first_component: Component, second_component: Component) -> Objective:
+  """Build the predicate for an objective given as a pair of components.
+
+  Combinations that are accepted by World.set_objective but cannot be completed
+  (a Location first) are compiled to an objective that is never completed.
+  """
+  build = lookup_kind(OBJECTIVE_TYPES, first_component, second_component)
+  if build is None:
+    raise Exception(f"Error: Cannot set objective with classes {first_component.__class__.__name__} and {second_component.__class__.__name__}")
+  return build(first_component, second_component)
+
+OBJECTIVE_TYPES = {
+  (ComponentKind.CHARACTER, ComponentKind.CHARACTER): CharactersTogether,
+  (ComponentKind.CHARACTER, ComponentKind.LOCATION): CharacterAtLocation,
+  (ComponentKind.CHARACTER, ComponentKind.ITEM): lambda character, item: ItemHeldBy(item, character),
+  (ComponentKind.ITEM, ComponentKind.CHARACTER): ItemHeldBy,
+  (ComponentKind.ITEM, ComponentKind.LOCATION): ItemHeldBy,
+  (ComponentKind.LOCATION, ComponentKind.CHARACTER): lambda location, character: Objective(),
+  (ComponentKind.LOCATION, ComponentKind.ITEM): lambda location, item: Objective(),
+}
+"""the predicate built for each valid (first, second) combination of component kinds of an objective"""
+
+
+class LocationGraph:
+  """An index over the passages between locations, to answer reachability and shortest path queries.
+
+  The graph is directed: a location is adjacent to the ones in its connecting_locations.
+  The adjacency of each location is cached and updated only when its passages change,
+  and the cached searches that a change cannot affect are kept.
+  """
+  def __init__ (self) -> None:
+
+    self.locations = []
+    """the locations in the graph"""
+
+    self.adjacency = {}
+    """a dictionary with a location as key and the tuple of its reachable locations as value"""
+
+    self.searches = {}
+    """a cache with a source location as key and its breadth-first search tree (location -> predecessor) as value"""
+
+    self.components = None
+    """a cache of the strongly connected components, or None if they have to be computed"""
+
+  def add_location(self, location: Location) -> None:
+    """Add a location to the graph and keep it updated when its passages change."""
+    self.locations.append(location)
+    self.adjacency[location] = tuple(location.connecting_locations)
+    location.subscribe(self.on_location_change)
+    self.searches = {}
+    self.components = None
+
+  def on_location_change(self, component: Location, event: str, **details) -> None:
+    """Update the adjacency of the locations whose passages changed."""
+    if event != 'passage':
+      return
+    for changed in (component, details.get('location')):
+      if changed in self.adjacency:
+        self._update_adjacency(changed)
+
+  def _update_adjacency(self, location: Location) -> None:
+    """Refresh the adjacency of a location and drop the cached searches it affects.
+
+    A search stays valid if no new passage starts in a location it reached,
+    and no removed passage is part of its search tree.
+    """
+    old_neighbors = set(self.adjacency[location])
+    new_neighbors = tuple(location.connecting_locations)
+    self.adjacency[location] = new_neighbors
+    added = set(new_neighbors) - old_neighbors
+    removed = old_neighbors - set(new_neighbors)
+    if not added and not removed:
+      return
+
+    self.components = None
+    for source, predecessors in list(self.searches.items()):
+      if (added and location in predecessors) or any(predecessors.get(r) is location for r in removed):
+        del self.searches[source]
+
+  def _search(self, source: Location) -> 'dict[Location, Location]':
+    """Return the breadth-first search tree from source (cached)."""
+    if source not in self.searches:
+      predecessors = {source: None}
+      queue = deque([source])
+      while queue:
+        current = queue.popleft()
+        for neighbor in self.adjacency.get(current, ()):
+          if neighbor not in predecessors:
+            predecessors[neighbor] = current
+            queue.append(neighbor)
+      self.searches[source] = predecessors
+    return self.searches[source]
+
+  def is_reachable(self, source: Location, target: Location) -> bool:
+    """Check if target can be reached from source through the passages that are not blocked."""
+    return target in self._search(source)
+
+  def reachable_from(self, source: Location) -> 'set[Location]':
+    """Return the set of locations that can be reached from source (including itself)."""
+    return set(self._search(source))
+
+  def shortest_path(self, source: Location, target: Location) -> 'list[Location] | None':
+    """Return the shortest list of locations from source to target (both included), or None if unreachable."""
+    predecessors = self._search(source)
+    if target not in predecessors:
+      return None
+    path = [target]
+    while predecessors[path[-1]] is not None:
+      path.append(predecessors[path[-1]])
+    return path[::-1]
+
+  def strongly_connected_components(self) -> 'list[set[Location]]':
+    """Return the groups of locations that can all be reached from each other (cached)."""
+    if self.components is None:
+      # Kosaraju's algorithm: order by finishing time, then search the reversed graph
+      order, visited = [], set()
+      for start in self.locations:
+        if start in visited:
+          continue
+        visited.add(start)
+        stack = [(start, iter(self.adjacency[start]))]
+        while stack:
+          node, neighbors = stack[-1]
+          for neighbor in neighbors:
+            if neighbor not in visited and neighbor in self.adjacency:
+              visited.add(neighbor)
+              stack.append((neighbor, iter(self.adjacency[neighbor])))
+              break
+          else:
+            stack.pop()
+            order.append(node)
+
+      reversed_adjacency = {location: [] for location in self.locations}
+      for location, neighbors in self.adjacency.items():
+        for neighbor in neighbors:
+          if neighbor in reversed_adjacency:
+            reversed_adjacency[neighbor].append(location)
+
+      components, assigned = [], set()
+      for start in reversed(order):
+        if start in assigned:
+          continue
+        component, stack = set(), [start]
+        assigned.add(start)
+        while stack:
+          node = stack.pop()
+          component.add(node)
+          for neighbor in reversed_adjacency[node]:
+            if neighbor not in assigned:
+              assigned.add(neighbor)
+              stack.append(neighbor)
+        components.append(component)
+      self.components = components
+    return self.components
+
+  def component_of(self, location: Location) -> 'set[Location]':
+    """Return the strongly connected component that contains the location."""
+    for component in self.strongly_connected_components():
+      if location in component:
+        return component
+    return {location}
+
+
+NAME_ARTICLES = {
+  'en': {'the', 'a', 'an'},
+  'es': {'el', 'la', 'los', 'las', 'un', 'una', 'unos', 'unas', 'al', 'del'},
+}
+"""the articles of each language, ignored when comparing names"""
+
+ALL_NAME_ARTICLES = set().union(*NAME_ARTICLES.values())
+"""the articles of every language, for the names whose language is not known"""
+
+PLAYER_ALIASES = {'inventory', 'inventario', 'player', 'jugador'}
+"""the normalized names that refer to the player (or its inventory) as the destination of an item"""
+
+def normalize_name(name: str, language: str = None, remove_articles: bool = True) -> str:
+  """Normalize the name of a component to compare it with the names written by a language model or the player.
+
+  Lowercases, removes accents, angle brackets, punctuation and the articles of the language
+  (of every language if it is None or unknown). This is the normalization shared by the name
+  index, the fast path and the speculative prefetches (see `speculation.normalize_input`).
+  """
+  name = unicodedata.normalize('NFKD', name.lower())
+  name = ''.join(c for c in name if not unicodedata.combining(c))
+  name = re.sub(r'[^\w\s-]', ' ', name)
+  if not remove_articles:
+    return ' '.join(name.split())
+  articles = NAME_ARTICLES.get(language, ALL_NAME_ARTICLES)
+  return ' '.join(word for word in name.split() if word not in articles)
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+  """Return the Levenshtein distance between a and b, or limit + 1 if it is greater than limit."""
+  if abs(len(a) - len(b)) > limit:
+    return limit + 1
+  previous = list(range(len(b) + 1))
+  for i, char_a in enumerate(a, 1):
+    current = [i]
+    for j, char_b in enumerate(b, 1):
+      current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+    if min(current) > limit:
+      return limit + 1
+    previous = current
+  return previous[-1]
+
+class NameIndex:
+  """An index of the names of the components, tolerant to the small differences in the names written by a language model.
+
+  Names are first looked up after normalization (case, accents, articles and angle brackets).
+  If there is no match, the names sharing the most character trigrams are compared by edit
+  distance, and the closest one is used only if it is close enough and there is no tie.
+  The components added are indexed lazily, on the next lookup, so building a world stays cheap.
+  """
+  max_candidates = 8
+  """the number of names compared by edit distance in a fuzzy lookup"""
+
+  def __init__ (self) -> None:
+
+    self.components = {}
+    """a dictionary with a normalized name as key and the list of components with that name as value"""
+
+    self.trigrams = {}
+    """a dictionary with a trigram as key and the set of normalized names that contain it as value"""
+
+    self.pending = []
+    """the components that are not indexed yet"""
+
+  @staticmethod
+  def _trigrams(name: str) -> 'set[str]':
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+  def add(self, component: Component) -> None:
+    """Add a component to the index."""
+    self.pending.append(component)
+
+  def _index_pending(self) -> None:
+    for component in self.pending:
+      key = normalize_name(component.name)
+      if key not in self.components:
+        self.components[key] = []
+        for trigram in self._trigrams(key):
+          self.trigrams.setdefault(trigram, set()).add(key)
+      self.components[key].append(component)
+    self.pending = []
+
+  def resolve(self, name: str, kinds: 'tuple[ComponentKind, ...]' = None) -> 'Component | None':
+    """Return the component with the given name, or with the closest name (None if there is no unambiguous match).
+
+    Args:
+      name: The name to look up, as written by the language model
+      kinds: The kinds of components to consider (all of them if None)
+    """
+    if self.pending:
+      self._index_pending()
+    key = normalize_name(name)
+    matches = self._filter(self.components.get(key, ()), kinds)
+    if matches:
+      return matches[0] if len(matches) == 1 else None
+    return self._resolve_fuzzy(key, kinds)
+
+  def _filter(self, components, kinds) -> 'list[Component]':
+    return [c for c in components if kinds is None or any(kind in kinds for kind in c.kinds)]
+
+  def _resolve_fuzzy(self, key: str, kinds) -> 'Component | None':
+    if not key:
+      return None
+    shared = {}
+    for trigram in self._trigrams(key):
+      for candidate in self.trigrams.get(trigram, ()):
+        shared[candidate] = shared.get(candidate, 0) + 1
+    candidates = sorted(shared, key=shared.get, reverse=True)[:self.max_candidates]
+
+    # About one edit every six characters is tolerated
+    limit = max(1, len(key) // 6)
+    best, best_distance, tie = None, limit + 1, False
+    for candidate in candidates:
+      matches = self._filter(self.components[candidate], kinds)
+      if len(matches) != 1:
+        continue
+      distance = _edit_distance(key, candidate, limit)
+      if distance < best_distance:
+        best, best_distance, tie = matches[0], distance, False
+      elif distance == best_distance and distance <= limit:
+        tie = True
+    return None if tie else best
+
+
+RENDER_PHRASES = {
+  'en': {
+    'location': 'The player is in <{location}>',
+    'reachable': 'From <{location}> the player can access: {names}',
+    'blocked': 'From <{location}> there are blocked passages to: {names}',
+    'blocked_passage': '<{location}> blocked by <{obstacle}>',
+    'inventory': 'The player has the following objects in the inventory: {names}',
+    'visible_items': 'The player can see the following objects: {names}',
+    'visible_characters': 'The player can see the following characters: {names}',
+    'adjacent_items': 'In <{location}> the player can see: {names}',
+    'none': 'None',
+    'more': '(and {count} more)',
+    'details_heading': '\nHere is a description of each component.\n',
+    'location_detail': "<{name}>: This is the player's location. {descriptions}.\n",
+    'characters_heading': 'Characters:\n',
+    'player_detail': '- <Player>: The player is acting as <{name}>. {descriptions}.\n',
+    'character_detail': '- <{name}>: {descriptions}.',
+    'character_inventory': ' This character has the following items: {names}\n',
+    'items_heading': 'Objects:\n',
+    'item_detail': '- <{name}>: {descriptions}\n',
+    'puzzles_heading': 'Puzzles:\n',
+    'puzzle_detail': '- <{name}>: {descriptions}. The riddle to solve is: "{problem}". The expected answer, that you CANNOT tell the player (EVER) is: "{answer}".\n',
+  },
+  'es': {
+    'location': 'El jugador está en <{location}>',
+    'reachable': 'Desde <{location}> el jugador puede ir a: {names}',
+    'blocked': 'Desde <{location}> hay pasajes bloqueados hacia: {names}',
+    'blocked_passage': '<{location}> bloqueado por <{obstacle}>',
+    'inventory': 'El jugador tiene los siguientes objetos en su inventario: {names}',
+    'visible_items': 'El jugador puede ver los siguientes objetos: {names}',
+    'visible_characters': 'El jugador puede ver a los siguientes personajes: {names}',
+    'adjacent_items': 'En <{location}> el jugador puede ver: {names}',
+    'none': 'None',
+    'more': '(y {count} más)',
+    'details_heading': '\nAquí hay una descripción de cada componente.\n',
+    'location_detail': '<{name}>: Este es el lugar en el que está el jugador. {descriptions}.\n',
+    'characters_heading': 'Personajes:\n',
+    'player_detail': '- <Jugador>: El jugador está actuando como <{name}>. {descriptions}.\n',
+    'character_detail': '- <{name}>: {descriptions}.',
+    'character_inventory': 'Este personaje tiene los siguientes objetos en su inventario: {names}\n',
+    'items_heading': 'Objetos:\n',
+    'item_detail': '- <{name}>: {descriptions}\n',
+    'puzzles_heading': 'Puzzles:\n',
+    'puzzle_detail': '- <{name}>: {descriptions}. El acertijo a resolver es: "{problem}". La respuesta esperada, que NO PUEDES decirle al jugador (JAMÁS) es: "{answer}".\n',
+  },
+}
+"""the sentences used to render the world in each language, as templates with named placeholders (see PHRASE_FIELDS)"""
+
+PHRASE_FIELDS = {
+  'location': ('location',),
+  'reachable': ('location', 'names'),
+  'blocked': ('location', 'names'),
+  'blocked_passage': ('location', 'obstacle'),
+  'inventory': ('names',),
+  'visible_items': ('names',),
+  'visible_characters': ('names',),
+  'adjacent_items': ('location', 'names'),
+  'none': (),
+  'more': ('count',),
+  'details_heading': (),
+  'location_detail': ('name', 'descriptions'),
+  'characters_heading': (),
+  'player_detail': ('name', 'descriptions'),
+  'character_detail': ('name', 'descriptions'),
+  'character_inventory': ('names',),
+  'items_heading': (),
+  'item_detail': ('name', 'descriptions'),
+  'puzzles_heading': (),
+  'puzzle_detail': ('name', 'descriptions', 'problem', 'answer'),
+}
+"""the placeholders each phrase can use"""
+
+LANGUAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'languages')
+"""the folder with the phrases of additional languages, as <language>.json files"""
+
+def register_language(language: str, phrases: 'dict[str, str]') -> None:
+  """Register the phrases to render the world in a language.
+
+  Every phrase of the English table must be given, using only its placeholders (in any order, see PHRASE_FIELDS),
+  without attributes, indexes or format specifications.
+  """
+  missing = set(PHRASE_FIELDS) - set(phrases)
+  if missing:
+    raise ValueError(f"Missing phrases for language '{language}': {', '.join(sorted(missing))}")
+  for key, fields in PHRASE_FIELDS.items():
+    for _, field, spec, conversion in string.Formatter().parse(phrases[key]):
+      if field is not None and (field not in fields or spec or conversion):
+        raise ValueError(f"Unexpected placeholder {{{field}}} in phrase '{phrases[key]}' (expected {', '.join(fields) or 'none'})")
+  RENDER_PHRASES[language] = {key: phrases[key] for key in PHRASE_FIELDS}
+
+def load_languages(directory: str = LANGUAGES_DIR) -> 'list[str]':
+  """Register the languages defined as <language>.json files (a dictionary of phrases) in a folder.
+
+  Returns the list of registered languages.
+  """
+  if not os.path.isdir(directory):
+    return []
+  languages = []
+  for filename in sorted(os.listdir(directory)):
+    language, extension = os.path.splitext(filename)
+    if extension == '.json':
+      with open(os.path.join(directory, filename), encoding='utf-8') as f:
+        register_language(language, json.load(f))
+      languages.append(language)
+  return languages
+
+def _describe(phrase: str, component: Component, **fields) -> str:
+  """Fill the phrase that describes a component with its name and descriptions (and any other given fields)."""
+  return phrase.format(name=component.name, descriptions='. '.join(component.descriptions), **fields)
+
+CHARACTERS_PER_TOKEN = 4
+"""the approximate number of characters of a token, to estimate the size of a rendered world"""
+
+MIN_TRUNCATED_TOKENS = 16
+"""the minimum number of tokens left to include a truncated description"""
+
+RELEVANCE = {
+  'scene': 10000,
+  'mentioned': 1000,
+  'mentioned_word': 100,
+  'inventory': 60,
+  'objective': 50,
+  'obstacle': 40,
+  'character': 30,
+  'visible': 20,
+}
+"""the score added to a component for each reason it is relevant to the player input (the player and its location are always kept)"""
+
+def estimate_tokens(text: str) -> int:
+  """Estimate the number of tokens of a text."""
+  return -(-len(text) // CHARACTERS_PER_TOKEN)
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+  """Cut a text at a word boundary so it fits in the given number of tokens."""
+  limit = tokens * CHARACTERS_PER_TOKEN - 4
+  if len(text) <= limit:
+    return text
+  return text[:limit].rsplit(' ', 1)[0] + '...\n'
+
+
+class WorldTransaction:
+  """Records the state of the components before they are changed by a world update, so the update can be rolled back.
+
+  Only the components touched by the update are saved, the first time they are touched.
+  The progress of the objective is saved when the transaction starts.
+  """
+  def __init__ (self, objective: Objective = None) -> None:
+
+    self.objective = objective
+    """the compiled objective of the world, if any"""
+
+    self.objective_progress = objective.progress() if objective is not None else None
+    """the progress of the objective before the update (see Objective.progress)"""
+
+    self.saved = {}
+    """a dictionary with a component as key and a copy of its mutable attributes as value"""
+
+    self.item_holders = {}
+    """a dictionary with a moved item as key and the component that held it before the update as value"""
+
+  def touch(self, component: Component) -> None:
+    """Save the state of a component that is about to be changed."""
+    if component not in self.saved:
+      state = {}
+      for attribute in lookup_kind(TRANSACTION_ATTRIBUTES, component, default=()):
+        value = getattr(component, attribute)
+        state[attribute] = value.copy() if isinstance(value, (list, dict)) else value
+      self.saved[component] = state
+
+  def touch_item(self, item: Item, holder: 'Character | Location') -> None:
+    """Save the holder of an item that is about to be moved, and the state of the holder."""
+    self.item_holders.setdefault(item, holder)
+    self.touch(holder)
+
+  def rollback(self) -> None:
+    """Restore the saved state of every touched component and the progress of the objective, and notify the listeners of the components."""
+    for component, state in self.saved.items():
+      for attribute, value in state.items():
+        setattr(component, attribute, value)
+    for component in self.saved:
+      if ComponentKind.LOCATION in component.kinds:
+        component.notify('passage')
+      elif ComponentKind.CHARACTER in component.kinds:
+        component.notify('moved', destination=component.location)
+    for item, holder in self.item_holders.items():
+      item.notify('moved', holder=holder)
+    # The steps of an objective reached during the update are not completed anymore
+    if self.objective is not None and self.objective.progress() != self.objective_progress:
+      self.objective.detach()
+      self.objective.set_progress(self.objective_progress)
+      self.objective.attach()
+
+TRANSACTION_ATTRIBUTES = {
+  ComponentKind.LOCATION: ('items', 'connecting_locations', 'blocked_locations', 'passage_keys'),
+  ComponentKind.CHARACTER: ('inventory', 'location', 'visited_locations'),
+}
+"""the attributes of each kind of component that a world update can change"""
+
+
+class WorldUpdateResult:
+  """The outcome of a world update: the changes that were applied, and the ones that were not possible.
+
+  Each change is a dictionary with the index of the step it belongs to, the kind of change
+  ('moved_item', 'unblocked_location' or 'player_movement') and the names involved.
+  """
+  def __init__ (self) -> None:
+
+    self.applied = []
+    """the changes applied to the world"""
+
+    self.rejected = []
+    """the changes that are not possible in the current state of the world, with the reason"""
+
+    self.unknown = []
+    """the changes that refer to names of components that do not exist in the world"""
+
+  @property
+  def ok(self) -> bool:
+    """Indicates if the whole update was applied."""
+    return not self.rejected and not self.unknown
+
+  def to_dict(self) -> dict:
+    """Return the result as a dictionary, to store it in the game log."""
+    return {"ok": self.ok, "applied": self.applied, "rejected": self.rejected, "unknown": self.unknown}
+
+  def describe(self) -> str:
+    """Return a short description of the changes that were not possible, to give it back to the language model."""
+    lines = []
+    for change in self.unknown:
+      lines.append(f"Step {change['step']}: '{change['name']}' does not exist in the world ({change['change']})")
+    for change in self.rejected:
+      lines.append(f"Step {change['step']}: {change['reason']}")
+    return '\n'.join(lines)
+
+
+WORLD_COMPONENTS = {
+  ComponentKind.ITEM: lambda world: world.items,
+  ComponentKind.LOCATION: lambda world: world.locations,
+  ComponentKind.CHARACTER: lambda world: world.characters,
+}
+"""the dictionary of the world with the components of each kind, by name"""
+
 
 class World:
   """A class to represent the fictional world, with references to every component."""
@@ -160,57 +999,80 @@ class World:
     """a character for the player"""
 
     self.objective = None
-    """the current objective for the player in this world"""
-
-  def set_objective (self, first_component: Type[Component], second_component: Type[Component]):
+    """the current objective for the player in this world, as a pair of components (None for compound objectives)"""
+
+    self.objective_predicate = None
+    """the compiled objective, kept up to date by the events of the components"""
+
+    self.location_graph = LocationGraph()
+    """an index over the passages between locations, for reachability and path queries"""
+
+    self.item_holders = {}
+    """a cache with an item as key and the character or location that holds it as value, updated when items move"""
+
+    self.name_index = NameIndex()
+    """an index to find the components by the names written by the language model"""
+    self.name_index.add(player)
+
+    self.ids = None
+    """a cache with the ID of each location, item and character (see component_ids), cleared when components are added"""
+
+    self.components_by_id = None
+    """a cache with an ID as key and its component as value"""
+
+  def __getstate__(self):
+    """The location graph and the item holders are indexes, so they are not serialized."""
+    state = self.__dict__.copy()
+    state.pop('location_graph', None)
+    state.pop('item_holders', None)
+    state.pop('name_index', None)
+    state.pop('ids', None)
+    state.pop('components_by_id', None)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.location_graph = LocationGraph()
+    for location in self.locations.values():
+      self.location_graph.add_location(location)
+    self.item_holders = {}
+    for item in self.items.values():
+      item.subscribe(self.on_item_moved)
+    self.ids, self.components_by_id = None, None
+    self.name_index = NameIndex()
+    self.name_index.add(self.player)
+    for component in [*self.locations.values(), *self.items.values(), *self.characters.values()]:
+      if component is not self.player:
+        self.name_index.add(component)
+    # The subscriptions of the objective are not serialized with the components
+    if self.objective_predicate is not None:
+      self.objective_predicate.attach()
+
+  def set_objective (self, first_component: Type[Component], second_component: Type[Component] = None):
     """Set the objective for the world. Valid combinations are:
     - Character with Character
     - Character with (Location or Item)
     - Item with Location
+
+    The objective is compiled to a predicate that is updated by the events of the components involved.
+    An already built Objective (e.g. a compound one, with AllOf or InOrder) can also be given as the only argument.
     """
-    first_class = first_component.__class__.__name__
-    second_class = second_component.__class__.__name__
-    
-    # Define valid objective combinations
-    valid_combinations = {
-        ("Character", "Character"),
-        ("Character", "Location"),
-        ("Location", "Character"),
-        ("Character", "Item"),
-        ("Item", "Character"),
-        ("Item", "Location"),
-        ("Location", "Item"),
-    }
-    
-    if (first_class, second_class) in valid_combinations:
-        self.objective = (first_component, second_component)
+    if isinstance(first_component, Objective):
+      predicate = first_component
     else:
-        raise Exception(f"Error: Cannot set objective with classes {first_class} and {second_class}")
+      predicate = compile_objective(first_component, second_component)
+
+    if self.objective_predicate is not None:
+      self.objective_predicate.detach()
+    predicate.attach()
+    self.objective_predicate = predicate
+    self.objective = (first_component, second_component) if second_component is not None else None
 
   def check_objective(self) -> bool:
     """Check if the objective has been completed."""
-    first = self.objective[0]
-    second = self.objective[1]
-    first_class = first.__class__.__name__
-    second_class = second.__class__.__name__
-    
-    # Character objectives
-    if first_class == "Character":
-        if second_class == "Character":
-            return first.location == second.location
-        elif second_class == "Location":
-            return first.location == second
-        elif second_class == "Item":
-            return second in first.inventory
-    
-    # Item objectives
-    elif first_class == "Item":
-        if second_class == "Location":
-            return first in second.items
-        elif second_class == "Character":
-            return first in second.inventory
-    
-    return False
+    if self.objective_predicate is None:
+      return False
+    return self.objective_predicate.completed
 
   def add_location (self,location: Location) -> None:
     """Add a location to the world."""
@@ -218,6 +1080,9 @@ class World:
       raise Exception(f"Error: Already exists a location called '{location.name}'")
     else:
        self.locations[location.name] = location
+       self.ids = None
+       self.name_index.add(location)
+       self.location_graph.add_location(location)
 
   def add_item (self, item: Item) -> None:
     """Add an item to the world."""  
@@ -225,6 +1090,9 @@ class World:
       raise Exception(f"Error: Already exists an item called '{item.name}'")
     else:
       self.items[item.name] = item
+      self.ids = None
+      self.name_index.add(item)
+      item.subscribe(self.on_item_moved)
 
   def add_character (self, character: Character) -> None:
     """Add a character to the world."""
@@ -232,6 +1100,9 @@ class World:
       raise Exception(f"Error: Already exists a character called '{character.name}'")
     else:
       self.characters[character.name] = character
+      self.ids = None
+      if character is not self.player:
+        self.name_index.add(character)
 
   def add_locations (self,locations: 'list[Location]') -> None:
     """"Add a set of locations to the world."""
@@ -248,192 +1119,424 @@ class World:
     for character in characters:
       self.add_character(character)
 
-  def render_world(self, *, language:str = 'en', detail_components:bool = True) -> str:
+  def component_ids(self) -> 'dict[Component, str]':
+    """Return the ID of each location, item and character, the same IDs of the worlds saved by utils.world_serializer.
+
+    The locations and the characters (the player first) are numbered in the order they were added, and the
+    items (including those in the inventories and blocking passages) in the alphabetical order of their names.
+    """
+    if self.ids is None:
+      characters = [self.player] + [character for character in self.characters.values() if character is not self.player]
+      items = set(self.items.values())
+      for location in self.locations.values():
+        items.update(location.items)
+        items.update(obstacle for _, obstacle, _ in location.blocked_locations.values() if ComponentKind.ITEM in obstacle.kinds)
+      for character in characters:
+        items.update(character.inventory)
+
+      self.ids = {location: f"loc_{i}" for i, location in enumerate(self.locations.values())}
+      self.ids.update({item: f"item_{i}" for i, item in enumerate(sorted(items, key=lambda item: item.name))})
+      self.ids.update({character: f"char_{i}" for i, character in enumerate(characters)})
+      self.components_by_id = {id: component for component, id in self.ids.items()}
+    return self.ids
+
+  def is_reachable(self, destination: Location, origin: Location = None) -> bool:
+    """Check if the destination can be reached from the origin (the player location by default)."""
+    return self.location_graph.is_reachable(origin or self.player.location, destination)
+
+  def shortest_path(self, destination: Location, origin: Location = None) -> 'list[Location] | None':
+    """Return the shortest route from the origin (the player location by default) to the destination, both included."""
+    return self.location_graph.shortest_path(origin or self.player.location, destination)
+
+  def travel(self, destination: Location) -> 'list[Location]':
+    """Move the player to a reachable destination through the shortest route, one location at a time.
+
+    Returns the locations visited on the way, including the destination.
+    """
+    path = self.shortest_path(destination)
+    if path is None:
+      raise Exception(f"Error: {destination.name} is not reachable")
+    for location in path[1:]:
+      self.player.move(location)
+    return path[1:]
+
+  def render_world(self, *, language:str = 'en', detail_components:bool = True, token_budget: int = None,
+                   input: str = None, adjacent_items: bool = False, format: str = 'text') -> str:
     """Return the fictional world as a natural language description, using simple sentences.
 
     The components described are only those the player can see in the current location.
     If detail_components is False, then the descriptions for each component are not included.
-    """
-    rendered_world = ''
+    The sentences are taken from the phrases registered for the language (English if it is not registered).
 
-    if language == 'es':
-      rendered_world = self.__render_world_spanish(detail_components = detail_components)
-    else:
-      rendered_world = self.__render_world_english(detail_components = detail_components)
+    If a token_budget is given, the components are ranked by their relevance to the player input
+    (mentioned names first, then the items in hand, the objective and the rest of the scene), and
+    only the most relevant descriptions that fit in the budget are included, the last one truncated.
+    The lists of visible objects are also cut to the most relevant ones, within a quarter of the budget.
+    If adjacent_items is True, the items visible in the reachable locations are also listed.
 
-    return rendered_world
+    If format is 'json', the scene is returned as compact JSON instead (see _render_scene_json), with the same
+    components, and only the descriptions are cut to fit the token_budget.
+    """
+    relevance = self._relevance(input) if token_budget is not None else None
+    list_budget = token_budget // 4 if token_budget is not None else None
+
+    if format == 'json':
+      scene = self._render_scene_json(detail_components = detail_components, relevance = relevance,
+                                      token_budget = token_budget, adjacent_items = adjacent_items)
+      return json.dumps(scene, ensure_ascii=False, separators=(',', ':'))
+    if format != 'text':
+      raise Exception(f"Error: Unknown format '{format}' to render the world")
+
+    phrases = RENDER_PHRASES.get(language, RENDER_PHRASES['en'])
+    world_description, details = self._render_scene(phrases, detail_components = detail_components, relevance = relevance,
+                                                     list_budget = list_budget, adjacent_items = adjacent_items)
+
+    if token_budget is not None:
+      return world_description + '\n' + self._fit_details(details, relevance, token_budget - estimate_tokens(world_description))
+    return world_description + '\n' + ''.join([text for _, text in details])
+
+  def _relevance(self, input: str = None):
+    """Return a function that scores how relevant a component is to the player input."""
+    mentioned = normalize_name(input or '')
+    mentioned_words = set(word for word in mentioned.split() if len(word) > 2)
+    objective_components = set(self.objective) if self.objective is not None else set()
+    player_location = self.player.location
+    obstacles = set(blocked_values[1] for blocked_values in player_location.blocked_locations.values())
+
+    def relevance(component: Component) -> int:
+      if component is None or component is player_location or component is self.player:
+        return RELEVANCE['scene']
+      score = 0
+      name = normalize_name(component.name)
+      if name and f' {name} ' in f' {mentioned} ':
+        score += RELEVANCE['mentioned']
+      else:
+        score += RELEVANCE['mentioned_word'] * len(mentioned_words.intersection(name.split()))
+      if component in self.player.inventory:
+        score += RELEVANCE['inventory']
+      if component in objective_components:
+        score += RELEVANCE['objective']
+      if component in obstacles:
+        score += RELEVANCE['obstacle']
+      if ComponentKind.CHARACTER in component.kinds:
+        score += RELEVANCE['character']
+      elif component in player_location.items:
+        score += RELEVANCE['visible']
+      return score
+
+    return relevance
+
+  def _fit_details(self, details: 'list[tuple[Component, str]]', relevance, token_budget: int) -> str:
+    """Keep the most relevant details that fit in the token budget, in their original order.
+
+    The first detail that does not fit is truncated, unless it is a puzzle (its answer cannot be cut)
+    or too little budget is left. Section headings (with no component) are kept only if a detail below them is.
+    """
+    order = sorted(range(len(details)), key=lambda index: -relevance(details[index][0]) if details[index][0] is not None else 0)
+    selected = {}
+    remaining = token_budget - sum(estimate_tokens(text) for component, text in details if component is None)
+    for index in order:
+      component, text = details[index]
+      if component is None:
+        continue
+      cost = estimate_tokens(text)
+      if cost <= remaining:
+        selected[index] = text
+        remaining -= cost
+      elif remaining >= MIN_TRUNCATED_TOKENS and ComponentKind.PUZZLE not in component.kinds:
+        selected[index] = truncate_to_tokens(text, remaining)
+        remaining = 0
+
+    rendered, heading = '', None
+    for index, (component, text) in enumerate(details):
+      if component is None:
+        heading = text
+      elif index in selected:
+        if heading is not None:
+          rendered += heading
+          heading = None
+        rendered += selected[index]
+    return rendered
+
+  @staticmethod
+  def _list_names(components: 'list[Component]', relevance = None, list_budget: int = None, more = None) -> str:
+    """Join the names of the components, keeping only the most relevant ones that fit in list_budget tokens (if given).
+
+    The number of components left out is added with the 'more' phrase.
+    """
+    names = ", ".join([f"<{c.name}>" for c in components])
+    if list_budget is None or estimate_tokens(names) <= list_budget:
+      return names
+    listed, size = [], 0
+    for component in sorted(components, key=relevance, reverse=True):
+      size += estimate_tokens(f"<{component.name}>, ")
+      if size > list_budget and listed:
+        break
+      listed.append(component)
+    kept = set(listed)
+    names = ", ".join([f"<{c.name}>" for c in components if c in kept])
+    return names + ' ' + more.format(count=len(components) - len(listed))
+
+  def _adjacent_items(self) -> 'list[tuple[Location, list[Item]]]':
+    """Return the items that can be seen in each reachable location."""
+    return [(location, location.items) for location in self.player.location.connecting_locations if location.items]
   
-  def __render_world_spanish(self, *,  detail_components:bool = True) -> str:
-    """Return the fictional world as a natural language description, using simple sentences in Spanish.
+  def _render_scene(self, phrases: 'dict[str, str]', *, detail_components: bool = True, relevance = None,
+                    list_budget: int = None, adjacent_items: bool = False) -> 'tuple[str, list[tuple[Component, str]]]':
+    """Render the scene of the player with the phrases of a language (see RENDER_PHRASES).
 
-    The components described are only those the player can see in the current location.
-    If detail_components is False, then the descriptions for each component are not included.
+    Returns the description of the scene and the list of (component, text) details, with None as the component of the headings.
     """
     player_location = self.player.location
-    reachable_locations = [f"<{p.name}>" for p in player_location.connecting_locations]
-    blocked_passages = [f"<{p}> bloqueado por <{player_location.blocked_locations[p][1].name}>" for p in player_location.blocked_locations.keys()]
+    location_name = player_location.name
+    none = phrases['none'].format()
+    player_inventory = self.player.inventory
+    blocked_locations = player_location.blocked_locations
     characters_in_the_scene = [character for character in self.characters.values() if character.location is player_location]
-
-    
-    world_description = f'El jugador está en <{player_location.name}>\n'
-    
-    if reachable_locations:
-      world_description += f'Desde <{player_location.name}> el jugador puede ir a: {(", ").join(reachable_locations)}\n'
-    else:
-      world_description += f'Desde <{player_location.name}> el jugador puede ir a: None\n'
-
-    if blocked_passages:
-      world_description += f'Desde <{player_location.name}> hay pasajes bloqueados hacia: {(", ").join(blocked_passages)}\n'
-    else:
-      world_description += f'Desde <{player_location.name}> hay pasajes bloqueados hacia: None\n'
-
-    if self.player.inventory:
-      world_description += f'El jugador tiene los siguientes objetos en su inventario: {(", ").join([f"<{i.name}>" for i in self.player.inventory])}\n'
-    else:
-      world_description += f'El jugador tiene los siguientes objetos en su inventario: None\n'
-
-    if player_location.items:
-      world_description += f'El jugador puede ver los siguientes objetos: {(", ").join([f"<{i.name}>" for i in player_location.items])}\n'
-    else:
-      world_description += f'El jugador puede ver los siguientes objetos: None\n'
-      
-    if characters_in_the_scene:
-      world_description += f'El jugador puede ver a los siguientes personajes: {(", ").join([f"<{c.name}>" for c in characters_in_the_scene])}'
-    else:
-      world_description += f'El jugador puede ver a los siguientes personajes: None'
-
-    details = ""
+    blocked_passage = phrases['blocked_passage']
+
+    # Empty lists are rendered with the 'none' phrase without building them, as most scenes have some
+    world_description = '\n'.join([
+      phrases['location'].format(location=location_name),
+      phrases['reachable'].format(location=location_name, names=", ".join([f"<{p.name}>" for p in player_location.connecting_locations]) if player_location.connecting_locations else none),
+      phrases['blocked'].format(location=location_name, names=", ".join([blocked_passage.format(location=name, obstacle=blocked_values[1].name) for name, blocked_values in blocked_locations.items()]) if blocked_locations else none),
+      phrases['inventory'].format(names=", ".join([f"<{i.name}>" for i in player_inventory]) if player_inventory else none),
+      phrases['visible_items'].format(names=self._list_names(player_location.items, relevance, list_budget, phrases['more']) if player_location.items else none),
+      phrases['visible_characters'].format(names=", ".join([f"<{c.name}>" for c in characters_in_the_scene]) if characters_in_the_scene else none),
+    ])
+    if adjacent_items:
+      adjacent_items_phrase = phrases['adjacent_items']
+      world_description = '\n'.join([world_description] + [adjacent_items_phrase.format(location=location.name, names=self._list_names(items, relevance, list_budget, phrases['more']))
+                                                          for location, items in self._adjacent_items()])
+
+    details = []
     if detail_components:
-      items_in_the_scene = player_location.items + self.player.inventory + [blocked_values[1] for blocked_values in player_location.blocked_locations.values() if isinstance(blocked_values[1], Item)]
-      puzzles_in_the_scene = [blocked_values[1] for blocked_values in player_location.blocked_locations.values() if isinstance(blocked_values[1], Puzzle)]
-
-      details += "\nAquí hay una descripción de cada componente.\n"
-      details += f"<{player_location.name}>: Este es el lugar en el que está el jugador. {('. ').join(player_location.descriptions)}.\n"
-      details += "Personajes:\n"
-      details += f"- <Jugador>: El jugador está actuando como <{self.player.name}>. {('. ').join(self.player.descriptions)}.\n"
-      if len(characters_in_the_scene)>0:
-        for character in characters_in_the_scene:
-          details += f"- <{character.name}>: {('. ').join(character.descriptions)}."
-          if len(character.inventory)>0:
-            details += f"Este personaje tiene los siguientes objetos en su inventario: {(', ').join([f'<{i.name}>' for i in character.inventory])}\n"
-            items_in_the_scene+= character.inventory
-          else:
-            details += "\n"
-      if len(items_in_the_scene)>0:
-        details+="Objetos:\n"
-        for item in items_in_the_scene:
-          details += f"- <{item.name}>: {('. ').join(item.descriptions)}\n"
-      if len(puzzles_in_the_scene)>0:
-        details+="Puzzles:\n"
-        for puzzle in puzzles_in_the_scene:
-          details+= f'- <{puzzle.name}>: {(". ").join(puzzle.descriptions)}. El acertijo a resolver es: "{puzzle.problem}". La respuesta esperada, que NO PUEDES decirle al jugador (JAMÁS) es: "{puzzle.answer}".\n'
-
-    return world_description + '\n' + details
-
-  def __render_world_english(self, *,  detail_components:bool = True) -> str:
-    """Return the fictional world as a natural language description, using simple sentences in English.
-
-    The components described are only those the player can see in the current location.
-    If detail_components is False, then the descriptions for each component are not included.
+      items_in_the_scene = player_location.items + self.player.inventory + [blocked_values[1] for blocked_values in player_location.blocked_locations.values() if ComponentKind.ITEM in blocked_values[1].kinds]
+      puzzles_in_the_scene = [blocked_values[1] for blocked_values in player_location.blocked_locations.values() if ComponentKind.PUZZLE in blocked_values[1].kinds]
+
+      details = [
+        (None, phrases['details_heading'].format()),
+        (player_location, _describe(phrases['location_detail'], player_location)),
+        (None, phrases['characters_heading'].format()),
+        (self.player, _describe(phrases['player_detail'], self.player)),
+      ]
+      character_inventory = phrases['character_inventory']
+      for character in characters_in_the_scene:
+        detail = _describe(phrases['character_detail'], character)
+        if character.inventory:
+          detail += character_inventory.format(names=", ".join([f"<{i.name}>" for i in character.inventory]))
+          items_in_the_scene = items_in_the_scene + character.inventory
+        else:
+          detail += '\n'
+        details.append((character, detail))
+      if items_in_the_scene:
+        details.append((None, phrases['items_heading'].format()))
+        details += [(item, _describe(phrases['item_detail'], item)) for item in items_in_the_scene]
+      if puzzles_in_the_scene:
+        details.append((None, phrases['puzzles_heading'].format()))
+        details += [(puzzle, _describe(phrases['puzzle_detail'], puzzle, problem=puzzle.problem, answer=puzzle.answer))
+                    for puzzle in puzzles_in_the_scene]
+
+    return world_description, details
+
+  def _render_scene_json(self, *, detail_components: bool = True, relevance = None, token_budget: int = None,
+                         adjacent_items: bool = False) -> dict:
+    """Render the scene of the player as a dictionary, to be given to the language model as JSON.
+
+    Each location, item and character is written with its ID (see component_ids) and its name. The locations are
+    marked as reachable or not (then with the ID or name of the obstacle in 'blocked_by'), and each item has the ID
+    of its 'holder', or of the location whose passage it 'blocks'. The descriptions are added by relevance while
+    they fit in the token_budget (if given).
     """
+    ids = self.component_ids()
     player_location = self.player.location
-    reachable_locations = [f"<{p.name}>" for p in player_location.connecting_locations]
-    blocked_passages = [f"<{p}> blocked by <{player_location.blocked_locations[p][1].name}>" for p in player_location.blocked_locations.keys()]
     characters_in_the_scene = [character for character in self.characters.values() if character.location is player_location]
+    entries = {}
+
+    def entry(component: Component, **fields) -> dict:
+      entries[component] = {'id': ids.get(component), 'name': component.name, **fields}
+      return entries[component]
+
+    held_items = [(item, player_location) for item in player_location.items] + [(item, self.player) for item in self.player.inventory]
+    held_items += [(item, character) for character in characters_in_the_scene for item in character.inventory]
+    obstacles = [(obstacle, blocked_location) for blocked_location, obstacle, _ in player_location.blocked_locations.values()]
+    puzzles = [puzzle for puzzle, _ in obstacles if ComponentKind.PUZZLE in puzzle.kinds]
+
+    scene = {
+      'player': entry(self.player, location=ids[player_location], inventory=[ids[item] for item in self.player.inventory]),
+      'locations': [entry(player_location)]
+                   + [entry(location, reachable=True) for location in player_location.connecting_locations]
+                   + [entry(location, reachable=False, blocked_by=ids.get(obstacle, obstacle.name)) for obstacle, location in obstacles],
+      'characters': [entry(character, inventory=[ids[item] for item in character.inventory]) for character in characters_in_the_scene],
+      'items': [entry(item, holder=ids[holder]) for item, holder in held_items]
+               + [entry(item, blocks=ids[location]) for item, location in obstacles if ComponentKind.ITEM in item.kinds],
+    }
+    if puzzles:
+      scene['puzzles'] = [{'name': puzzle.name, 'problem': puzzle.problem, 'secret_answer': puzzle.answer} for puzzle in puzzles]
+      entries.update(zip(puzzles, scene['puzzles']))
+    # As in the text, the other locations and the items seen in them are listed, but not described
+    described = [component for component in entries if ComponentKind.LOCATION not in component.kinds or component is player_location]
+    if adjacent_items:
+      scene['items'] += [entry(item, holder=ids[location]) for location, items in self._adjacent_items() for item in items]
 
-    
-    world_description = f'The player is in <{player_location.name}>\n'
-    
-    if reachable_locations:
-      world_description += f'From <{player_location.name}> the player can access: {(", ").join(reachable_locations)}\n'
-    else:
-      world_description += f'From <{player_location.name}> the player can access: None\n'
-
-    if blocked_passages:
-      world_description += f'From <{player_location.name}> there are blocked passages to: {(", ").join(blocked_passages)}\n'
-    else:
-      world_description += f'From <{player_location.name}> there are blocked passages to: None\n'
-
-    if self.player.inventory:
-      world_description += f'The player has the following objects in the inventory: {(", ").join([f"<{i.name}>" for i in self.player.inventory])}\n'
-    else:
-      world_description += f'The player has the following objects in the inventory: None\n'
-
-    if player_location.items:
-      world_description += f'The player can see the following objects: {(", ").join([f"<{i.name}>" for i in player_location.items])}\n'
-    else:
-      world_description += f'The player can see the following objects: None\n'
-      
-    if characters_in_the_scene:
-      world_description += f'The player can see the following characters: {(", ").join([f"<{c.name}>" for c in characters_in_the_scene])}'
-    else:
-      world_description += f'The player can see the following characters: None'
-
-    details = ""
     if detail_components:
-      items_in_the_scene = player_location.items + self.player.inventory + [blocked_values[1] for blocked_values in player_location.blocked_locations.values() if isinstance(blocked_values[1], Item)]
-      puzzles_in_the_scene = [blocked_values[1] for blocked_values in player_location.blocked_locations.values() if isinstance(blocked_values[1], Puzzle)]
-
-      details += "\nHere is a description of each component.\n"
-      details += f"<{player_location.name}>: This is the player's location. {('. ').join(player_location.descriptions)}.\n"
-      details += "Characters:\n"
-      details += f"- <Player>: The player is acting as <{self.player.name}>. {('. ').join(self.player.descriptions)}.\n"
-      if len(characters_in_the_scene)>0:
-        for character in characters_in_the_scene:
-          details += f"- <{character.name}>: {('. ').join(character.descriptions)}."
-          if len(character.inventory)>0:
-            details += f" This character has the following items: {(', ').join([f'<{i.name}>' for i in character.inventory])}\n"
-            items_in_the_scene+= character.inventory
-          else:
-            details += "\n"
-      if len(items_in_the_scene)>0:
-        details+="Objects:\n"
-        for item in items_in_the_scene:
-          details += f"- <{item.name}>: {('. ').join(item.descriptions)}\n"
-      if len(puzzles_in_the_scene)>0:
-        details+="Puzzles:\n"
-        for puzzle in puzzles_in_the_scene:
-          details+= f'- <{puzzle.name}>: {(". ").join(puzzle.descriptions)}. The riddle to solve is: "{puzzle.problem}". The expected answer, that you CANNOT tell the player (EVER) is: "{puzzle.answer}".\n'
-
-    return world_description + '\n' + details
-
-  def update (self, updates: str) -> None:
+      size = estimate_tokens(json.dumps(scene, ensure_ascii=False, separators=(',', ':')))
+      for component in (sorted(described, key=relevance, reverse=True) if relevance is not None else described):
+        description = '. '.join(component.descriptions)
+        cost = estimate_tokens(description) + 4
+        if token_budget is not None and size + cost > token_budget:
+          continue
+        entries[component]['description'] = description
+        size += cost
+    return scene
+
+  def update (self, updates: str) -> WorldUpdateResult:
     """Does the changes in the world according to the output of the language model.
 
     The considered transformations are:
       - moved items
       - unblocked locations
       - player movement
+
+    The whole prediction is validated first, following the steps of a compound input in order.
+    Only if every change is possible the changes are applied, as a single transaction:
+    the world is never left partially updated.
       
     Args:
       updates: JSON string from LLM containing structured world update prediction
+
+    Returns:
+      The changes applied, and the ones rejected or referring to unknown components
     """
     try:
       # Parse JSON response into Pydantic model
       world_update = WorldUpdatePrediction.model_validate_json(updates)
-      
-      # Process moved items
-      for moved_object in world_update.moved_items:
-        self._process_moved_object(moved_object.name, moved_object.destination)
-      
-      # Process unblocked locations
-      for passage in world_update.unblocked_locations:
-        try:
-          self.locations[self.player.location.name].unblock_passage(self.locations[passage])
-        except Exception as e:
-          print(f"Error unblocking passage '{passage}': {e}")
-      
-      # Process player movement
-      if world_update.player_movement is not None:
-        try:
-          self.player.move(self.locations[world_update.player_movement])
-        except Exception as e:
-          print(f"Error moving player to '{world_update.player_movement}': {e}")
-    
     except Exception as e:
-      print(f"Error parsing world update: {e}")
+      result = WorldUpdateResult()
+      result.rejected.append({"step": 0, "change": "prediction", "reason": f"The prediction is not valid: {e}"})
+      return result
 
-  def _process_moved_object(self, object_name: str, destination: str) -> None:
+    result = self.validate_update(world_update)
+    if not result.ok:
+      result.applied = []
+      return result
+
+    transaction = WorldTransaction(self.objective_predicate)
+    try:
+      for step in world_update.get_steps():
+        self._apply_step(step, transaction)
+    except Exception as e:
+      transaction.rollback()
+      result.rejected.append({"step": 0, "change": "prediction", "reason": str(e)})
+      result.applied = []
+    return result
+
+  def validate_update(self, world_update: WorldUpdatePrediction) -> WorldUpdateResult:
+    """Check every change of a prediction against the current state of the world, without changing it.
+
+    The steps are simulated in order, so a change can depend on the previous ones
+    (e.g. unblocking a passage from the location the player just moved to).
+    The changes that would be applied are listed in applied, and the changes that have no
+    effect (like unblocking a passage that is already open) are not listed.
+    """
+    result = WorldUpdateResult()
+    player_location = self.player.location
+    holders = {}
+    opened = set()
+
+    def is_open(origin: Location, destination: Location) -> bool:
+      return destination in origin.connecting_locations or (origin, destination) in opened
+
+    for index, step in enumerate(world_update.get_steps()):
+      for moved_object in step.moved_items:
+        change = {"step": index, "change": "moved_item", "name": moved_object.name, "destination": moved_object.destination}
+        item = self.find_component(moved_object.name, ComponentKind.ITEM)
+        target = self._resolve_holder(moved_object.destination)
+        if item is None:
+          result.unknown.append(change)
+          continue
+        if target is None:
+          result.unknown.append({**change, "name": moved_object.destination})
+          continue
+        holder = holders[item] if item in holders else self._find_item_holder(item)
+        if holder is None:
+          result.rejected.append({**change, "reason": f"{item.name} is not anywhere it can be moved from"})
+        elif target is holder:
+          continue
+        elif ComponentKind.CHARACTER in target.kinds and not item.gettable:
+          result.rejected.append({**change, "reason": f"{item.name} cannot be taken"})
+        else:
+          holders[item] = target
+          result.applied.append(self._with_resolved_names(change, name=item, destination=target))
+
+      for passage in step.unblocked_locations:
+        change = {"step": index, "change": "unblocked_location", "name": passage}
+        target = self.find_component(passage, ComponentKind.LOCATION)
+        if target is None:
+          result.unknown.append(change)
+        elif is_open(player_location, target):
+          continue
+        elif target.name not in player_location.blocked_locations:
+          result.rejected.append({**change, "reason": f"There is no blocked passage from {player_location.name} to {passage}"})
+        else:
+          opened.add((player_location, target))
+          if player_location.blocked_locations[target.name][2]:
+            opened.add((target, player_location))
+          result.applied.append(self._with_resolved_names(change, name=target))
+
+      if step.player_movement is not None:
+        change = {"step": index, "change": "player_movement", "name": step.player_movement}
+        target = self.find_component(step.player_movement, ComponentKind.LOCATION)
+        if target is None:
+          result.unknown.append(change)
+        elif target is player_location:
+          continue
+        elif not is_open(player_location, target):
+          result.rejected.append({**change, "reason": f"{target.name} is not reachable from {player_location.name}"})
+        else:
+          player_location = target
+          result.applied.append(self._with_resolved_names(change, name=target))
+
+    return result
+
+  @staticmethod
+  def _with_resolved_names(change: dict, **components: Component) -> dict:
+    """Add to a change the actual names of the components written differently (e.g. 'resolved_name')."""
+    for field, component in components.items():
+      if change[field] != component.name and normalize_name(change[field]) not in PLAYER_ALIASES:
+        change[f'resolved_{field}'] = component.name
+    return change
+
+  def _apply_step(self, step: WorldUpdateStep, transaction: WorldTransaction) -> None:
+    """Apply the changes of a single action, raising an exception if one of them is not possible."""
+    # Process moved items
+    for moved_object in step.moved_items:
+      self._process_moved_object(moved_object.name, moved_object.destination, transaction)
+
+    # Process unblocked locations (a passage that is already open is left as it is)
+    player_location = self.player.location
+    for passage in step.unblocked_locations:
+      target = self.find_component(passage, ComponentKind.LOCATION)
+      if target is None:
+        raise Exception(f"Error: Cannot unblock the passage to unknown location '{passage}'")
+      if target in player_location.connecting_locations:
+        continue
+      if target.name not in player_location.blocked_locations:
+        raise Exception(f"Error: There is no blocked passage from {player_location.name} to {passage}")
+      transaction.touch(player_location)
+      transaction.touch(target)
+      player_location.unblock_passage(target)
+
+    # Process player movement
+    if step.player_movement is not None:
+      target = self.find_component(step.player_movement, ComponentKind.LOCATION)
+      if target is None:
+        raise Exception(f"Error: Cannot move the player to unknown location '{step.player_movement}'")
+      if target is not player_location:
+        transaction.touch(self.player)
+        self.player.move(target)
+
+  def _process_moved_object(self, object_name: str, destination: str, transaction: WorldTransaction = None) -> None:
     """Process a single moved object.
     
     Handles cases where items are moved between inventory/locations,
@@ -443,66 +1546,75 @@ class World:
       - Character/Location → Player's inventory
       - Character/Location → Other character's inventory
       - Character/Location → Location
+
+    Raises an exception if the item or the destination do not exist. If a transaction
+    is given, the state of the components is recorded before changing them.
     """
-    try:
-      world_item = self.items[object_name]
-      
-      # Find current location of item
-      current_location = None
-      
-      # Check if in player inventory
-      if world_item in self.player.inventory:
-        current_location = ('inventory', self.player)
-      else:
-        # Check if in any NPC's inventory
-        for character in self.characters.values():
-          if world_item in character.inventory:
-            current_location = ('inventory', character)
-            break
-        # Check if in any location
-        if not current_location:
-          for location in self.locations.values():
-            if world_item in location.items:
-              current_location = ('location', location)
-              break
-      
-      if not current_location:
-        print(f"Error: Item '{object_name}' not found anywhere in the world")
-        return
-      
-      current_type, current_holder = current_location
-      
-      # Case 1: Item moved to player's inventory
-      if destination in ['Inventory', 'Inventario', 'Player', 'Jugador', self.player.name]:
-        if current_type == 'inventory':
-          # Someone (player or NPC) is giving to player
-          current_holder.inventory = [i for i in current_holder.inventory if i != world_item]
-          self.player.inventory.append(world_item)
-        elif current_type == 'location':
-          # Item in location, player (or someone) takes it
-          current_holder.items = [i for i in current_holder.items if i != world_item]
-          self.player.inventory.append(world_item)
-      
-      # Case 2: Item moved to a character's inventory
-      elif destination in self.characters:
-        target_character = self.characters[destination]
-        if current_type == 'inventory':
-          current_holder.inventory = [i for i in current_holder.inventory if i != world_item]
-          target_character.inventory.append(world_item)
-        elif current_type == 'location':
-          current_holder.items = [i for i in current_holder.items if i != world_item]
-          target_character.inventory.append(world_item)
-      
-      # Case 3: Item dropped at a location
-      elif destination in self.locations:
-        target_location = self.locations[destination]
-        if current_type == 'inventory':
-          current_holder.inventory = [i for i in current_holder.inventory if i != world_item]
-          target_location.items.append(world_item)
-        elif current_type == 'location':
-          current_holder.items = [i for i in current_holder.items if i != world_item]
-          target_location.items.append(world_item)
+    world_item = self.find_component(object_name, ComponentKind.ITEM)
+    if world_item is None:
+      raise Exception(f"Error: Item '{object_name}' does not exist")
+    current_holder = self._find_item_holder(world_item)
+    if current_holder is None:
+      raise Exception(f"Error: Item '{object_name}' not found anywhere in the world")
     
-    except Exception as e:
-      print(f"Error processing moved object '{object_name}' to '{destination}': {e}")
-
+    # Find the new holder of the item: the player's inventory, a character's inventory or a location
+    target = self._resolve_holder(destination)
+    if target is None:
+      raise Exception(f"Error: Unknown destination '{destination}' for item '{object_name}'")
+
+    if target is current_holder:
+      return
+
+    if transaction is not None:
+      transaction.touch_item(world_item, current_holder)
+      transaction.touch(target)
+
+    held_items = lookup_kind(HELD_ITEMS_ATTRIBUTE, current_holder)
+    setattr(current_holder, held_items, [i for i in getattr(current_holder, held_items) if i != world_item])
+    getattr(target, lookup_kind(HELD_ITEMS_ATTRIBUTE, target)).append(world_item)
+    world_item.notify('moved', holder=target)
+
+  def _resolve_holder(self, destination: str) -> 'Character | Location | None':
+    """Return the component named as the destination of a moved item (None if there is no such component)."""
+    if normalize_name(destination) in PLAYER_ALIASES:
+      return self.player
+    return self.find_component(destination, ComponentKind.CHARACTER, ComponentKind.LOCATION)
+
+  def find_component(self, name: str, *kinds: ComponentKind) -> 'Component | None':
+    """Return the component with the given name, tolerating small differences in the name.
+
+    The exact name is tried first, then the ID of the component (see component_ids). Otherwise the name
+    is looked up in the name index, among the components of the given kinds (all of them if no kind is given).
+    """
+    for kind in kinds:
+      component = WORLD_COMPONENTS[kind](self).get(name)
+      if component is not None:
+        return component
+    self.component_ids()
+    component = self.components_by_id.get(name)
+    if component is not None and (not kinds or any(kind in kinds for kind in component.kinds)):
+      return component
+    return self.name_index.resolve(name, kinds or None)
+
+  def _find_item_holder(self, item: Item) -> 'Character | Location | None':
+    """Return the character or location that holds an item (None if it is not held by any, like obstacles)."""
+    holder = self.item_holders.get(item)
+    if holder is not None and item in getattr(holder, lookup_kind(HELD_ITEMS_ATTRIBUTE, holder)):
+      return holder
+
+    # Not cached yet, or changed without an event: look for the item
+    holder = None
+    if item in self.player.inventory:
+      holder = self.player
+    else:
+      holder = next((character for character in self.characters.values() if item in character.inventory), None)
+      if holder is None:
+        holder = next((location for location in self.locations.values() if item in location.items), None)
+    if holder is not None:
+      self.item_holders[item] = holder
+    return holder
+
+  def on_item_moved(self, component: Item, event: str, **details) -> None:
+    """Keep the item holders up to date with the events of the items."""
+    if event == 'moved' and details.get('holder') is not None:
+      self.item_holders[component] = details['holder']